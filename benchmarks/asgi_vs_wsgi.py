@@ -0,0 +1,127 @@
+"""
+Compare throughput of the sync endpoints under WSGI (gunicorn) with the async
+endpoints under ASGI (uvicorn), one worker process each.
+
+Both servers run against the configured database. A benchmark user is
+created if missing and requests are authenticated with a freshly minted JWT.
+
+Usage:
+    python benchmarks/asgi_vs_wsgi.py --concurrency 64 --seconds 10
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import django
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "restaurant_reservation.settings")
+django.setup()
+
+from users.models import User  # noqa: E402
+from users.serializers import CustomTokenObtainPairSerializer  # noqa: E402
+
+
+SERVERS = {
+    "wsgi": {
+        "command": ["gunicorn", "restaurant_reservation.wsgi:application", "--workers", "1", "--threads", "{threads}", "--bind", "127.0.0.1:{port}"],
+        "path": "/api/users/me/",
+    },
+    "asgi": {
+        "command": ["uvicorn", "restaurant_reservation.asgi:application", "--workers", "1", "--port", "{port}", "--log-level", "warning"],
+        "path": "/api/users/async/me/",
+    },
+}
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def drive(port, path, token, concurrency, seconds):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local_latencies = []
+        local_errors = 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path, headers={"Authorization": f"Bearer {token}"})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            local_latencies.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--threads", type=int, default=16, help="gunicorn threads for the WSGI worker")
+    parser.add_argument("--port", type=int, default=8701)
+    args = parser.parse_args()
+
+    user, _ = User.objects.get_or_create(username="benchmark-user", defaults={"role": "CUSTOMER"})
+    token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+
+    for offset, (name, server) in enumerate(SERVERS.items()):
+        port = args.port + offset
+        command = [part.format(port=port, threads=args.threads) for part in server["command"]]
+        process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            drive(port, server["path"], token, 4, 1)  # warm up
+            latencies, errors = drive(port, server["path"], token, args.concurrency, args.seconds)
+        finally:
+            process.terminate()
+            process.wait()
+
+        if not latencies:
+            print(f"{name}: no successful requests ({errors} errors)")
+            continue
+        print(
+            f"{name}: {len(latencies) / args.seconds:8.1f} req/s  "
+            f"p50 {statistics.median(latencies) * 1000:7.2f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.2f} ms  "
+            f"errors {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark the slot-grid availability computation on synthetic data.
+
+Builds a full-day grid for a restaurant with hundreds of tables and a busy
+booking sheet, then times grid construction and the feasible-start search.
+No database is touched.
+
+Usage:
+    python benchmarks/availability_grid.py --tables 500 --reservations 4000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "restaurant_reservation.settings")
+django.setup()
+
+from reservations.service import SlotGrid  # noqa: E402
+
+
+def build_inputs(table_count, reservation_count, seed):
+    rng = random.Random(seed)
+    day_start = datetime(2025, 5, 24, tzinfo=timezone.utc)
+    table_ids = list(range(1, table_count + 1))
+    intervals = []
+    for _ in range(reservation_count):
+        start = day_start + timedelta(minutes=rng.randrange(11 * 60, 22 * 60, 15))
+        intervals.append((rng.choice(table_ids), start, start + timedelta(minutes=rng.choice([60, 90, 120]))))
+    open_intervals = [
+        (day_start + timedelta(hours=11), day_start + timedelta(hours=15)),
+        (day_start + timedelta(hours=17), day_start + timedelta(hours=23)),
+    ]
+    return day_start, day_start + timedelta(days=1), table_ids, intervals, open_intervals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tables", type=int, default=500)
+    parser.add_argument("--reservations", type=int, default=4000)
+    parser.add_argument("--duration", type=int, default=90)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    day_start, day_end, table_ids, intervals, open_intervals = build_inputs(args.tables, args.reservations, args.seed)
+
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        grid = SlotGrid(day_start, day_end, table_ids, intervals, open_intervals)
+        slots = grid.free_starts(args.duration)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    print(f"tables={args.tables} reservations={args.reservations} slots/day={grid.slot_count} free starts={len(slots)}")
+    print(f"median {statistics.median(timings):.2f} ms  p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms  max {timings[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
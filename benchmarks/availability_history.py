@@ -0,0 +1,190 @@
+"""
+Measure how availability and listing latency respond to a growing reservation history.
+
+A throwaway test database is created from the migrations, seeded with
+restaurants, tables and a fortnight of upcoming bookings, and then history is
+grown step by step: each step back-fills bookings into past months with one
+INSERT ... SELECT over generate_series, giving those months their partitions
+first. After every step the availability endpoint, a customer's listing and a
+restaurant's listing are timed through the full request stack, with the
+number of reservation partitions the availability query plans to scan. A last
+step detaches all history with archive_reservations and times them again.
+
+Usage:
+    python benchmarks/availability_history.py --history-months 0,6,12,24
+    python benchmarks/availability_history.py --restaurants 50 --requests 300 --output run.json
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, time as clock, timedelta
+from pathlib import Path
+
+import django
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "restaurant_reservation.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from load_test import git_revision, percentile  # noqa: E402
+from reservations.models import Reservation  # noqa: E402
+from reservations.partitions import PARENT, add_months, ensure_partitions, month_start  # noqa: E402
+from restaurants.models import OpeningHour, Restaurant, Table  # noqa: E402
+from users.models import User  # noqa: E402
+from users.serializers import CustomTokenObtainPairSerializer  # noqa: E402
+
+
+# Four 90-minute sittings per table and day, for every day from %(first)s to %(last)s.
+HISTORY_SQL = f"""
+INSERT INTO {PARENT} (customer_id, restaurant_id, table_id, reservation_time, number_of_guests, duration, end_time, created_at, canceled)
+SELECT (%(customer_ids)s::bigint[])[1 + (t.id * 7 + EXTRACT(DOY FROM day)::int + sitting) %% %(customers)s],
+       t.restaurant_id, t.id, day + sitting * INTERVAL '1 hour', 2, 90,
+       day + sitting * INTERVAL '1 hour' + INTERVAL '90 minutes', day - INTERVAL '1 day', (t.id + sitting) %% 10 = 0
+FROM {Table._meta.db_table} t
+CROSS JOIN generate_series(%(first)s::timestamptz, %(last)s::timestamptz, INTERVAL '1 day') AS day
+CROSS JOIN unnest(ARRAY[12, 14, 18, 20]) AS sitting
+WHERE t.restaurant_id = ANY(%(restaurant_ids)s)
+"""
+
+
+class HistoryBenchmark:
+    def __init__(self, args):
+        self.args = args
+
+    def seed(self):
+        self.owner = User.objects.create(username="owner", role="OWNER")
+        self.customers = User.objects.bulk_create(User(username=f"customer{number}", role="CUSTOMER") for number in range(self.args.customers))
+        self.restaurants = Restaurant.objects.bulk_create(
+            Restaurant(name=f"Restaurant {number}", address=f"{number} Main St", owner=self.owner) for number in range(self.args.restaurants)
+        )
+        Table.objects.bulk_create(
+            Table(restaurant=restaurant, table_number=str(number), capacity=4, is_joinable=number % 3 == 0)
+            for restaurant in self.restaurants
+            for number in range(self.args.tables)
+        )
+        OpeningHour.objects.bulk_create(
+            OpeningHour(restaurant=restaurant, day=day, open_time=clock(11), close_time=clock(23))
+            for restaurant in self.restaurants
+            for day, _ in OpeningHour.DAYS
+        )
+        self.customer_client = self.client_for(self.customers[0])
+        self.owner_client = self.client_for(self.owner)
+        self.today = timezone.now().date()
+        self.history_from = self.today
+        self.book(self.today, self.today + timedelta(days=14))
+
+    @staticmethod
+    def client_for(user):
+        return Client(HTTP_AUTHORIZATION=f"Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}")
+
+    def book(self, first_day, last_day):
+        ensure_partitions(first_day, last_day)
+        tzinfo = timezone.get_default_timezone()
+        with connection.cursor() as cursor:
+            cursor.execute(HISTORY_SQL, {
+                "customer_ids": [customer.id for customer in self.customers],
+                "customers": len(self.customers),
+                "first": datetime.combine(first_day, clock.min, tzinfo=tzinfo),
+                "last": datetime.combine(last_day, clock.min, tzinfo=tzinfo),
+                "restaurant_ids": [restaurant.id for restaurant in self.restaurants],
+            })
+            cursor.execute(f"ANALYZE {PARENT}")
+
+    def grow(self, months):
+        """
+        Extend the history back to `months` months before the current one.
+        """
+        first_day = add_months(month_start(self.today), -months)
+        if first_day < self.history_from:
+            self.book(first_day, self.history_from - timedelta(days=1))
+            self.history_from = first_day
+
+    def scanned_partitions(self):
+        day = self.today + timedelta(days=3)
+        start = timezone.make_aware(datetime.combine(day, clock.min))
+        plan = Reservation.objects.filter(Reservation.overlapping(start, start + timedelta(days=1)), restaurant=self.restaurants[0]).explain()
+        return len(set(re.findall(rf"{PARENT}_\w+", plan)))
+
+    def measure(self, label):
+        day = (self.today + timedelta(days=3)).isoformat()
+        routes = {
+            "availability": (self.customer_client, f"/api/restaurants/{self.restaurants[0].id}/availability/?date={day}&party_size=4"),
+            "customer_list": (self.customer_client, "/api/reservations/"),
+            "restaurant_list": (self.owner_client, f"/api/reservations/restaurant/{self.restaurants[0].id}/"),
+        }
+        step = {"step": label, "reservations": Reservation.objects.count(), "partitions_scanned": self.scanned_partitions()}
+        for name, (client, url) in routes.items():
+            timings = []
+            for _ in range(self.args.requests):
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} answered {response.status_code}: {response.content[:200]}")
+            timings.sort()
+            step[name] = {"p50": round(statistics.median(timings), 2), "p95": round(percentile(timings, 0.95), 2)}
+        print(
+            f"{label:<12}{step['reservations']:>10}{step['partitions_scanned']:>8}"
+            + "".join(f"{step[name]['p50']:>18.2f}{step[name]['p95']:>8.2f}" for name in routes)
+        )
+        return step
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--history-months", default="0,6,12,24", help="Comma-separated months of history to measure at, ascending")
+    parser.add_argument("--restaurants", type=int, default=20)
+    parser.add_argument("--tables", type=int, default=20, help="Tables per restaurant")
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint and step")
+    parser.add_argument("--output", default=str(ROOT / "benchmarks" / "results" / f"history-{datetime.now():%Y%m%d-%H%M%S}.json"))
+    args = parser.parse_args()
+    if connection.vendor != "postgresql":
+        parser.error("The schema needs Postgres; point DB_* at a Postgres server.")
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        benchmark = HistoryBenchmark(args)
+        benchmark.seed()
+        print(
+            f"{'history':<12}{'rows':>10}{'parts':>8}"
+            + "".join(f"{name + ' p50 ms':>18}{'p95':>8}" for name in ("avail", "customer", "restaurant"))
+        )
+        steps = []
+        for months in map(int, args.history_months.split(",")):
+            benchmark.grow(months)
+            steps.append(benchmark.measure(f"{months} months"))
+        call_command("archive_reservations", f"--before={month_start(benchmark.today - timedelta(days=1))}", stdout=io.StringIO())
+        steps.append(benchmark.measure("archived"))
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "timestamp": datetime.now().astimezone().isoformat(),
+        "git_revision": git_revision(),
+        "django": django.get_version(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "steps": steps,
+    }, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
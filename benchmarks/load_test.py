@@ -0,0 +1,348 @@
+"""
+Load-test the API through its real URL routes and record latency, throughput
+and queries per request.
+
+A throwaway test database is created from the migrations (like
+`manage.py test`), seeded with owners, restaurants, tables, opening hours and
+customers, and then every scenario is driven by a pool of threads, each with
+its own Django test client and database connection. Requests go through the
+full middleware, authentication and view stack; only the network hop is
+skipped, which is what makes the per-request query counts exact.
+
+Results are printed and written to JSON so runs can be compared over time.
+The schema relies on Postgres features (exclusion constraints, advisory
+locks), so a Postgres server is required; SQLite cannot stand in.
+
+Usage:
+    python benchmarks/load_test.py --threads 16 --requests 2000
+    python benchmarks/load_test.py --scenarios reservation_create,reservation_list --output run.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as clock, timedelta
+from pathlib import Path
+
+import django
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "restaurant_reservation.settings")
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from restaurants.models import OpeningHour, Restaurant, Table  # noqa: E402
+from users.last_login import last_login_buffer  # noqa: E402
+from users.models import User  # noqa: E402
+from users.serializers import CustomTokenObtainPairSerializer  # noqa: E402
+
+
+PASSWORD = "load-test-password"
+
+
+class LoadTest:
+    """
+    Seeded data plus one method per scenario. Each scenario method issues a
+    single request and returns the response (None to skip); the accepted
+    status codes are declared in SCENARIOS. An optional prepare_<scenario>
+    method sets up data outside the timed section.
+    """
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.args = args
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.reservations = []
+
+    def next_number(self):
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def seed(self):
+        # One bcrypt hash for everyone: hashing per user would dominate seeding.
+        password = make_password(PASSWORD)
+        self.owners = User.objects.bulk_create(
+            User(username=f"owner{number}", role="OWNER", password=password) for number in range(self.args.owners)
+        )
+        self.customers = User.objects.bulk_create(
+            User(username=f"customer{number}", role="CUSTOMER", password=password) for number in range(self.args.customers)
+        )
+        self.restaurants = Restaurant.objects.bulk_create(
+            Restaurant(name=f"Restaurant {number}", address=f"{number} Main St", owner=self.owners[number % len(self.owners)])
+            for number in range(self.args.restaurants)
+        )
+        self.tables = Table.objects.bulk_create(
+            Table(restaurant=restaurant, table_number=str(number), capacity=self.rng.choice([2, 2, 4, 4, 4, 6, 8]), is_joinable=number % 3 == 0)
+            for restaurant in self.restaurants
+            for number in range(self.args.tables)
+        )
+        OpeningHour.objects.bulk_create(
+            OpeningHour(restaurant=restaurant, day=day, open_time=clock(11), close_time=clock(23))
+            for restaurant in self.restaurants
+            for day, _ in OpeningHour.DAYS
+        )
+        self.tokens = {user.id: str(CustomTokenObtainPairSerializer.get_token(user).access_token) for user in self.owners + self.customers}
+        self.first_day = timezone.localdate() + timedelta(days=1)
+
+    def client_for(self, user):
+        return Client(HTTP_AUTHORIZATION=f"Bearer {self.tokens[user.id]}")
+
+    def pick(self, items):
+        with self.lock:
+            return self.rng.choice(items)
+
+    def booking_time(self):
+        with self.lock:
+            day = self.first_day + timedelta(days=self.rng.randrange(self.args.days))
+            minutes = self.rng.randrange(11 * 60, 21 * 60, 15)
+        return timezone.make_aware(datetime.combine(day, clock.min)) + timedelta(minutes=minutes)
+
+    # Users
+
+    def register(self, client):
+        number = self.next_number()
+        return client.post("/api/users/register/", {"username": f"new{number}", "password": PASSWORD, "role": "CUSTOMER"}, content_type="application/json")
+
+    def login(self, client):
+        return client.post("/api/users/login/", {"username": self.pick(self.customers).username, "password": PASSWORD}, content_type="application/json")
+
+    def me(self, client):
+        return self.client_for(self.pick(self.customers)).get("/api/users/me/")
+
+    # Restaurants
+
+    def restaurant_list(self, client):
+        return self.client_for(self.pick(self.owners)).get("/api/restaurants/")
+
+    def restaurant_retrieve(self, client):
+        restaurant = self.pick(self.restaurants)
+        return self.client_for(self.owners[self.restaurants.index(restaurant) % len(self.owners)]).get(f"/api/restaurants/{restaurant.id}/")
+
+    def restaurant_create(self, client):
+        owner = self.pick(self.owners)
+        return self.client_for(owner).post("/api/restaurants/", {
+            "name": f"New {self.next_number()}",
+            "address": "1 Side St",
+            "tables": [{"table_number": str(number), "capacity": 4} for number in range(4)],
+        }, content_type="application/json")
+
+    def restaurant_update(self, client):
+        position = self.restaurants.index(self.pick(self.restaurants))
+        return self.client_for(self.owners[position % len(self.owners)]).patch(
+            f"/api/restaurants/{self.restaurants[position].id}/", {"phone_number": f"555{self.next_number() % 10000:04d}"}, content_type="application/json"
+        )
+
+    def prepare_restaurant_delete(self, requests):
+        self.doomed = Restaurant.objects.bulk_create(
+            Restaurant(name="Short-lived", address="2 Side St", owner=self.owners[number % len(self.owners)]) for number in range(requests)
+        )
+
+    def restaurant_delete(self, client):
+        with self.lock:
+            restaurant = self.doomed.pop()
+        return self.client_for(restaurant.owner).delete(f"/api/restaurants/{restaurant.id}/")
+
+    # Reservations
+
+    def reservation_create(self, client):
+        customer = self.pick(self.customers)
+        with self.lock:
+            party = self.rng.choice([2, 2, 2, 4, 4, 6])
+        response = self.client_for(customer).post("/api/reservations/create/", {
+            "restaurant": self.pick(self.restaurants).id,
+            "reservation_time": self.booking_time().isoformat(),
+            "number_of_guests": party,
+            "duration": 90,
+        }, content_type="application/json")
+        if response.status_code == 201:
+            with self.lock:
+                self.reservations.append((customer, response.json()["id"]))
+        return response
+
+    def pop_reservation(self):
+        with self.lock:
+            return self.reservations.pop(self.rng.randrange(len(self.reservations))) if self.reservations else (None, None)
+
+    def reservation_update(self, client):
+        customer, reservation_id = self.pop_reservation()
+        if reservation_id is None:
+            return None
+        response = self.client_for(customer).put(
+            f"/api/reservations/{reservation_id}/update/", {"reservation_time": self.booking_time().isoformat()}, content_type="application/json"
+        )
+        with self.lock:
+            self.reservations.append((customer, reservation_id))
+        return response
+
+    def reservation_cancel(self, client):
+        customer, reservation_id = self.pop_reservation()
+        if reservation_id is None:
+            return None
+        return self.client_for(customer).post(f"/api/reservations/{reservation_id}/cancel/")
+
+    def reservation_list(self, client):
+        return self.client_for(self.pick(self.customers)).get("/api/reservations/")
+
+    def availability(self, client):
+        date = self.booking_time().date().isoformat()
+        return self.client_for(self.pick(self.customers)).get(f"/api/restaurants/{self.pick(self.restaurants).id}/availability/?date={date}&party_size=4")
+
+
+# Scenario name -> accepted status codes. Run in this order, so updates and cancels find reservations to work on.
+SCENARIOS = {
+    "register": {201},
+    "login": {200},
+    "me": {200},
+    "restaurant_list": {200},
+    "restaurant_retrieve": {200},
+    "restaurant_create": {201},
+    "restaurant_update": {200},
+    "restaurant_delete": {204},
+    "availability": {200},
+    "reservation_create": {201, 400},
+    "reservation_list": {200},
+    "reservation_update": {200, 400},
+    "reservation_cancel": {204},
+}
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_scenario(load_test, name, requests, threads):
+    scenario = getattr(load_test, name)
+    prepare = getattr(load_test, f"prepare_{name}", None)
+    if prepare:
+        prepare(requests)
+        connection.close()
+    samples = []
+    statuses = {}
+    samples_lock = threading.Lock()
+
+    def worker(share):
+        client = Client()
+        local_samples = []
+        local_statuses = {}
+        try:
+            for _ in range(share):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = scenario(client)
+                    elapsed = time.perf_counter() - started
+                if response is None:
+                    continue
+                local_samples.append((elapsed, len(queries)))
+                local_statuses[response.status_code] = local_statuses.get(response.status_code, 0) + 1
+        finally:
+            connection.close()
+        with samples_lock:
+            samples.extend(local_samples)
+            for code, count in local_statuses.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    shares = [requests // threads + (1 if position < requests % threads else 0) for position in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, shares))
+    wall = time.perf_counter() - started
+
+    if not samples:
+        return {"requests": 0}
+    latencies = sorted(elapsed for elapsed, _ in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(count for code, count in statuses.items() if code not in SCENARIOS[name]),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "requests_per_second": len(samples) / wall,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "mean": statistics.fmean(latencies) * 1000,
+        },
+        "queries_per_request": statistics.fmean(query_count for _, query_count in samples),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--owners", type=int, default=20)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--restaurants", type=int, default=100)
+    parser.add_argument("--tables", type=int, default=20, help="Tables per restaurant")
+    parser.add_argument("--days", type=int, default=14, help="Bookings are spread over this many upcoming days")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=str(ROOT / "benchmarks" / "results" / f"load-{datetime.now():%Y%m%d-%H%M%S}.json"))
+    args = parser.parse_args()
+
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    if connection.vendor != "postgresql":
+        parser.error("The schema needs Postgres; point DB_* at a Postgres server.")
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        load_test = LoadTest(args)
+        load_test.seed()
+        connection.close()
+
+        results = {}
+        print(f"{'scenario':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'errors':>8}")
+        for name in names:
+            result = results[name] = run_scenario(load_test, name, args.requests, args.threads)
+            if not result["requests"]:
+                print(f"{name:<22}{'skipped':>10}")
+                continue
+            latency = result["latency_ms"]
+            print(
+                f"{name:<22}{result['requests_per_second']:>10.1f}{latency['p50']:>10.2f}{latency['p95']:>10.2f}"
+                f"{latency['p99']:>10.2f}{result['queries_per_request']:>10.1f}{result['errors']:>8}"
+            )
+    finally:
+        # Write buffered logins while the throwaway database still exists.
+        last_login_buffer.stop()
+        teardown_databases(old_config, verbosity=0)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "timestamp": datetime.now().astimezone().isoformat(),
+        "git_revision": git_revision(),
+        "django": django.get_version(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "scenarios": results,
+    }, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
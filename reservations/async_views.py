@@ -0,0 +1,88 @@
+from rest_framework import status
+from restaurant_reservation.async_support import AsyncAPIView, run_sync
+from .serializers import ReservationSerializer
+from .repository import ReservationRepository, ReservationConflictError, ReservationNotFoundError, OutsideOpeningHoursError
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class AsyncReservationCreateView(AsyncAPIView):
+    """
+    Async view to create a new reservation.
+    """
+
+    async def post(self, request):
+        serializer = ReservationSerializer(data=request.data)
+        if not await run_sync(serializer.is_valid):
+            return self.respond(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        try:
+            reservation = await run_sync(ReservationRepository.create_reservation, serializer.validated_data, request.user)
+            if reservation:
+                reservation.joined_table_ids = await ReservationRepository.aget_joined_table_ids(reservation)
+                logger.info(f"Reservation created successfully: {reservation.id}")
+                return self.respond(ReservationSerializer(reservation).data, status.HTTP_201_CREATED)
+            return self.respond({"error": "No available table for the given time."}, status.HTTP_400_BAD_REQUEST)
+        except OutsideOpeningHoursError:
+            return self.respond({"error": "The restaurant is closed at the requested time."}, status.HTTP_400_BAD_REQUEST)
+        except ReservationConflictError as e:
+            logger.warning(f"Reservation contention: {str(e)}")
+            return self.respond({"error": "The restaurant is busy, please try again."}, status.HTTP_409_CONFLICT)
+        except Exception as e:
+            logger.error(f"Error creating reservation: {str(e)}")
+            return self.respond({"error": "Internal server error"}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+
+class AsyncReservationUpdateView(AsyncAPIView):
+    """
+    Async view to update an existing reservation.
+    """
+
+    async def put(self, request, pk):
+        serializer = ReservationSerializer(data=request.data, partial=True)
+        if not await run_sync(serializer.is_valid):
+            return self.respond(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        # Existence and ownership are read on the event loop; only the allocating write takes a thread.
+        found = await ReservationRepository.aget_active_reservation(pk, request.user)
+        if found is None:
+            return self.respond({"error": "Reservation not found or already canceled."}, status.HTTP_404_NOT_FOUND)
+        try:
+            reservation = await run_sync(ReservationRepository.update_reservation, pk, serializer.validated_data, request.user, found)
+            if reservation:
+                reservation.joined_table_ids = await ReservationRepository.aget_joined_table_ids(reservation)
+                logger.info(f"Reservation updated successfully: {reservation.id}")
+                return self.respond(ReservationSerializer(reservation).data, status.HTTP_200_OK)
+            return self.respond({"error": "No available table for the given time."}, status.HTTP_400_BAD_REQUEST)
+        except ReservationNotFoundError:
+            return self.respond({"error": "Reservation not found or already canceled."}, status.HTTP_404_NOT_FOUND)
+        except OutsideOpeningHoursError:
+            return self.respond({"error": "The restaurant is closed at the requested time."}, status.HTTP_400_BAD_REQUEST)
+        except ReservationConflictError as e:
+            logger.warning(f"Reservation contention: {str(e)}")
+            return self.respond({"error": "The restaurant is busy, please try again."}, status.HTTP_409_CONFLICT)
+        except Exception as e:
+            logger.error(f"Error updating reservation: {str(e)}")
+            return self.respond({"error": "Internal server error"}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+
+class AsyncReservationCancelView(AsyncAPIView):
+    """
+    Async view to cancel an existing reservation.
+    """
+
+    async def post(self, request, pk):
+        if await ReservationRepository.aget_active_reservation(pk, request.user) is None:
+            return self.respond({"error": "Reservation not found or already canceled."}, status.HTTP_404_NOT_FOUND)
+        try:
+            reservation = await run_sync(ReservationRepository.cancel_reservation, pk, request.user)
+            if reservation:
+                logger.info(f"Reservation canceled successfully: {reservation.id}")
+                return self.respond({"message": "Reservation canceled successfully."}, status.HTTP_204_NO_CONTENT)
+            return self.respond({"error": "Reservation not found or already canceled."}, status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error(f"Error canceling reservation: {str(e)}")
+            return self.respond({"error": "Internal server error"}, status.HTTP_500_INTERNAL_SERVER_ERROR)
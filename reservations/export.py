@@ -0,0 +1,86 @@
+import csv
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .repository import ReservationRepository
+
+
+# (column, values_list field) of every exported reservation.
+COLUMNS = (
+    ('id', 'id'),
+    ('restaurant', 'restaurant_id'),
+    ('table', 'table_id'),
+    ('joined_tables', 'joined_table_ids'),
+    ('customer', 'customer_id'),
+    ('reservation_time', 'reservation_time'),
+    ('end_time', 'end_time'),
+    ('duration', 'duration'),
+    ('number_of_guests', 'number_of_guests'),
+    ('canceled', 'canceled'),
+    ('special_requests', 'special_requests'),
+    ('created_at', 'created_at'),
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Bytes of output gathered before handing a chunk to the server.
+WRITE_SIZE = 64 * 1024
+
+
+class _Echo:
+    """
+    File-like object handing back what csv.writer writes to it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ' '.join(map(str, value))
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([column for column, _ in COLUMNS])
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def _ndjson_lines(rows):
+    columns = [column for column, _ in COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_reservations(restaurant_ids, output_format, start=None, end=None):
+    """
+    Text chunks of the restaurants' reservations in `output_format` ('csv' or 'ndjson').
+    Rows come off a server-side cursor EXPORT_CHUNK_SIZE at a time, so memory
+    use does not depend on how many reservations are exported.
+    """
+    rows = ReservationRepository.get_export_rows(restaurant_ids, [field for _, field in COLUMNS], start, end).iterator(
+        chunk_size=settings.EXPORT_CHUNK_SIZE,
+    )
+    lines = _csv_lines(rows) if output_format == 'csv' else _ndjson_lines(rows)
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= WRITE_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
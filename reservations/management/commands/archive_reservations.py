@@ -0,0 +1,47 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reservations.models import Reservation
+from reservations.partitions import ARCHIVE_TABLE, detach_partitions, is_partitioned, move_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Take reservations starting before a date out of the reservation table. --mode detach "
+        f"turns whole months into standalone {ARCHIVE_TABLE}_YYYYMM tables, instantly; --mode move "
+        f"copies the rows into {ARCHIVE_TABLE} in batches and drops the emptied partitions. "
+        "Occupancy rollups are kept; rebuild them with --since to leave archived months alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", required=True, type=date.fromisoformat, help="Cutoff date (YYYY-MM-DD, UTC), exclusive")
+        parser.add_argument("--mode", choices=["detach", "move"], default="detach")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per transaction in move mode")
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError("The reservation table is not partitioned; run migrate first.")
+        cutoff = options["before"]
+        # A reservation still in progress must stay where the overlap checks look.
+        latest = (timezone.now() - timedelta(minutes=Reservation.MAX_DURATION)).date()
+        if cutoff > latest:
+            raise CommandError(f"Reservations may still be running before {cutoff}; the cutoff can be {latest} at the latest.")
+        started = time.perf_counter()
+
+        if options["mode"] == "detach":
+            archived = detach_partitions(cutoff)
+            for name in archived:
+                self.stdout.write(f"Detached {name}")
+            self.stdout.write(self.style.SUCCESS(f"Detached {len(archived)} partitions in {time.perf_counter() - started:.1f}s"))
+            if cutoff.day != 1:
+                self.stdout.write(f"Reservations of {cutoff:%Y-%m} before {cutoff} stay: detach mode archives whole months.")
+            return
+
+        moved = 0
+        for count in move_rows(cutoff, options["batch_size"]):
+            moved += count
+            self.stdout.write(f"Moved {moved} reservations")
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} reservations to {ARCHIVE_TABLE} in {time.perf_counter() - started:.1f}s"))
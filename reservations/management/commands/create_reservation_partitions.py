@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations.partitions import ensure_upcoming_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly reservation partitions that are missing, moving their rows out of "
+        "the DEFAULT partition. migrate does this for the months ahead; schedule it (e.g. monthly) "
+        "so bookings far ahead always find their partition."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int, default=settings.RESERVATION_PARTITION_MONTHS_AHEAD,
+            help="Months to cover after the first one",
+        )
+        parser.add_argument("--from", dest="first_day", type=date.fromisoformat, help="A day of the first month (YYYY-MM-DD); today by default")
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError("The reservation table is not partitioned; run migrate first.")
+        created = ensure_upcoming_partitions(options["months_ahead"], options["first_day"])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partitions"))
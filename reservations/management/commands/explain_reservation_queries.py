@@ -0,0 +1,115 @@
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from reservations.models import Reservation
+from reservations.pagination import ReservationKeysetPagination
+from reservations.repository import ReservationRepository
+from restaurants.models import Restaurant, Table
+
+
+class Command(BaseCommand):
+    help = (
+        "Load synthetic reservations, run the repository's hot queries and print "
+        "EXPLAIN (ANALYZE, BUFFERS) for each. Everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=20)
+        parser.add_argument("--tables", type=int, default=20, help="Tables per restaurant")
+        parser.add_argument("--days", type=int, default=90, help="Days of bookings per table, four seatings a day")
+        parser.add_argument("--days-ahead", type=int, default=14, help="How many of those days lie in the future; the rest is history")
+        parser.add_argument("--customers", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            restaurant, customer, day = self._load(options)
+            for label, run in self._hot_queries(restaurant, customer, day):
+                with CaptureQueriesContext(connection) as captured:
+                    run()
+                for query in captured.captured_queries:
+                    if '"reservations_reservation"' in query["sql"].split(" WHERE ")[0]:
+                        self._explain(label, query["sql"])
+            transaction.set_rollback(True)
+
+    def _load(self, options):
+        rng = random.Random(options["seed"])
+        User = get_user_model()
+        owner = User.objects.create(username="explain-owner", role="OWNER")
+        customers = User.objects.bulk_create(
+            User(username=f"explain-customer-{number}", role="CUSTOMER") for number in range(options["customers"])
+        )
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(name=f"Explain {number}", address="1 Main St", owner=owner) for number in range(options["restaurants"])
+        )
+        tables = Table.objects.bulk_create(
+            Table(restaurant=restaurant, table_number=str(number), capacity=rng.choice([2, 4, 6]))
+            for restaurant in restaurants
+            for number in range(options["tables"])
+        )
+
+        first_day = timezone.now().date() - timedelta(days=options["days"] - options["days_ahead"])
+        reservations = []
+        for table in tables:
+            for offset in range(options["days"]):
+                day_start = timezone.make_aware(datetime.combine(first_day + timedelta(days=offset), time(12)))
+                for seating in range(4):
+                    start = day_start + timedelta(hours=2 * seating)
+                    reservations.append(Reservation(
+                        customer=rng.choice(customers),
+                        restaurant_id=table.restaurant_id,
+                        table=table,
+                        reservation_time=start,
+                        duration=90,
+                        end_time=start + timedelta(minutes=90),
+                        number_of_guests=2,
+                        canceled=rng.random() < 0.1,
+                    ))
+        Reservation.objects.bulk_create(reservations, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE reservations_reservation")
+        self.stdout.write(f"Loaded {len(reservations)} reservations over {len(tables)} tables.\n")
+
+        today = timezone.make_aware(datetime.combine(timezone.now().date(), time.min))
+        return restaurants[0], customers[0], today
+
+    def _hot_queries(self, restaurant, customer, day):
+        def page(queryset, cursor_row=None):
+            params = {}
+            paginator = ReservationKeysetPagination()
+            if cursor_row is not None:
+                params["cursor"] = paginator.encode_cursor((cursor_row.reservation_time, cursor_row.id))
+            paginator.paginate_queryset(queryset, Request(APIRequestFactory().get("/", params)))
+
+        customer_reservations = ReservationRepository.get_customer_reservations(customer)
+        restaurant_reservations = ReservationRepository.get_restaurant_reservations(restaurant.id, restaurant.owner)
+        deep_customer_row = customer_reservations.order_by("reservation_time", "id").first()
+        deep_restaurant_row = restaurant_reservations.order_by("reservation_time", "id")[20]
+        restaurant_ids = list(Restaurant.objects.filter(owner=restaurant.owner).values_list("id", flat=True))
+
+        return [
+            ("allocation: free table groups", lambda: ReservationRepository.get_free_table_groups(restaurant, day + timedelta(hours=19), 90, 2)),
+            ("availability: slot grid for one day", lambda: ReservationRepository.get_slot_grid(restaurant, day, day + timedelta(days=1), 2)),
+            ("availability: batch slot grids", lambda: ReservationRepository.get_slot_grids(restaurant_ids, day, day + timedelta(days=2), 2)),
+            ("customer listing: first page", lambda: page(customer_reservations)),
+            ("customer listing: last page", lambda: page(customer_reservations, deep_customer_row)),
+            ("owner listing: first page", lambda: page(restaurant_reservations)),
+            ("owner listing: deep page", lambda: page(restaurant_reservations, deep_restaurant_row)),
+        ]
+
+    def _explain(self, label, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")
+            plan = [line for line, in cursor.fetchall()]
+        indexes = sorted({line.split(" using ")[1].split()[0] for line in plan if " using " in line})
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {label}"))
+        self.stdout.write(f"Indexes: {', '.join(indexes) or 'none (sequential scan)'}")
+        self.stdout.write("\n".join(plan) + "\n")
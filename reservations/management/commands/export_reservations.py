@@ -0,0 +1,43 @@
+import sys
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reservations.export import export_reservations
+from restaurants.repository import RestaurantRepository
+
+
+class Command(BaseCommand):
+    help = "Stream an owner's reservations as CSV or NDJSON, in constant memory whatever the number of rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", required=True, help="Username of the restaurant owner")
+        parser.add_argument("--restaurant", type=int, action="append", default=[], help="Restaurant id; repeatable, all of the owner's by default")
+        parser.add_argument("--start", type=datetime.fromisoformat, help="Earliest reservation_time, inclusive")
+        parser.add_argument("--end", type=datetime.fromisoformat, help="Latest reservation_time, exclusive")
+        parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--output", help="File to write; standard output by default")
+
+    def handle(self, *args, **options):
+        owner = get_user_model().objects.filter(username=options["owner"]).first()
+        if not owner:
+            raise CommandError(f"User {options['owner']} does not exist.")
+        restaurant_ids = RestaurantRepository.get_restaurant_ids_for_owner(owner)
+        if options["restaurant"]:
+            foreign = set(options["restaurant"]) - set(restaurant_ids)
+            if foreign:
+                raise CommandError(f"{options['owner']} does not own restaurants {sorted(foreign)}.")
+            restaurant_ids = options["restaurant"]
+        start, end = (
+            timezone.make_aware(moment) if moment and timezone.is_naive(moment) else moment
+            for moment in (options["start"], options["end"])
+        )
+
+        chunks = export_reservations(restaurant_ids, options["format"], start, end)
+        if options["output"]:
+            with open(options["output"], "w", newline="") as handle:
+                handle.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
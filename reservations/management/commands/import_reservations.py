@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import CommandError
+from django.contrib.auth import get_user_model
+
+from reservations.repository import ReservationRepository
+from restaurant_reservation.importing import ImportCommand
+
+
+class Command(ImportCommand):
+    help = "Import reservations from an NDJSON or CSV file, allocating tables in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File with one reservation per line (.ndjson/.jsonl) or per row (.csv)")
+        parser.add_argument("--customer", required=True, help="Username the reservations are booked for")
+        parser.add_argument("--format", choices=["ndjson", "csv"], help="Input format, guessed from the file extension by default")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows allocated and written per transaction")
+
+    def handle(self, *args, **options):
+        customer = get_user_model().objects.filter(username=options["customer"]).first()
+        if not customer:
+            raise CommandError(f"User {options['customer']} does not exist.")
+
+        started = time.perf_counter()
+        created, failed = self.import_rows(
+            options["path"], self.input_format(options), options["batch_size"],
+            lambda batch: ReservationRepository.import_reservations(batch, customer),
+        )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} reservations, {failed} failed, in {elapsed:.2f}s"))
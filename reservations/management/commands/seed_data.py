@@ -0,0 +1,289 @@
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as clock, timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from reservations.models import Reservation
+from reservations.partitions import ensure_partitions, is_partitioned
+from restaurants.models import OpeningHour, Restaurant, Table
+
+
+# Weekly opening-hour patterns as (day, open, close, is_closed); a close time
+# before the open time runs past midnight.
+SCHEDULES = [
+    [(day, clock(11, 30), clock(14, 30), day == "mon") for day, _ in OpeningHour.DAYS]
+    + [(day, clock(18), clock(23), day == "mon") for day, _ in OpeningHour.DAYS],
+    [(day, clock(12), clock(22), False) for day, _ in OpeningHour.DAYS],
+    [(day, clock(17), clock(1) if day in ("fri", "sat") else clock(23), day == "mon") for day, _ in OpeningHour.DAYS],
+]
+
+# Relative demand per weekday (Monday first) and the share of bookings canceled.
+WEEKDAY_DEMAND = [0.55, 0.6, 0.65, 0.75, 0.95, 1.0, 0.8]
+CANCEL_RATE = 0.08
+
+# Average bookings a table takes per open day, used to size the date range for --reservations.
+BOOKINGS_PER_TABLE_DAY = 2.5
+
+CHUNK_SIZE = 8192
+
+
+def copy_value(value):
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+class RowStream:
+    """
+    File-like view of a row generator in COPY text format, so a whole table
+    streams through one COPY without ever being held in memory.
+    """
+
+    def __init__(self, rows):
+        self._lines = ("\t".join(map(copy_value, row)) + "\n" for row in rows)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    readline = read
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate deterministic synthetic users, restaurants, tables, opening hours and reservations. "
+        "Rows are streamed with COPY on Postgres, or bulk_create elsewhere, in constant memory. "
+        "Reservations are loaded by parallel workers, each committing its own share, "
+        "and the occupancy rollups are rebuilt from them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservations", type=int, default=100_000)
+        parser.add_argument("--restaurants", type=int, default=1000)
+        parser.add_argument("--tables", type=int, default=20, help="Average tables per restaurant")
+        parser.add_argument("--customers", type=int, default=50_000)
+        parser.add_argument("--owners", type=int, default=500)
+        parser.add_argument("--days-ahead", type=int, default=14, help="Days of future bookings; everything earlier is history")
+        parser.add_argument("--start", type=datetime.fromisoformat, help="First booking day; defaults to the range ending --days-ahead from today")
+        parser.add_argument("--prefix", default="seed", help="Username prefix of the generated users")
+        parser.add_argument("--password", default="seed-password", help="Password of every generated user")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--workers", type=int, default=4, help="Parallel connections loading reservations (Postgres only)")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users prefixed {options['prefix']}- already exist; pick another --prefix.")
+
+        rng = random.Random(options["seed"])
+        days = max(1, math.ceil(options["reservations"] / (options["restaurants"] * options["tables"] * BOOKINGS_PER_TABLE_DAY)))
+        first_day = options["start"].date() if options["start"] else timezone.localdate() - timedelta(days=days - options["days_ahead"])
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            owner_ids = self._load_users(User, "owner", "OWNER", options["owners"], options)
+            customer_ids = self._load_users(User, "customer", "CUSTOMER", options["customers"], options)
+            restaurants = self._load_restaurants(rng, owner_ids, options["restaurants"])
+            tables = self._load_tables(rng, restaurants, options["tables"])
+            self._load_opening_hours(restaurants)
+            self._reset_sequences(User, Restaurant, Table, OpeningHour)
+
+        # A shard per worker needs at least one table.
+        workers = max(1, min(options["workers"], len(tables))) if connection.vendor == "postgresql" else 1
+        if is_partitioned():
+            # Rows of months without a partition would all pile up in the DEFAULT one.
+            ensure_partitions(first_day - timedelta(days=1), first_day + timedelta(days=days + 1))
+        count = self._load_reservations(options["seed"], restaurants, tables, customer_ids, first_day, days, options["reservations"], workers)
+        self._reset_sequences(Reservation)
+        # COPY bypasses the repository, which keeps the rollups up to date on every other write.
+        call_command("rebuild_occupancy_rollups", restaurant=[restaurant_id for restaurant_id, _ in restaurants], workers=workers, stdout=self.stdout)
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                for model in (User, Restaurant, Table, OpeningHour, Reservation):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['owners'] + options['customers']} users, {len(restaurants)} restaurants, "
+            f"{len(tables)} tables and {count} reservations from {first_day} in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def _write(self, model, columns, rows):
+        """
+        Insert rows (tuples aligned with `columns`) into the model's table and return how many were written.
+        """
+        written = 0
+
+        def counted():
+            nonlocal written
+            for row in rows:
+                written += 1
+                yield row
+
+        if connection.vendor == "postgresql":
+            table = connection.ops.quote_name(model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", RowStream(counted()), size=CHUNK_SIZE * 16)
+        else:
+            rows = counted()
+            while chunk := list(islice(rows, CHUNK_SIZE)):
+                model.objects.bulk_create([model(**dict(zip(columns, row))) for row in chunk])
+        return written
+
+    def _next_id(self, model):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(model._meta.db_table)}")
+            return cursor.fetchone()[0] + 1
+
+    def _reset_sequences(self, *models):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+    def _load_users(self, User, kind, role, count, options):
+        # One hash shared by every user: bcrypt per row would take longer than everything else together.
+        password = make_password(options["password"])
+        now = timezone.now()
+        first_id = self._next_id(User)
+        self._write(User, ["id", "password", "is_superuser", "username", "first_name", "last_name", "email", "is_staff", "is_active", "date_joined", "role", "phone_number"], (
+            (first_id + number, password, False, f"{options['prefix']}-{kind}-{number}", "", "", f"{options['prefix']}-{kind}-{number}@example.com", False, True, now, role, "")
+            for number in range(count)
+        ))
+        return range(first_id, first_id + count)
+
+    def _load_restaurants(self, rng, owner_ids, count):
+        """
+        Returns (id, schedule index) per restaurant.
+        """
+        now = timezone.now()
+        first_id = self._next_id(Restaurant)
+        restaurants = [(first_id + number, rng.randrange(len(SCHEDULES))) for number in range(count)]
+        self._write(Restaurant, ["id", "name", "address", "phone_number", "owner_id", "created_at"], (
+            (restaurant_id, f"Restaurant {restaurant_id}", f"{rng.randrange(1, 999)} Main St", None, rng.choice(owner_ids), now)
+            for restaurant_id, _ in restaurants
+        ))
+        return restaurants
+
+    def _load_tables(self, rng, restaurants, average):
+        """
+        Returns (id, restaurant id, capacity) per table.
+        """
+        tables = []
+        next_id = self._next_id(Table)
+        rows = []
+        for restaurant_id, _ in restaurants:
+            for number in range(max(1, round(rng.gauss(average, average / 4)))):
+                capacity = rng.choices([2, 4, 6, 8], weights=[35, 40, 15, 10])[0]
+                tables.append((next_id, restaurant_id, capacity))
+                rows.append((next_id, restaurant_id, str(number + 1), capacity, rng.random() < 0.2, True, capacity <= 4 and rng.random() < 0.3))
+                next_id += 1
+        self._write(Table, ["id", "restaurant_id", "table_number", "capacity", "is_outdoor", "is_available", "is_joinable"], rows)
+        return tables
+
+    def _load_opening_hours(self, restaurants):
+        first_id = self._next_id(OpeningHour)
+        rows = (
+            (restaurant_id, day, open_time, close_time, is_closed)
+            for restaurant_id, schedule in restaurants
+            for day, open_time, close_time, is_closed in SCHEDULES[schedule]
+        )
+        self._write(OpeningHour, ["id", "restaurant_id", "day", "open_time", "close_time", "is_closed"], (
+            (first_id + position, *row) for position, row in enumerate(rows)
+        ))
+
+    def _load_reservations(self, seed, restaurants, tables, customer_ids, first_day, days, target, workers):
+        """
+        Split the tables into one shard per worker, booking at most `days` days from
+        first_day, so fewer than `target` rows come out when those days are full. Every worker streams its shard's
+        bookings through its own connection and transaction, since checking the
+        overlap constraint's GiST index dominates the load and runs per backend.
+        Ids are interleaved across shards (first_id + shard + workers * n), and each
+        shard has its own seeded generator, so the output depends only on the options.
+        Shards without tables are skipped.
+        """
+        schedules = dict(restaurants)
+        first_id = self._next_id(Reservation)
+        columns = ["id", "customer_id", "restaurant_id", "table_id", "reservation_time", "number_of_guests", "duration", "end_time", "created_at", "canceled"]
+
+        def load(shard):
+            if not tables[shard::workers]:
+                return 0
+            try:
+                with transaction.atomic():
+                    return self._write(Reservation, columns, islice(
+                        self._reservation_rows(
+                            random.Random(f"{seed}-{shard}"), schedules, tables[shard::workers], customer_ids, first_day, days,
+                            first_id + shard, workers,
+                        ),
+                        target // workers + (1 if shard < target % workers else 0),
+                    ))
+            finally:
+                if workers > 1:
+                    connection.close()
+
+        if workers == 1:
+            return load(0)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return sum(pool.map(load, range(workers)))
+
+    def _reservation_rows(self, rng, schedules, tables, customer_ids, first_day, days, first_id, id_step):
+        """
+        Day by day for `days` days, walk every table through its opening hours and book it with a
+        probability shaped by weekday and the dinner peak. Bookings on a table are
+        laid end to end, so the overlap constraint can never reject a row.
+        """
+        tzinfo = timezone.get_current_timezone()
+        now = timezone.now()
+        next_id = first_id
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            weekday = day.weekday()
+            code = OpeningHour.DAYS[weekday][0]
+            for table_id, restaurant_id, capacity in tables:
+                for schedule_day, open_time, close_time, is_closed in SCHEDULES[schedules[restaurant_id]]:
+                    if is_closed or schedule_day != code:
+                        continue
+                    cursor = datetime.combine(day, open_time, tzinfo=tzinfo)
+                    close = datetime.combine(day + timedelta(days=1) if close_time <= open_time else day, close_time, tzinfo=tzinfo)
+                    while True:
+                        duration = rng.choice([60, 90, 90, 120])
+                        end = cursor + timedelta(minutes=duration)
+                        if end > close:
+                            break
+                        peak = 1.4 if 19 <= cursor.hour < 21 or 12 <= cursor.hour < 13 else 1.0
+                        if rng.random() < 0.42 * WEEKDAY_DEMAND[weekday] * peak:
+                            # Frequent diners: squaring skews picks towards the first customers.
+                            customer_id = customer_ids[int(len(customer_ids) * rng.random() ** 2)]
+                            booked_at = min(now, cursor - timedelta(hours=min(24 * 60, rng.expovariate(1 / 96))))
+                            yield (
+                                next_id, customer_id, restaurant_id, table_id, cursor,
+                                rng.randint(max(1, capacity - 3), capacity), duration, end, booked_at, rng.random() < CANCEL_RATE,
+                            )
+                            next_id += id_step
+                            cursor = end + timedelta(minutes=15)
+                        else:
+                            cursor += timedelta(minutes=30)
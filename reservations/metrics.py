@@ -0,0 +1,56 @@
+import threading
+
+
+class AllocationMetrics:
+    """
+    Process-wide counters for table allocation: time spent waiting for the
+    restaurant allocation lock, retries and allocations that gave up.
+    """
+
+    # Upper bounds, in seconds, of the lock-wait histogram buckets.
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._wait_count = 0
+            self._wait_total = 0.0
+            self._wait_max = 0.0
+            self._wait_buckets = [0] * len(self.BUCKETS)
+            self._retries = 0
+            self._failures = 0
+
+    def observe_lock_wait(self, seconds):
+        with self._lock:
+            self._wait_count += 1
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+            for position, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    self._wait_buckets[position] += 1
+
+    def record_retry(self):
+        with self._lock:
+            self._retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "lock_waits": self._wait_count,
+                "lock_wait_seconds_total": self._wait_total,
+                "lock_wait_seconds_max": self._wait_max,
+                # Cumulative, like a Prometheus histogram: waits of at most each bound.
+                "lock_wait_buckets": dict(zip(self.BUCKETS, self._wait_buckets)),
+                "retries": self._retries,
+                "failures": self._failures,
+            }
+
+
+allocation_metrics = AllocationMetrics()
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.12 on 2025-06-02 09:14
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+import reservations.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0002_rename_durration_reservation_duration_and_more"),
+        ("restaurants", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reservation",
+            name="end_time",
+            field=models.DateTimeField(
+                editable=False,
+                help_text="reservation_time + duration, kept in sync on save",
+                null=True,
+            ),
+        ),
+        migrations.RunSQL(
+            sql="UPDATE reservations_reservation SET end_time = reservation_time + duration * INTERVAL '1 minute'",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name="reservation",
+            name="end_time",
+            field=models.DateTimeField(
+                editable=False,
+                help_text="reservation_time + duration, kept in sync on save",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="reservation",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="reservation",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("canceled", False)),
+                expressions=[
+                    (
+                        reservations.models.Int8Range(
+                            "table",
+                            "table",
+                            django.contrib.postgres.fields.ranges.RangeBoundary(
+                                inclusive_lower=True, inclusive_upper=True
+                            ),
+                        ),
+                        "=",
+                    ),
+                    (
+                        reservations.models.TsTzRange(
+                            "reservation_time",
+                            "end_time",
+                            django.contrib.postgres.fields.ranges.RangeBoundary(),
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="reservation_table_no_overlap",
+            ),
+        ),
+    ]
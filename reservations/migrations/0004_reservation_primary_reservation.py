@@ -0,0 +1,26 @@
+# Generated by Django 5.0.12 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0003_reservation_end_time_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reservation",
+            name="primary_reservation",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Set on the extra tables of a party seated across joined tables",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="joined_reservations",
+                to="reservations.reservation",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.12 on 2026-10-18 17:24
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("reservations", "0004_reservation_primary_reservation"),
+        ("restaurants", "0002_table_is_joinable"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="reservation",
+            options={"ordering": ["-reservation_time", "-id"]},
+        ),
+        AddIndexConcurrently(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("primary_reservation__isnull", True)),
+                fields=["customer", "-reservation_time", "-id"],
+                name="reservation_cust_list_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("primary_reservation__isnull", True)),
+                fields=["restaurant", "-reservation_time", "-id"],
+                name="reservation_rest_list_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.12 on 2026-10-18 17:28
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("reservations", "0005_reservation_list_indexes"),
+        ("restaurants", "0002_table_is_joinable"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("canceled", False)),
+                fields=["restaurant", "end_time"],
+                include=("table", "reservation_time"),
+                name="reservation_rest_active_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.12 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0006_reservation_active_index"),
+        ("restaurants", "0002_table_is_joinable"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OccupancyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("hour", models.PositiveSmallIntegerField()),
+                (
+                    "reservations",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Parties booked to start in the hour, canceled ones included",
+                    ),
+                ),
+                (
+                    "cancellations",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Canceled parties that were booked to start in the hour",
+                    ),
+                ),
+                (
+                    "seats",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Guests of the active parties starting in the hour",
+                    ),
+                ),
+                (
+                    "table_minutes",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Minutes of the hour spent at tables by active parties, summed over tables",
+                    ),
+                ),
+                (
+                    "restaurant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy_rollups",
+                        to="restaurants.restaurant",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="occupancyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("restaurant", "date", "hour"),
+                name="occupancy_rollup_bucket_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.0.12 on 2026-10-18 18:15
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Creates the partition for the month of `month` (a no-op when it exists): the
+# table is built detached, takes over the month's rows from the DEFAULT partition
+# and gets its own overlap constraint, then is attached, which creates the
+# parent's indexes on it. Partition bounds are UTC months.
+CREATE_PARTITION_FUNCTION = """
+CREATE FUNCTION reservations_create_partition(month date) RETURNS boolean AS $$
+DECLARE
+    lower_bound timestamptz := date_trunc('month', month)::timestamp AT TIME ZONE 'UTC';
+    upper_bound timestamptz := (date_trunc('month', month) + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+    partition text := 'reservations_reservation_' || to_char(month, 'YYYYMM');
+BEGIN
+    IF to_regclass(partition) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE reservations_reservation INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition
+    );
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM reservations_reservation_default WHERE reservation_time >= %L AND reservation_time < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        lower_bound, upper_bound, partition
+    );
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+        '(int8range(table_id, table_id, ''[]'') WITH =, tstzrange(reservation_time, end_time) WITH &&) WHERE (NOT canceled)',
+        partition, partition || '_no_overlap'
+    );
+    EXECUTE format(
+        'ALTER TABLE reservations_reservation ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition, lower_bound, upper_bound
+    );
+    RETURN true;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+PARTITION_TABLE = f"""
+ALTER TABLE reservations_reservation RENAME TO reservations_reservation_unpartitioned;
+ALTER TABLE reservations_reservation_unpartitioned RENAME CONSTRAINT reservations_reservation_pkey TO reservations_reservation_unpartitioned_pkey;
+
+-- The partition key has to be part of the primary key.
+CREATE TABLE reservations_reservation (
+    LIKE reservations_reservation_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY
+) PARTITION BY RANGE (reservation_time);
+ALTER TABLE reservations_reservation ADD CONSTRAINT reservations_reservation_pkey PRIMARY KEY (id, reservation_time);
+
+-- Rows of months without a partition land here until their partition is created.
+CREATE TABLE reservations_reservation_default PARTITION OF reservations_reservation DEFAULT;
+ALTER TABLE reservations_reservation_default ADD CONSTRAINT reservations_reservation_default_no_overlap EXCLUDE USING gist
+    (int8range(table_id, table_id, '[]') WITH =, tstzrange(reservation_time, end_time) WITH &&) WHERE (NOT canceled);
+
+{CREATE_PARTITION_FUNCTION}
+
+-- Every month holding bookings, through a year ahead.
+SELECT reservations_create_partition(month::date)
+FROM generate_series(
+    date_trunc('month', LEAST((SELECT MIN(reservation_time) FROM reservations_reservation_unpartitioned), now()) AT TIME ZONE 'UTC'),
+    date_trunc('month', GREATEST((SELECT MAX(reservation_time) FROM reservations_reservation_unpartitioned), now()) AT TIME ZONE 'UTC') + INTERVAL '12 months',
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO reservations_reservation SELECT * FROM reservations_reservation_unpartitioned;
+SELECT setval(pg_get_serial_sequence('reservations_reservation', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM reservations_reservation;
+DROP TABLE reservations_reservation_unpartitioned;
+
+-- The indexes and foreign keys Django created on the old table, under the same names.
+CREATE INDEX reservations_reservation_customer_id_9e54bd39 ON reservations_reservation (customer_id);
+CREATE INDEX reservations_reservation_restaurant_id_9db26175 ON reservations_reservation (restaurant_id);
+CREATE INDEX reservations_reservation_table_id_721a33d3 ON reservations_reservation (table_id);
+CREATE INDEX reservations_reservation_primary_reservation_id_7d031f65 ON reservations_reservation (primary_reservation_id);
+CREATE INDEX reservation_cust_list_idx ON reservations_reservation (customer_id, reservation_time DESC, id DESC) WHERE primary_reservation_id IS NULL;
+CREATE INDEX reservation_rest_list_idx ON reservations_reservation (restaurant_id, reservation_time DESC, id DESC) WHERE primary_reservation_id IS NULL;
+CREATE INDEX reservation_rest_active_idx ON reservations_reservation (restaurant_id, end_time) INCLUDE (table_id, reservation_time) WHERE NOT canceled;
+ALTER TABLE reservations_reservation
+    ADD CONSTRAINT reservations_reservation_customer_id_9e54bd39_fk_users_user_id
+        FOREIGN KEY (customer_id) REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED,
+    ADD CONSTRAINT reservations_reserva_restaurant_id_9db26175_fk_restauran
+        FOREIGN KEY (restaurant_id) REFERENCES restaurants_restaurant (id) DEFERRABLE INITIALLY DEFERRED,
+    ADD CONSTRAINT reservations_reserva_table_id_721a33d3_fk_restauran
+        FOREIGN KEY (table_id) REFERENCES restaurants_table (id) DEFERRABLE INITIALLY DEFERRED;
+
+ANALYZE reservations_reservation;
+"""
+
+
+class Migration(migrations.Migration):
+    # Rewrites the reservation table in one transaction, holding it locked
+    # throughout; on a large table, run it in a maintenance window.
+
+    dependencies = [
+        ("reservations", "0007_occupancy_rollup"),
+        ("restaurants", "0002_table_is_joinable"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            # Dropping the old table drops the self-referencing foreign key with it.
+            database_operations=[migrations.RunSQL(PARTITION_TABLE)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="reservation",
+                    name="primary_reservation",
+                    field=models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        help_text="Set on the extra tables of a party seated across joined tables",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="joined_reservations",
+                        to="reservations.reservation",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="reservation",
+            name="duration",
+            field=models.PositiveIntegerField(
+                help_text="Duration in minutes",
+                validators=[django.core.validators.MaxValueValidator(1440)],
+            ),
+        ),
+    ]
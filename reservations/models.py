@@ -1,22 +1,128 @@
+from django.core.validators import MaxValueValidator
 from django.db import models
-from django.conf import settings    
+from django.conf import settings
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import BigIntegerRangeField, DateTimeRangeField, RangeBoundary, RangeOperators
+from datetime import timedelta
 
 
 
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class Int8Range(models.Func):
+    function = 'INT8RANGE'
+    output_field = BigIntegerRangeField()
+
+
 # Create your models here.
 
 class Reservation(models.Model):
+    # Longest booking accepted, in minutes. Overlap lookups rely on it to bound
+    # reservation_time from below, which lets Postgres skip past partitions.
+    MAX_DURATION = 24 * 60
+
     customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservations')
     restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='reservations')
     table = models.ForeignKey('restaurants.Table', on_delete=models.CASCADE, related_name='reservations')
     reservation_time = models.DateTimeField()
     number_of_guests = models.PositiveIntegerField()
-    duration = models.PositiveIntegerField(help_text="Duration in minutes")
+    duration = models.PositiveIntegerField(validators=[MaxValueValidator(MAX_DURATION)], help_text="Duration in minutes")
+    end_time = models.DateTimeField(editable=False, help_text="reservation_time + duration, kept in sync on save")
     special_requests = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     canceled = models.BooleanField(default=False)
-    
-    
+    primary_reservation = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True, related_name='joined_reservations',
+        # The partitioned table has no unique index on id alone for a foreign key to point at;
+        # joined rows share their primary's reservation_time, so they live in the same partition.
+        db_constraint=False,
+        help_text="Set on the extra tables of a party seated across joined tables",
+    )
+
+
+    class Meta:
+        ordering = ['-reservation_time', '-id']
+        indexes = [
+            # Keyset-paginated listings of primary reservations, in Meta.ordering order.
+            models.Index(
+                fields=['customer', '-reservation_time', '-id'],
+                name='reservation_cust_list_idx',
+                condition=models.Q(primary_reservation__isnull=True),
+            ),
+            models.Index(
+                fields=['restaurant', '-reservation_time', '-id'],
+                name='reservation_rest_list_idx',
+                condition=models.Q(primary_reservation__isnull=True),
+            ),
+            # Overlap lookups of a restaurant's active reservations (allocation, slot grids).
+            # Leading on end_time bounds the scan to bookings that have not ended yet, which
+            # stays small as history grows; the included columns make it an index-only scan.
+            models.Index(
+                fields=['restaurant', 'end_time'],
+                name='reservation_rest_active_idx',
+                include=['table', 'reservation_time'],
+                condition=models.Q(canceled=False),
+            ),
+        ]
+        # The table is partitioned by month on reservation_time (migration 0008), so the
+        # database holds this constraint once per partition: it cannot see an overlap
+        # between bookings on either side of a month boundary. Allocations near one
+        # always take the allocation lock, even with RESERVATION_ADVISORY_LOCKS off.
+        constraints = [
+            # No two active reservations may hold the same table over overlapping
+            # [reservation_time, end_time) ranges. The table id is wrapped in a
+            # single-value int8range so the GiST index needs no btree_gist extension.
+            ExclusionConstraint(
+                name='reservation_table_no_overlap',
+                expressions=[
+                    (Int8Range('table', 'table', RangeBoundary(inclusive_lower=True, inclusive_upper=True)), RangeOperators.EQUAL),
+                    (TsTzRange('reservation_time', 'end_time', RangeBoundary()), RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(canceled=False),
+            ),
+        ]
+
+
+    @staticmethod
+    def overlapping(window_start, window_end):
+        """
+        Q for reservations overlapping [window_start, window_end). The lower bound on
+        reservation_time follows from end_time and MAX_DURATION, and lets Postgres
+        prune the partitions and index ranges of bookings that ended long before.
+        """
+        return models.Q(
+            reservation_time__lt=window_end,
+            reservation_time__gt=window_start - timedelta(minutes=Reservation.MAX_DURATION),
+            end_time__gt=window_start,
+        )
+
+    def save(self, *args, **kwargs):
+        self.end_time = self.reservation_time + timedelta(minutes=self.duration)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'reservation_time', 'duration'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'end_time'}
+        super().save(*args, **kwargs)
+
+
+class OccupancyRollup(models.Model):
+    """
+    Booking totals of one restaurant for one hour of local time, kept up to
+    date by the reservation writes (see reservations.rollups) so analytics
+    never aggregate the reservation table itself.
+    """
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='occupancy_rollups')
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    reservations = models.IntegerField(default=0, help_text="Parties booked to start in the hour, canceled ones included")
+    cancellations = models.IntegerField(default=0, help_text="Canceled parties that were booked to start in the hour")
+    seats = models.IntegerField(default=0, help_text="Guests of the active parties starting in the hour")
+    table_minutes = models.IntegerField(default=0, help_text="Minutes of the hour spent at tables by active parties, summed over tables")
+
     class Meta:
-        ordering = ['-reservation_time']
-        unique_together = ('table',  'reservation_time')
+        constraints = [
+            # Also the index behind the analytics reads, which filter on restaurant and a date range.
+            models.UniqueConstraint(fields=['restaurant', 'date', 'hour'], name='occupancy_rollup_bucket_uniq'),
+        ]
@@ -0,0 +1,77 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ReservationKeysetPagination(BasePagination):
+    """
+    Cursor pagination over reservations, newest first, on (reservation_time, id).
+
+    The cursor is the position of the last row served, so each page is an
+    index range scan starting right after it and deep pages cost as much as
+    the first one. Expects a queryset that can use an index ordered like
+    Reservation.Meta.ordering.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            reservation_time, reservation_id = position
+            # The reservation_time__lte bound lets Postgres seek into the index;
+            # the OR then skips the rows of the same instant already served.
+            queryset = queryset.filter(
+                Q(reservation_time__lt=reservation_time) | Q(reservation_time=reservation_time, id__lt=reservation_id),
+                reservation_time__lte=reservation_time,
+            )
+
+        rows = list(queryset.order_by('-reservation_time', '-id')[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = (rows[-1].reservation_time, rows[-1].id) if self.has_next else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            reservation_time, reservation_id = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(reservation_time), int(reservation_id)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        reservation_time, reservation_id = position
+        return base64.urlsafe_b64encode(f'{reservation_time.isoformat()}|{reservation_id}'.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
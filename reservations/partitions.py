@@ -0,0 +1,173 @@
+"""
+Monthly partitions of the reservation table, and their archival.
+
+Migration 0008 partitions reservations_reservation by month (UTC) on
+reservation_time. A DEFAULT partition catches bookings for months that have
+no partition yet; the reservations_create_partition() SQL function creates a
+month's partition and moves its rows out of the default one. Old months leave
+the table either whole, by detaching their partitions, or row by row into a
+single archive table, so the hot queries never touch them.
+"""
+
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Reservation
+
+
+PARENT = Reservation._meta.db_table
+DEFAULT_PARTITION = f'{PARENT}_default'
+ARCHIVE_TABLE = f'{PARENT}_archive'
+
+MONTH_SUFFIX = re.compile(r'_(\d{4})(\d{2})$')
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned():
+    """
+    True once migration 0008 has partitioned the reservation table.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [PARENT])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def ensure_partitions(first_day, last_day):
+    """
+    Create the partitions of every month from first_day's to last_day's that is missing.
+    Returns the names of the partitions created.
+    """
+    created = []
+    month, last_month = month_start(first_day), month_start(last_day)
+    with connection.cursor() as cursor:
+        while month <= last_month:
+            cursor.execute("SELECT reservations_create_partition(%s)", [month])
+            if cursor.fetchone()[0]:
+                created.append(f'{PARENT}_{month:%Y%m}')
+            month = add_months(month, 1)
+    return created
+
+
+def ensure_upcoming_partitions(months_ahead=None, first_day=None):
+    """
+    Create the missing partitions from first_day's month (the current one by default)
+    through months_ahead (RESERVATION_PARTITION_MONTHS_AHEAD) months after it.
+    """
+    if months_ahead is None:
+        months_ahead = settings.RESERVATION_PARTITION_MONTHS_AHEAD
+    first_month = month_start(first_day or timezone.now().date())
+    return ensure_partitions(first_month, add_months(first_month, months_ahead))
+
+
+def monthly_partitions():
+    """
+    The attached monthly partitions as (first day of the month, table name), oldest first.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [PARENT],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = MONTH_SUFFIX.search(name)
+        if match:
+            partitions.append((date(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+def utc_midnight(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def near_month_boundary(start, end):
+    """
+    True if a booking over [start, end) can overlap one held by another monthly
+    partition, whose exclusion constraint cannot see it: it runs past the start
+    of a month, or starts less than MAX_DURATION after one, when a booking of
+    the previous month may still be running.
+    """
+    month = month_start(start.astimezone(dt_timezone.utc).date())
+    return (
+        start - utc_midnight(month) < timedelta(minutes=Reservation.MAX_DURATION)
+        or end > utc_midnight(add_months(month, 1))
+    )
+
+
+def detach_partitions(cutoff):
+    """
+    Detach every monthly partition ending on or before the date `cutoff` and rename
+    it to {ARCHIVE_TABLE}_YYYYMM, keeping its rows out of the reservation table.
+    Months whose rows still sit in the DEFAULT partition get theirs first.
+    Returns the archive table names.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT MIN(reservation_time) FROM {quote(DEFAULT_PARTITION)} WHERE reservation_time < %s", [utc_midnight(cutoff)]
+        )
+        oldest = cursor.fetchone()[0]
+    if oldest is not None:
+        ensure_partitions(oldest.astimezone(dt_timezone.utc).date(), add_months(month_start(cutoff), -1))
+
+    archived = []
+    for month, name in monthly_partitions():
+        if add_months(month, 1) > cutoff:
+            break
+        archive = f'{ARCHIVE_TABLE}_{month:%Y%m}'
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {quote(PARENT)} DETACH PARTITION {quote(name)}")
+            cursor.execute(f"ALTER TABLE {quote(name)} RENAME TO {quote(archive)}")
+        archived.append(archive)
+    return archived
+
+
+def move_rows(cutoff, batch_size):
+    """
+    Move reservations starting before the date `cutoff` into ARCHIVE_TABLE, `batch_size`
+    rows per transaction so locks and WAL stay bounded, then drop the monthly
+    partitions this emptied. Yields the number of rows moved per batch.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {quote(ARCHIVE_TABLE)} (LIKE {quote(PARENT)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH batch AS ("
+                f"  DELETE FROM {quote(PARENT)} WHERE (id, reservation_time) IN ("
+                f"    SELECT id, reservation_time FROM {quote(PARENT)} WHERE reservation_time < %s ORDER BY reservation_time LIMIT %s"
+                f"  ) RETURNING *"
+                f") INSERT INTO {quote(ARCHIVE_TABLE)} SELECT * FROM batch",
+                [utc_midnight(cutoff), batch_size],
+            )
+            moved = cursor.rowcount
+        if moved:
+            yield moved
+        if moved < batch_size:
+            break
+
+    for month, name in monthly_partitions():
+        if add_months(month, 1) > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {quote(PARENT)} DETACH PARTITION {quote(name)}")
+            cursor.execute(f"DROP TABLE {quote(name)}")
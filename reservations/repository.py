@@ -1,102 +1,507 @@
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import OuterRef, Q
 from django.utils import timezone
 from datetime import timedelta
+from collections import defaultdict
+import time
+from .metrics import allocation_metrics
+from rest_framework.exceptions import ValidationError
 from .models import Reservation
-from restaurants.models import Table
+from .partitions import near_month_boundary
+from .rollups import OccupancyDeltas
+from .serializers import BulkReservationSerializer
+from restaurants.models import OpeningHour, Table
+from restaurants.schedule import ScheduleCache
+from .service import ReservationIntervalIndex, SlotGrid, TableAllocator, opening_intervals
 
 
+# SQLSTATE raised by Postgres when the reservation_table_no_overlap constraint rejects a row.
+EXCLUSION_VIOLATION = '23P01'
+
+
+# SQLSTATEs worth retrying an allocation on: serialization failure, deadlock,
+# lock_timeout expiry, and constraint races that slipped past the allocation lock.
+TRANSIENT_FAILURES = {'40001', '40P01', '55P03', EXCLUSION_VIOLATION, '23505'}
+
+# Rows per INSERT statement when writing imported reservations.
+BULK_BATCH_SIZE = 1000
+
+# First key of the two-key advisory lock, so restaurant locks don't collide with other users of advisory locks.
+ADVISORY_LOCK_NAMESPACE = 5003
+
+
+class ReservationConflictError(Exception):
+    """
+    Raised when an allocation keeps failing on concurrent bookings after all retries.
+    """
+
+
+class OutsideOpeningHoursError(Exception):
+    """
+    Raised when a reservation does not fit inside the restaurant's opening hours.
+    """
+
+
+class ReservationNotFoundError(Exception):
+    """
+    Raised when the customer has no such active reservation, e.g. after a concurrent cancel.
+    """
+
+
+
+def is_overlap_conflict(error):
+    return getattr(error.__cause__, 'pgcode', None) == EXCLUSION_VIOLATION
+
+
+def is_transient_failure(error):
+    return getattr(error.__cause__, 'pgcode', None) in TRANSIENT_FAILURES
+
 
 class ReservationRepository:
     
     @staticmethod
-    def is_table_available(restaurant, reservation_time, duration, number_of_guests, exclude_reservation_id=None):
+    def get_candidate_tables(restaurant, number_of_guests):
         """
-        Check if a table is available for a given time and duration.
+        Tables in service that can seat the party, alone or joined with other tables, smallest first.
+        """
+        return Table.objects.filter(restaurant=restaurant, is_available=True).filter(
+            Q(capacity__gte=number_of_guests) | Q(is_joinable=True)
+        ).order_by('capacity', 'id')
+    
+    
+    @staticmethod
+    def get_candidate_tables_for_restaurants(restaurant_ids, number_of_guests):
+        """
+        Same rule as get_candidate_tables, across several restaurants in one query.
+        """
+        return Table.objects.filter(restaurant_id__in=restaurant_ids, is_available=True).filter(
+            Q(capacity__gte=number_of_guests) | Q(is_joinable=True)
+        ).order_by('capacity', 'id')
+    
+    
+    @staticmethod
+    def get_free_table_groups(restaurant, reservation_time, duration, number_of_guests, exclude_reservation_id=None):
+        """
+        Yield the table groups (a single table, or joinable tables pushed together) that can take the party
+        for the given time and duration, best fit first.
+        Uses one query for the candidate tables and one for the restaurant's reservations.
         """
         end_time = reservation_time + timedelta(minutes=duration)
-        overlapping = Reservation.objects.filter(
-            restaurant=restaurant,
+        allocator = TableAllocator(ReservationRepository.get_candidate_tables(restaurant, number_of_guests))
+        
+        index = ReservationIntervalIndex.load(restaurant, reservation_time, end_time, exclude_reservation_id)
+        
+        return allocator.free_groups(number_of_guests, index, reservation_time, end_time)
+    
+    
+    @staticmethod
+    def get_slot_grid(restaurant, window_start, window_end, number_of_guests):
+        """
+        Build the occupancy grid of the tables that can seat the party over [window_start, window_end).
+        """
+        return ReservationRepository.get_slot_grids([restaurant.id], window_start, window_end, number_of_guests)[restaurant.id]
+    
+    
+    @staticmethod
+    def get_slot_grids(restaurant_ids, window_start, window_end, number_of_guests):
+        """
+        Build one occupancy grid per restaurant over [window_start, window_end), keyed by restaurant id.
+        Uses one query each for tables, reservations and opening hours, however many restaurants are asked for.
+        """
+        tables = defaultdict(list)
+        for table in ReservationRepository.get_candidate_tables_for_restaurants(restaurant_ids, number_of_guests).only(
+            'id', 'restaurant_id', 'capacity', 'is_outdoor', 'is_joinable'
+        ):
+            tables[table.restaurant_id].append(table)
+        
+        reservations = defaultdict(list)
+        for restaurant_id, *interval in Reservation.objects.filter(
+            Reservation.overlapping(window_start, window_end),
+            restaurant_id__in=restaurant_ids,
             canceled=False,
-            reservation_time=end_time,
-        ).exclude(id=exclude_reservation_id)
+        ).order_by().values_list('restaurant_id', 'table_id', 'reservation_time', 'end_time'):
+            reservations[restaurant_id].append(interval)
         
-        tables = Table.objects.filter(restaurant=restaurant, capacity=number_of_guests).order_by('capacity')
+        opening_hours = defaultdict(list)
+        for restaurant_id, *hours in OpeningHour.objects.filter(restaurant_id__in=restaurant_ids).values_list('restaurant_id', 'day', 'open_time', 'close_time', 'is_closed'):
+            opening_hours[restaurant_id].append(hours)
         
-        for table in tables:
-           has_conflict = overlapping.filter(table=table).exists()
-           if not has_conflict:
-               return table
-           return None
+        grids = {}
+        for restaurant_id in restaurant_ids:
+            allocator = TableAllocator(tables[restaurant_id])
+            grids[restaurant_id] = SlotGrid(
+                window_start,
+                window_end,
+                [table.id for table in tables[restaurant_id]],
+                reservations[restaurant_id],
+                opening_intervals(opening_hours[restaurant_id], window_start, window_end),
+                groups=allocator.singles(number_of_guests),
+                joined=allocator.joined_patterns(number_of_guests),
+            )
+        return grids
+    
+    
+    @staticmethod
+    def build_joined_reservation(reservation, table):
+        """
+        Unsaved row holding an extra table of a party seated across joined tables.
+        """
+        return Reservation(
+            customer_id=reservation.customer_id,
+            restaurant_id=reservation.restaurant_id,
+            table=table,
+            reservation_time=reservation.reservation_time,
+            number_of_guests=0,
+            duration=reservation.duration,
+            end_time=reservation.end_time,
+            primary_reservation=reservation,
+        )
+    
+    
+    @staticmethod
+    def save_on_first_free_group(reservation, table_groups):
+        """
+        Save the reservation on the first table group the database accepts.
+        The first table of a group holds the reservation, every other table gets a joined reservation row.
+        The exclusion constraint rejects a group that was booked after our read, in which case the next one is tried.
+        The saved reservation carries the tables of its joined rows in joined_table_ids.
+        """
+        for tables in table_groups:
+            try:
+                with transaction.atomic():
+                    if reservation.pk:
+                        reservation.joined_reservations.all().delete()
+                    reservation.table = tables[0]
+                    reservation.save()
+                    Reservation.objects.bulk_create([
+                        ReservationRepository.build_joined_reservation(reservation, table) for table in tables[1:]
+                    ])
+                reservation.joined_table_ids = [table.id for table in tables[1:]]
+                return reservation
+            except IntegrityError as e:
+                if not is_overlap_conflict(e):
+                    raise
+        return None
+       
+       
+    @staticmethod
+    def lock_restaurant(restaurant_id, required=False):
+        """
+        Take the restaurant's allocation lock for the rest of the current transaction.
+        Concurrent bookings for the same restaurant queue here instead of racing for the same tables.
+        With RESERVATION_ADVISORY_LOCKS off the lock is only taken when `required`.
+        """
+        if not (settings.RESERVATION_ADVISORY_LOCKS or required):
+            return
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('lock_timeout', %s, true), pg_advisory_xact_lock(%s, %s)",
+                [f"{settings.RESERVATION_LOCK_TIMEOUT_MS}ms", ADVISORY_LOCK_NAMESPACE, restaurant_id % 2**31],
+            )
+        allocation_metrics.observe_lock_wait(time.perf_counter() - started)
+    
+    
+    @staticmethod
+    def run_allocation(restaurant_ids, allocate, windows=()):
+        """
+        Run `allocate` in a transaction holding the allocation lock of every restaurant in `restaurant_ids`.
+        Locks are taken in id order so overlapping batches cannot deadlock each other.
+        `windows` are the (restaurant_id, start, end) of the bookings being placed: a restaurant
+        with one near a month boundary is locked even with RESERVATION_ADVISORY_LOCKS off, since
+        the per-partition exclusion constraints cannot catch an overlap across the boundary.
+        Transient failures (serialization, deadlock, lock timeout, constraint races) are retried
+        up to RESERVATION_MAX_RETRIES times before giving up with ReservationConflictError.
+        """
+        required = {restaurant_id for restaurant_id, start, end in windows if near_month_boundary(start, end)}
+        max_retries = settings.RESERVATION_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            try:
+                with transaction.atomic():
+                    for restaurant_id in sorted(set(restaurant_ids)):
+                        ReservationRepository.lock_restaurant(restaurant_id, required=restaurant_id in required)
+                    return allocate()
+            except (OperationalError, IntegrityError) as e:
+                if not is_transient_failure(e):
+                    raise
+                if attempt == max_retries:
+                    allocation_metrics.record_failure()
+                    raise ReservationConflictError(f"Could not allocate tables at restaurants {sorted(set(restaurant_ids))} after {attempt + 1} attempts.") from e
+                allocation_metrics.record_retry()
        
        
+    @staticmethod
+    def check_opening_hours(restaurant_id, reservation_time, duration):
+        """
+        Reject a booking outside the restaurant's opening hours before any table is allocated.
+        Uses the compiled weekly schedule, so no query is made once it is cached.
+        """
+        if not ScheduleCache.get(restaurant_id).admits(reservation_time, duration):
+            raise OutsideOpeningHoursError(f"Restaurant {restaurant_id} is closed for part of {reservation_time} + {duration} minutes.")
+    
+    
     @staticmethod
     def create_reservation(data, user):
-        with transaction.atomic():
-            reservation_time = data.get('reservation_time')
-            duration = data.get('duration')
-            restaurant = data.get('restaurant')
-            number_of_guests = data.get('number_of_guests')
-            
-            table = ReservationRepository.is_table_available(restaurant, reservation_time, duration, number_of_guests)
-            
-            if not table:
-                return None
+        reservation_time = data.get('reservation_time')
+        duration = data.get('duration')
+        restaurant = data.get('restaurant')
+        number_of_guests = data.get('number_of_guests')
+        ReservationRepository.check_opening_hours(restaurant.id, reservation_time, duration)
+        
+        def allocate():
+            table_groups = ReservationRepository.get_free_table_groups(restaurant, reservation_time, duration, number_of_guests)
             
-            reservation = Reservation.objects.create(
-                customer=user,
+            reservation = Reservation(
+                customer_id=user.id,
                 restaurant=restaurant,
-                table=table,
                 reservation_time=reservation_time,
                 number_of_guests=number_of_guests,
                 duration=duration,
                 special_requests=data.get('special_requests', '')
             )
+            if ReservationRepository.save_on_first_free_group(reservation, table_groups) is None:
+                return None
+            deltas = OccupancyDeltas()
+            deltas.add_reservation(reservation, 1 + len(reservation.joined_table_ids))
+            deltas.apply()
             return reservation
         
+        return ReservationRepository.run_allocation(
+            [restaurant.id], allocate, [(restaurant.id, reservation_time, reservation_time + timedelta(minutes=duration))]
+        )
+        
         
         
     @staticmethod
-    def update_reservation(reservation_id, data, user):
+    def bulk_create_reservations(rows, user):
         """
-        Update an existing reservation.
+        Allocate and insert many reservations for `user` in one transaction.
+        Each restaurant's tables and bookings are read once and the whole batch is allocated in memory
+        against that snapshot, then written with bulk_create.
+        Returns a list aligned with `rows` holding the saved Reservation, or None where no table was free.
         """
-        reservation = Reservation.objects.filter(id=reservation_id, custome=user, canceled=False).first()
-        if not reservation:
-            return None
-        
-        reservation_time = data.get('reservation_time', reservation.reservation_time)
-        duration = data.get('duration', reservation.durration)
-        number_of_guests = data.get('number_of_guests', reservation.number_of_people)
+        positions_by_restaurant = defaultdict(list)
+        for position, data in enumerate(rows):
+            positions_by_restaurant[data['restaurant'].id].append(position)
         
-        table = ReservationRepository.is_table_available(reservation.restaurant, reservation_time, duration, number_of_guests, exclude_reservation_id=reservation.id)
+        def allocate():
+            allocated = [None] * len(rows)
+            for positions in positions_by_restaurant.values():
+                restaurant = rows[positions[0]]['restaurant']
+                windows = {
+                    position: (rows[position]['reservation_time'], rows[position]['reservation_time'] + timedelta(minutes=rows[position]['duration']))
+                    for position in positions
+                }
+                smallest_party = min(rows[position]['number_of_guests'] for position in positions)
+                allocator = TableAllocator(ReservationRepository.get_candidate_tables(restaurant, smallest_party))
+                index = ReservationIntervalIndex.load(
+                    restaurant, min(start for start, _ in windows.values()), max(end for _, end in windows.values())
+                )
+                
+                for position in positions:
+                    data = rows[position]
+                    start, end = windows[position]
+                    tables = next(allocator.free_groups(data['number_of_guests'], index, start, end), None)
+                    if tables is None:
+                        continue
+                    for table in tables:
+                        index.add(table.id, start, end)
+                    reservation = Reservation(
+                        customer_id=user.id,
+                        restaurant=restaurant,
+                        table=tables[0],
+                        reservation_time=start,
+                        number_of_guests=data['number_of_guests'],
+                        duration=data['duration'],
+                        end_time=end,
+                        special_requests=data.get('special_requests', ''),
+                    )
+                    allocated[position] = (reservation, tables[1:])
+            
+            Reservation.objects.bulk_create([reservation for reservation, _ in filter(None, allocated)], batch_size=BULK_BATCH_SIZE)
+            Reservation.objects.bulk_create([
+                ReservationRepository.build_joined_reservation(reservation, table)
+                for reservation, joined_tables in filter(None, allocated)
+                for table in joined_tables
+            ], batch_size=BULK_BATCH_SIZE)
+            deltas = OccupancyDeltas()
+            for reservation, joined_tables in filter(None, allocated):
+                deltas.add_reservation(reservation, 1 + len(joined_tables))
+            deltas.apply()
+            return [item[0] if item else None for item in allocated]
         
-        if not table:
-            return None
+        return ReservationRepository.run_allocation(positions_by_restaurant.keys(), allocate, [
+            (data['restaurant'].id, data['reservation_time'], data['reservation_time'] + timedelta(minutes=data['duration'])) for data in rows
+        ])
+    
+    
+    @staticmethod
+    def import_reservations(rows, user):
+        """
+        Validate raw reservation rows and create the valid ones in bulk.
+        Returns one result per row: created with its id, or failed with the reason.
+        """
+        serializer = BulkReservationSerializer(data=rows, many=True)
+        results = [None] * len(rows)
+        valid_positions = []
+        valid_rows = []
+        for position, row in enumerate(rows):
+            try:
+                data = serializer.child.run_validation(row)
+                ReservationRepository.check_opening_hours(data['restaurant'].id, data['reservation_time'], data['duration'])
+                valid_rows.append(data)
+                valid_positions.append(position)
+            except ValidationError as e:
+                results[position] = {"row": position, "status": "failed", "errors": e.detail}
+            except OutsideOpeningHoursError:
+                results[position] = {"row": position, "status": "failed", "errors": "The restaurant is closed at the requested time."}
         
-        reservation.reservation_time = reservation_time
-        reservation.durration = duration
-        reservation.table = table
-        reservation.number_of_people = number_of_guests
-        reservation.special_requests = data.get('special_requests', reservation.special_requests)
+        reservations = ReservationRepository.bulk_create_reservations(valid_rows, user) if valid_rows else []
+        for position, reservation in zip(valid_positions, reservations):
+            if reservation:
+                results[position] = {"row": position, "status": "created", "id": reservation.id}
+            else:
+                results[position] = {"row": position, "status": "failed", "errors": "No available table for the given time."}
+        return results
+    
+    
+    @staticmethod
+    def active_reservation(reservation_id, user):
+        """
+        The customer's active primary reservation `reservation_id`, as (restaurant id, reservation_time, duration).
+        """
+        return Reservation.objects.filter(
+            id=reservation_id, customer_id=user.id, canceled=False, primary_reservation__isnull=True
+        ).values_list('restaurant_id', 'reservation_time', 'duration')
+    
+    
+    @staticmethod
+    async def aget_active_reservation(reservation_id, user):
+        """
+        Async lookup of the customer's active reservation, or None; see active_reservation.
+        """
+        return await ReservationRepository.active_reservation(reservation_id, user).afirst()
+    
+    
+    @staticmethod
+    def update_reservation(reservation_id, data, user, found=None):
+        """
+        Update an existing reservation.
+        `found` is the active_reservation row when the caller has already looked it up.
+        Returns None when no table is free for the new time and party, and raises
+        ReservationNotFoundError when the customer has no such active reservation.
+        """
+        if found is None:
+            found = ReservationRepository.active_reservation(reservation_id, user).first()
+        if found is None:
+            raise ReservationNotFoundError(f"Reservation {reservation_id} not found.")
+        restaurant_id = found[0]
+        expected_time = data.get('reservation_time', found[1])
+        expected_window = (expected_time, expected_time + timedelta(minutes=data.get('duration', found[2])))
         
-        reservation.save()
+        def allocate():
+            # Read and locked inside the allocation, so a cancel or update that committed
+            # since the lookup above is seen here: a canceled booking stays canceled, and a
+            # concurrent cancel counts the party out of the rollup before or after this update.
+            reservation = Reservation.objects.select_for_update(of=('self',)).select_related('restaurant').filter(
+                id=reservation_id, customer_id=user.id, canceled=False, primary_reservation__isnull=True
+            ).first()
+            if reservation is None:
+                raise ReservationNotFoundError(f"Reservation {reservation_id} not found.")
+            joined = list(Reservation.objects.select_for_update().filter(primary_reservation_id=reservation.id).values_list('id', flat=True))
+            previous = (reservation.reservation_time, reservation.end_time, reservation.number_of_guests)
+            
+            reservation_time = data.get('reservation_time', reservation.reservation_time)
+            duration = data.get('duration', reservation.duration)
+            number_of_guests = data.get('number_of_guests', reservation.number_of_guests)
+            ReservationRepository.check_opening_hours(reservation.restaurant_id, reservation_time, duration)
+            window = (reservation_time, reservation_time + timedelta(minutes=duration))
+            if window != expected_window:
+                # Moved by a concurrent update since the lookup.
+                ReservationRepository.lock_restaurant(reservation.restaurant_id, required=near_month_boundary(*window))
+            
+            table_groups = ReservationRepository.get_free_table_groups(reservation.restaurant, reservation_time, duration, number_of_guests, exclude_reservation_id=reservation.id)
+            
+            reservation.reservation_time = reservation_time
+            reservation.duration = duration
+            reservation.number_of_guests = number_of_guests
+            reservation.special_requests = data.get('special_requests', reservation.special_requests)
+            
+            if ReservationRepository.save_on_first_free_group(reservation, table_groups) is None:
+                return None
+            deltas = OccupancyDeltas()
+            deltas.add(reservation.restaurant_id, *previous, tables=1 + len(joined), sign=-1)
+            deltas.add_reservation(reservation, 1 + len(reservation.joined_table_ids))
+            deltas.apply()
+            return reservation
         
-        return reservation
+        return ReservationRepository.run_allocation([restaurant_id], allocate, [(restaurant_id, *expected_window)])
     
     
+    @staticmethod
+    def get_listing(reservations):
+        """
+        Primary reservations ready for the listing serializer: the tables joined
+        to each party come from a correlated subquery, so a page is a single query.
+        """
+        return reservations.filter(primary_reservation__isnull=True).annotate(
+            joined_table_ids=ArraySubquery(
+                Reservation.objects.filter(primary_reservation=OuterRef('pk')).order_by('id').values('table_id')
+            ),
+        )
+
+    @staticmethod
+    def get_customer_reservations(user):
+        return ReservationRepository.get_listing(Reservation.objects.filter(customer_id=user.id))
+
+    @staticmethod
+    def get_restaurant_reservations(restaurant_id, owner):
+        return ReservationRepository.get_listing(Reservation.objects.filter(restaurant_id=restaurant_id, restaurant__owner_id=owner.id))
+
+    @staticmethod
+    def get_export_rows(restaurant_ids, fields, start=None, end=None):
+        """
+        Primary reservations of the restaurants as `fields` tuples, by restaurant and newest first.
+        That is the order of the restaurant listing index, which a cursor can read without sorting.
+        `start` is inclusive and `end` exclusive, both on reservation_time.
+        """
+        reservations = Reservation.objects.filter(restaurant_id__in=restaurant_ids)
+        if start:
+            reservations = reservations.filter(reservation_time__gte=start)
+        if end:
+            reservations = reservations.filter(reservation_time__lt=end)
+        return ReservationRepository.get_listing(reservations).order_by('restaurant_id', '-reservation_time', '-id').values_list(*fields)
+
+
     @staticmethod
     def cancel_reservation(reservation_id, user):
         """
-        Cancel a reservation.
+        Cancel a reservation and move it to the cancellations of its occupancy rollup.
         """
-        reservation = Reservation.objects.filter(id=reservation_id, customer=user, canceled=False).first()
-        if not reservation:
-            return None
-        
-        reservation.canceled = True
-        reservation.save()
-        
-        return reservation
+        with transaction.atomic():
+            reservation = Reservation.objects.select_for_update().filter(id=reservation_id, customer_id=user.id, canceled=False, primary_reservation__isnull=True).first()
+            if not reservation:
+                return None
+            
+            reservation.canceled = True
+            reservation.save()
+            joined = reservation.joined_reservations.update(canceled=True)
+            
+            deltas = OccupancyDeltas()
+            deltas.cancel(reservation, 1 + joined)
+            deltas.apply()
+            return reservation
         
             
-
+    
+    
+    @staticmethod
+    async def aget_joined_table_ids(reservation):
+        """
+        Async lookup of the extra tables of a party seated across joined tables.
+        """
+        return [
+            table_id async for table_id in Reservation.objects.filter(primary_reservation=reservation).values_list('table_id', flat=True)
+        ]
@@ -0,0 +1,205 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from restaurants.models import Table
+from restaurants.schedule import ScheduleCache
+from .models import OccupancyRollup, Reservation
+
+
+# Counter columns of OccupancyRollup, in the order a bucket's deltas are kept.
+COUNTERS = ('reservations', 'cancellations', 'seats', 'table_minutes')
+
+# Buckets per INSERT ... ON CONFLICT statement.
+UPSERT_BATCH_SIZE = 1000
+
+
+def local_wall_time(moment):
+    """
+    `moment` as naive wall-clock time in TIME_ZONE, the clock the rollup buckets follow.
+    """
+    return timezone.localtime(moment, timezone.get_default_timezone()).replace(tzinfo=None)
+
+
+class OccupancyDeltas:
+    """
+    Changes to OccupancyRollup buckets, summed per (restaurant, date, hour) and
+    written with one upsert per batch of buckets.
+
+    A party counts once in `reservations` in the hour it starts, canceled or
+    not. While active, its guests count in `seats` in that hour and it adds the
+    minutes it spends at each of its tables to every hour it overlaps.
+    Canceled, it counts in `cancellations` instead. Hours are whole minutes of
+    wall-clock time, rounded down per hour, as in rebuild_occupancy_rollups.
+    """
+
+    def __init__(self):
+        self._buckets = defaultdict(lambda: [0] * len(COUNTERS))
+
+    def add(self, restaurant_id, start, end, guests, tables, canceled=False, sign=1):
+        """
+        Count a party seated at `tables` tables over [start, end) in, or out with sign=-1.
+        """
+        local_start, local_end = local_wall_time(start), local_wall_time(end)
+        first_hour = local_start.replace(minute=0, second=0, microsecond=0)
+
+        counters = self._buckets[restaurant_id, first_hour.date(), first_hour.hour]
+        counters[0] += sign
+        if canceled:
+            counters[1] += sign
+            return
+        counters[2] += sign * guests
+
+        hour = first_hour
+        while hour < local_end:
+            next_hour = hour + timedelta(hours=1)
+            spent = (min(local_end, next_hour) - max(local_start, hour)).total_seconds() // 60
+            self._buckets[restaurant_id, hour.date(), hour.hour][3] += sign * tables * int(spent)
+            hour = next_hour
+
+    def add_reservation(self, reservation, tables, sign=1):
+        """
+        Count a saved primary reservation spread over `tables` tables (1 plus its joined rows).
+        """
+        self.add(
+            reservation.restaurant_id, reservation.reservation_time, reservation.end_time,
+            reservation.number_of_guests, tables, reservation.canceled, sign,
+        )
+
+    def cancel(self, reservation, tables):
+        """
+        Move an active party spread over `tables` tables to the cancellations.
+        """
+        party = (reservation.restaurant_id, reservation.reservation_time, reservation.end_time, reservation.number_of_guests, tables)
+        self.add(*party, canceled=False, sign=-1)
+        self.add(*party, canceled=True)
+
+    def apply(self):
+        """
+        Add the deltas to the rollup in the current transaction.
+        Buckets are written in key order so concurrent writers lock rollup rows in the same order.
+        """
+        rows = sorted((*key, *counters) for key, counters in self._buckets.items() if any(counters))
+        self._buckets.clear()
+        if not rows:
+            return
+
+        table = connection.ops.quote_name(OccupancyRollup._meta.db_table)
+        columns = ('restaurant_id', 'date', 'hour', *COUNTERS)
+        increments = ', '.join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in COUNTERS)
+        placeholder = f"({', '.join(['%s'] * len(columns))})"
+        with connection.cursor() as cursor:
+            for offset in range(0, len(rows), UPSERT_BATCH_SIZE):
+                batch = rows[offset:offset + UPSERT_BATCH_SIZE]
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholder] * len(batch))} "
+                    f"ON CONFLICT (restaurant_id, date, hour) DO UPDATE SET {increments}",
+                    [value for row in batch for value in row],
+                )
+
+
+# Recomputes the buckets of the restaurants in %(restaurant_ids)s from %(since)s on from
+# their reservations. The first branch counts parties in their starting hour, the second
+# spreads every active reservation row (one per table) over the hours it overlaps. The
+# bounds on reservation_time let the planner skip partitions of older months.
+REBUILD_SQL = """
+INSERT INTO {rollup} (restaurant_id, date, hour, reservations, cancellations, seats, table_minutes)
+SELECT restaurant_id, bucket::date, EXTRACT(HOUR FROM bucket)::int,
+       SUM(reservations)::int, SUM(cancellations)::int, SUM(seats)::int, SUM(table_minutes)::int
+FROM (
+    SELECT restaurant_id, date_trunc('hour', reservation_time AT TIME ZONE %(time_zone)s) AS bucket,
+           1 AS reservations, canceled::int AS cancellations,
+           CASE WHEN canceled THEN 0 ELSE number_of_guests END AS seats, 0 AS table_minutes
+    FROM {reservation}
+    WHERE primary_reservation_id IS NULL AND restaurant_id = ANY(%(restaurant_ids)s) AND reservation_time >= %(since)s::timestamptz
+    UNION ALL
+    SELECT visits.restaurant_id, hour, 0, 0, 0,
+           FLOOR(EXTRACT(EPOCH FROM LEAST(visits.local_end, hour + INTERVAL '1 hour') - GREATEST(visits.local_start, hour)) / 60)
+    FROM (
+        SELECT restaurant_id, reservation_time AT TIME ZONE %(time_zone)s AS local_start, end_time AT TIME ZONE %(time_zone)s AS local_end
+        FROM {reservation}
+        WHERE NOT canceled AND restaurant_id = ANY(%(restaurant_ids)s) AND end_time > %(since)s::timestamptz
+          AND reservation_time > %(since)s::timestamptz - %(max_duration)s * INTERVAL '1 minute'
+    ) visits
+    CROSS JOIN LATERAL generate_series(
+        GREATEST(date_trunc('hour', visits.local_start), %(since)s::timestamptz AT TIME ZONE %(time_zone)s), visits.local_end - INTERVAL '1 microsecond', INTERVAL '1 hour'
+    ) AS hour
+) contributions
+GROUP BY restaurant_id, bucket
+"""
+
+
+def rebuild_rollups(restaurant_ids, since=None):
+    """
+    Replace the rollup buckets of `restaurant_ids` with ones recomputed from their reservations,
+    only those dated `since` or later when given, keeping the buckets of archived months.
+    Reservation writes wait for the rebuild's transaction (SHARE lock), so none is
+    counted both by the recomputation and by its own increment. Other rebuilds
+    take the same lock mode and run alongside. Returns the number of buckets written.
+    """
+    restaurant_ids = list(restaurant_ids)
+    rollup = connection.ops.quote_name(OccupancyRollup._meta.db_table)
+    reservation = connection.ops.quote_name(Reservation._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {reservation} IN SHARE MODE")
+        rollups = OccupancyRollup.objects.filter(restaurant_id__in=restaurant_ids)
+        if since is not None:
+            rollups = rollups.filter(date__gte=since)
+        rollups.delete()
+        cursor.execute(
+            REBUILD_SQL.format(rollup=rollup, reservation=reservation),
+            {
+                'restaurant_ids': restaurant_ids,
+                'time_zone': settings.TIME_ZONE,
+                # Midnight starting `since` in TIME_ZONE, the bucket clock.
+                'since': '-infinity' if since is None else timezone.make_aware(datetime.combine(since, time.min), timezone.get_default_timezone()),
+                'max_duration': Reservation.MAX_DURATION,
+            },
+        )
+        return cursor.rowcount
+
+
+def ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def occupancy_report(restaurant_ids, first_day, last_day):
+    """
+    Daily and hour-of-day figures of the restaurants over [first_day, last_day], read from
+    the rollups. Utilization is table minutes over the minutes the restaurants' tables in
+    service could have been used while open; None on days they are all closed.
+    """
+    rollups = OccupancyRollup.objects.filter(restaurant_id__in=restaurant_ids, date__range=(first_day, last_day)).order_by()
+    totals = {counter: Sum(counter) for counter in COUNTERS}
+    by_day = {row['date']: row for row in rollups.values('date').annotate(**totals)}
+    by_hour = {row['hour']: row for row in rollups.values('hour').annotate(**totals)}
+
+    tables = dict(
+        Table.objects.filter(restaurant_id__in=restaurant_ids, is_available=True).order_by()
+        .values_list('restaurant_id').annotate(count=Count('id'))
+    )
+    schedules = {restaurant_id: ScheduleCache.get(restaurant_id) for restaurant_id in tables}
+
+    days = []
+    day = first_day
+    while day <= last_day:
+        row = by_day.get(day, dict.fromkeys(COUNTERS, 0))
+        capacity = sum(count * schedules[restaurant_id].open_minutes(day) for restaurant_id, count in tables.items())
+        days.append({
+            "date": day,
+            **{counter: row[counter] for counter in COUNTERS},
+            "cancellation_rate": ratio(row['cancellations'], row['reservations']),
+            "table_utilization": ratio(row['table_minutes'], capacity),
+        })
+        day += timedelta(days=1)
+
+    hours = [
+        {"hour": hour, "reservations": by_hour[hour]['reservations'], "seats": by_hour[hour]['seats']} if hour in by_hour
+        else {"hour": hour, "reservations": 0, "seats": 0}
+        for hour in range(24)
+    ]
+    return {"days": days, "hours": hours}
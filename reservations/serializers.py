@@ -1,11 +1,69 @@
 from rest_framework import serializers
+from restaurants.models import Restaurant
 from .models import Reservation
 
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that looks each id up once per field instance, so a
+    batch of rows pointing at the same few objects costs one query per object.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._cache = {}
+
+    def to_internal_value(self, data):
+        key = str(data)
+        if key not in self._cache:
+            self._cache[key] = super().to_internal_value(data)
+        return self._cache[key]
+
+
 class ReservationSerializer(serializers.ModelSerializer):
+    joined_tables = serializers.SerializerMethodField()
+
     class Meta:
         model = Reservation
         fields = [
             'id', 'restaurant', 'reservation_time', 'number_of_guests',
-            'duration', 'special_requests', 'created_at', 'canceled', 'table'
+            'duration', 'special_requests', 'created_at', 'canceled', 'table', 'joined_tables'
         ]
-        read_only_fields = ['id', 'customer', 'table', 'created_at' 'canceled']
\ No newline at end of file
+        read_only_fields = ['id', 'customer', 'table', 'created_at' 'canceled']
+
+    def get_joined_tables(self, obj):
+        # Callers that already know the joined tables (async views, annotated listings) set joined_table_ids.
+        if hasattr(obj, 'joined_table_ids'):
+            return obj.joined_table_ids
+        return [joined.table_id for joined in obj.joined_reservations.all()]
+
+
+class BulkReservationSerializer(ReservationSerializer):
+    restaurant = CachedPrimaryKeyRelatedField(queryset=Restaurant.objects.all())
+
+
+class ReservationExportQuerySerializer(serializers.Serializer):
+    restaurant = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, help_text="Restaurant ids; all of the owner's by default")
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    output = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] >= data['end']:
+            raise serializers.ValidationError("Start must be before end.")
+        return data
+
+
+class OccupancyQuerySerializer(serializers.Serializer):
+    MAX_DAYS = 366
+
+    restaurant = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, help_text="Restaurant ids; all of the owner's by default")
+    start = serializers.DateField(help_text="First day, inclusive")
+    end = serializers.DateField(help_text="Last day, inclusive")
+
+    def validate(self, data):
+        if data['start'] > data['end']:
+            raise serializers.ValidationError("Start must not be after end.")
+        if (data['end'] - data['start']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"The range can span at most {self.MAX_DAYS} days.")
+        return data
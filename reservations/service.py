@@ -0,0 +1,366 @@
+import math
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import chain, combinations, combinations_with_replacement, product
+
+import numpy as np
+from django.db.models import Q
+
+from restaurants.models import OpeningHour
+from .models import Reservation
+
+
+class ReservationIntervalIndex:
+    """
+    In-memory index of a restaurant's active reservations, grouped per table.
+
+    Each table keeps its reservations sorted by start time together with a
+    running maximum of their end times, so an overlap check against
+    [start, end) is a single binary search.
+    """
+
+    def __init__(self, intervals):
+        grouped = defaultdict(list)
+        for table_id, start, end in intervals:
+            grouped[table_id].append((start, end))
+
+        self._starts = {}
+        self._max_ends = {}
+        for table_id, table_intervals in grouped.items():
+            table_intervals.sort()
+            starts = []
+            max_ends = []
+            latest_end = None
+            for start, end in table_intervals:
+                latest_end = end if latest_end is None else max(latest_end, end)
+                starts.append(start)
+                max_ends.append(latest_end)
+            self._starts[table_id] = starts
+            self._max_ends[table_id] = max_ends
+
+    @classmethod
+    def load(cls, restaurant, window_start, window_end, exclude_reservation_id=None):
+        """
+        Build the index for a restaurant with a single query, covering every
+        active reservation that can overlap [window_start, window_end).
+        """
+        rows = Reservation.objects.filter(
+            Reservation.overlapping(window_start, window_end),
+            restaurant=restaurant,
+            canceled=False,
+        )
+        if exclude_reservation_id is not None:
+            rows = rows.exclude(Q(id=exclude_reservation_id) | Q(primary_reservation_id=exclude_reservation_id))
+
+        # No ORDER BY: the index sorts per table itself, and Meta.ordering would force a sort.
+        return cls(rows.order_by().values_list('table_id', 'reservation_time', 'end_time'))
+
+    def add(self, table_id, start, end):
+        """
+        Record a reservation made after the index was loaded, e.g. while allocating a batch.
+        """
+        starts = self._starts.setdefault(table_id, [])
+        max_ends = self._max_ends.setdefault(table_id, [])
+        position = bisect_right(starts, start)
+        starts.insert(position, start)
+        max_ends.insert(position, end if position == 0 else max(max_ends[position - 1], end))
+        for later in range(position + 1, len(max_ends)):
+            if max_ends[later] >= end:
+                break
+            max_ends[later] = end
+
+    def is_free(self, table_id, start, end):
+        """
+        Return True if no reservation on the table overlaps [start, end).
+        """
+        starts = self._starts.get(table_id)
+        if not starts:
+            return True
+        # Reservations starting before `end` are the only ones that can overlap;
+        # among them, the latest end time decides whether one is still running.
+        position = bisect_left(starts, end)
+        return position == 0 or self._max_ends[table_id][position - 1] <= start
+
+
+# Largest number of joinable tables pushed together for one party.
+MAX_JOINED_TABLES = 3
+
+
+@lru_cache(maxsize=1024)
+def seat_patterns(capacity_counts, number_of_guests):
+    """
+    Capacities of the groups of 2..MAX_JOINED_TABLES joinable tables that can seat
+    the party, as (seats, capacities) sorted by seats then number of tables.
+    `capacity_counts` is a tuple of (capacity, tables) for one area, with counts
+    capped at MAX_JOINED_TABLES so restaurants with the same mix share cache entries.
+    A group that still seats the party without its smallest table is left out: the
+    smaller group, or a single table, is free whenever it is and comes first.
+    """
+    available = dict(capacity_counts)
+    patterns = []
+    for size in range(2, MAX_JOINED_TABLES + 1):
+        for capacities in combinations_with_replacement(sorted(available), size):
+            seats = sum(capacities)
+            if seats < number_of_guests or seats - capacities[0] >= number_of_guests:
+                continue
+            if all(capacities.count(capacity) <= available[capacity] for capacity in set(capacities)):
+                patterns.append((seats, capacities))
+    patterns.sort(key=lambda pattern: (pattern[0], len(pattern[1]), pattern[1]))
+    return patterns
+
+
+class TableAllocator:
+    """
+    Best-fit seating plan over a restaurant's tables in service.
+
+    Single tables are bucketed by capacity in sorted order, so the first one
+    that fits a party is a binary search away. Joinable tables are pooled per
+    area and capacity; a party only looks at the few capacity patterns that
+    reach its size, and table groups are built from them one at a time, so
+    nothing grows with the number of possible combinations.
+    """
+
+    def __init__(self, tables):
+        self._tables = {table.id: table for table in tables}
+
+        buckets = defaultdict(list)
+        pools = defaultdict(lambda: defaultdict(list))
+        for table in sorted(self._tables.values(), key=lambda table: (table.capacity, table.id)):
+            buckets[table.capacity].append(table.id)
+            if table.is_joinable:
+                pools[table.is_outdoor][table.capacity].append(table.id)
+        self._capacities = sorted(buckets)
+        self._buckets = buckets
+        self._pools = pools
+
+    def singles(self, number_of_guests):
+        """
+        Yield the single tables that can seat the party, as 1-tuples, smallest first.
+        """
+        for capacity in self._capacities[bisect_left(self._capacities, number_of_guests):]:
+            for table_id in self._buckets[capacity]:
+                yield (table_id,)
+
+    def joined_patterns(self, number_of_guests, pools=None):
+        """
+        (pool, capacities) pairs of the joined groups that can seat the party, best fit
+        first, where `pool` maps each capacity to the ids of one area's joinable tables.
+        """
+        pools = self._pools if pools is None else pools
+        patterns = sorted(
+            (seats, len(capacities), capacities, area)
+            for area, pool in pools.items()
+            for seats, capacities in seat_patterns(
+                tuple(sorted((capacity, min(len(ids), MAX_JOINED_TABLES)) for capacity, ids in pool.items() if ids)),
+                number_of_guests,
+            )
+        )
+        return [(pools[area], capacities) for _, _, capacities, area in patterns]
+
+    @staticmethod
+    def expand(pool, capacities):
+        """
+        Yield every group of table ids from `pool` with the given capacities, lazily.
+        """
+        needed = Counter(capacities)
+        for parts in product(*(combinations(pool[capacity], count) for capacity, count in needed.items())):
+            yield tuple(chain.from_iterable(parts))
+
+    def groups(self, number_of_guests):
+        """
+        Yield tuples of table ids that can seat the party, best fit first:
+        the smallest single tables, then the smallest joined groups.
+        """
+        yield from self.singles(number_of_guests)
+        for pool, capacities in self.joined_patterns(number_of_guests):
+            yield from self.expand(pool, capacities)
+
+    def free_groups(self, number_of_guests, index, start, end):
+        """
+        Yield the table groups, as Table lists, whose tables are all free for [start, end).
+        Joined groups are drawn from the joinable tables found free, so the first group
+        of every pattern that has enough of them is taken without further checks.
+        """
+        for (table_id,) in self.singles(number_of_guests):
+            if index.is_free(table_id, start, end):
+                yield [self._tables[table_id]]
+
+        free_pools = defaultdict(lambda: defaultdict(list))
+        for area, pool in self._pools.items():
+            for capacity, table_ids in pool.items():
+                free_pools[area][capacity] = [table_id for table_id in table_ids if index.is_free(table_id, start, end)]
+        for pool, capacities in self.joined_patterns(number_of_guests, free_pools):
+            for table_ids in self.expand(pool, capacities):
+                yield [self._tables[table_id] for table_id in table_ids]
+
+
+SLOT_MINUTES = 15
+
+# OpeningHour.day codes indexed by date.weekday().
+WEEKDAY_CODES = [code for code, _ in OpeningHour.DAYS]
+
+
+def align_to_slot(moment):
+    """
+    Round a datetime up to the next slot boundary.
+    """
+    aligned = moment.replace(second=0, microsecond=0)
+    if aligned < moment:
+        aligned += timedelta(minutes=1)
+    overshoot = aligned.minute % SLOT_MINUTES
+    if overshoot:
+        aligned += timedelta(minutes=SLOT_MINUTES - overshoot)
+    return aligned
+
+
+def opening_intervals(opening_hours, window_start, window_end):
+    """
+    Expand weekly (day, open_time, close_time, is_closed) rows into concrete
+    [open, close) datetimes inside the window.
+    Returns None when no opening hours are configured, which means no restriction.
+    """
+    opening_hours = list(opening_hours)
+    if not opening_hours:
+        return None
+
+    by_day = defaultdict(list)
+    for day, open_time, close_time, is_closed in opening_hours:
+        if not is_closed:
+            by_day[day].append((open_time, close_time))
+
+    intervals = []
+    # Start a day early so an overnight span from the previous evening is included.
+    day = window_start.date() - timedelta(days=1)
+    while day <= window_end.date():
+        for open_time, close_time in by_day[WEEKDAY_CODES[day.weekday()]]:
+            # A close time at or before the open time runs past midnight into the next day.
+            close_day = day + timedelta(days=1) if close_time <= open_time else day
+            intervals.append((
+                datetime.combine(day, open_time, tzinfo=window_start.tzinfo),
+                datetime.combine(close_day, close_time, tzinfo=window_start.tzinfo),
+            ))
+        day += timedelta(days=1)
+    return intervals
+
+
+class SlotGrid:
+    """
+    Tables x 15-minute slots occupancy matrix for a time window.
+
+    Occupancy and opening hours are laid out as boolean arrays, so every
+    feasible start slot for a duration comes out of one cumulative-sum pass
+    instead of a probe per table and slot. Joined tables are given as
+    TableAllocator.joined_patterns: a pattern can start wherever enough tables
+    of each of its capacities can, which is counted rather than enumerated.
+    """
+
+    def __init__(self, window_start, window_end, table_ids, intervals, open_intervals=None, groups=None, joined=()):
+        self.window_start = window_start
+        self.slot = timedelta(minutes=SLOT_MINUTES)
+        self.slot_count = math.ceil((window_end - window_start) / self.slot)
+        self.table_ids = np.asarray(table_ids, dtype=np.int64)
+        self.groups = [(table_id,) for table_id in table_ids] if groups is None else list(groups)
+        self.joined = list(joined)
+        self.busy = self._occupancy(intervals)
+        self.open = self._open_mask(open_intervals)
+
+    def _offsets(self, times):
+        """
+        Position of each datetime in the grid, in (fractional) slots from window_start.
+        """
+        seconds = np.fromiter(((time - self.window_start).total_seconds() for time in times), dtype=np.float64)
+        return seconds / (SLOT_MINUTES * 60)
+
+    def _occupancy(self, intervals):
+        rows = {table_id: row for row, table_id in enumerate(self.table_ids.tolist())}
+        table_rows, starts, ends = [], [], []
+        for table_id, start, end in intervals:
+            row = rows.get(table_id)
+            if row is not None:
+                table_rows.append(row)
+                starts.append(start)
+                ends.append(end)
+
+        # Mark +1 at the first busy slot and -1 after the last one, then a running
+        # sum per row turns the markers into the occupied spans.
+        markers = np.zeros((len(self.table_ids), self.slot_count + 1), dtype=np.int32)
+        if table_rows:
+            first = np.clip(np.floor(self._offsets(starts)), 0, self.slot_count).astype(np.int64)
+            last = np.clip(np.ceil(self._offsets(ends)), 0, self.slot_count).astype(np.int64)
+            np.add.at(markers, (table_rows, first), 1)
+            np.add.at(markers, (table_rows, last), -1)
+        return np.cumsum(markers[:, :-1], axis=1) > 0
+
+    def _open_mask(self, open_intervals):
+        if open_intervals is None:
+            return np.ones(self.slot_count, dtype=bool)
+
+        markers = np.zeros(self.slot_count + 1, dtype=np.int32)
+        if open_intervals:
+            opens, closes = zip(*open_intervals)
+            # Only slots lying entirely inside an opening interval count as open.
+            first = np.clip(np.ceil(self._offsets(opens)), 0, self.slot_count).astype(np.int64)
+            last = np.clip(np.floor(self._offsets(closes)), 0, self.slot_count).astype(np.int64)
+            valid = first < last
+            np.add.at(markers, first[valid], 1)
+            np.add.at(markers, last[valid], -1)
+        return np.cumsum(markers[:-1]) > 0
+
+    def feasible_starts(self, duration):
+        """
+        Boolean (groups + joined patterns, slots) matrix of the start slots where
+        every table of a group, or enough tables for a pattern, are free and the
+        restaurant open for the whole duration.
+        """
+        span = math.ceil(duration / SLOT_MINUTES)
+        blocked = self.busy | ~self.open
+        blocked_before = np.zeros((len(self.table_ids), self.slot_count + 1), dtype=np.int32)
+        np.cumsum(blocked, axis=1, out=blocked_before[:, 1:])
+
+        feasible = np.zeros((len(self.table_ids), self.slot_count), dtype=bool)
+        if span <= self.slot_count:
+            last_start = self.slot_count - span + 1
+            feasible[:, :last_start] = blocked_before[:, span:] == blocked_before[:, :last_start]
+
+        # A group can start where all of its tables can; groups of the same size
+        # are combined with one fancy-indexed reduction.
+        rows = {table_id: row for row, table_id in enumerate(self.table_ids.tolist())}
+        by_size = defaultdict(list)
+        for group in self.groups:
+            by_size[len(group)].append([rows[table_id] for table_id in group])
+        results = [
+            feasible[np.asarray(members, dtype=np.int64)].all(axis=1)
+            for members in by_size.values()
+        ]
+        for pool, capacities in self.joined:
+            pattern = np.ones(self.slot_count, dtype=bool)
+            for capacity, count in Counter(capacities).items():
+                members = np.asarray([rows[table_id] for table_id in pool[capacity]], dtype=np.int64)
+                pattern &= feasible[members].sum(axis=0) >= count
+            results.append(pattern[np.newaxis])
+        if not results:
+            return np.zeros((0, self.slot_count), dtype=bool)
+        return np.concatenate(results)
+
+    def earliest_start(self, duration, until=None):
+        """
+        First start time at which at least one table can take the booking, or None.
+        """
+        open_slots = self.feasible_starts(duration).any(axis=0)
+        if not open_slots.any():
+            return None
+        start = self.window_start + int(open_slots.argmax()) * self.slot
+        return start if until is None or start < until else None
+
+    def free_starts(self, duration, until=None):
+        """
+        Start times, in order, at which at least one table can take the booking.
+        Starts at or after `until` are left out.
+        """
+        slots = np.flatnonzero(self.feasible_starts(duration).any(axis=0))
+        starts = [self.window_start + int(slot) * self.slot for slot in slots]
+        if until is not None:
+            starts = [start for start in starts if start < until]
+        return starts
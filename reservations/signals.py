@@ -0,0 +1,14 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from . import partitions
+
+
+@receiver(post_migrate)
+def create_upcoming_partitions(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # Once the table is partitioned, every migrate tops up the months ahead, so
+    # new bookings rarely land in the DEFAULT partition.
+    if sender.name != 'reservations' or using != DEFAULT_DB_ALIAS or not partitions.is_partitioned():
+        return
+    partitions.ensure_upcoming_partitions()
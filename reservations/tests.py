@@ -1,3 +1,880 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import math
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from restaurant_reservation.testing import ReplicaTransactionTestCase
+
+from restaurants.models import OpeningHour, Restaurant, Table
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+from . import partitions
+from .management.commands.seed_data import BOOKINGS_PER_TABLE_DAY
+from .metrics import allocation_metrics
+from .models import OccupancyRollup, Reservation
+from .repository import ReservationConflictError, ReservationRepository
+from .service import ReservationIntervalIndex, SlotGrid, TableAllocator, align_to_slot
+
+
+class ReservationIntervalIndexTest(TestCase):
+    """
+    The index answers the same as an overlap check on each row: bookings that
+    only touch [start, end) leave it free, canceled ones never count and an
+    excluded reservation takes its joined tables with it.
+    """
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', role='OWNER')
+        customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.restaurant = Restaurant.objects.create(name='Indexed Bistro', address='1 Main St', owner=owner)
+        self.tables = Table.objects.bulk_create(Table(restaurant=self.restaurant, table_number=str(i), capacity=4) for i in range(3))
+        self.day = datetime(2025, 5, 24, tzinfo=dt_timezone.utc)
+
+        def book(table, hour, duration, **extra):
+            return Reservation.objects.create(
+                customer=customer, restaurant=self.restaurant, table=table, number_of_guests=2,
+                reservation_time=self.day + timedelta(hours=hour), duration=duration, **extra,
+            )
+
+        self.primary = book(self.tables[0], 18, 90)
+        book(self.tables[1], 18, 90, primary_reservation=self.primary)
+        book(self.tables[0], 20, 60, canceled=True)
+        book(self.tables[0], 21, 60)
+
+    def _at(self, hour, minute=0):
+        return self.day + timedelta(hours=hour, minutes=minute)
+
+    def _load(self, **kwargs):
+        return ReservationIntervalIndex.load(self.restaurant, self.day, self.day + timedelta(days=1), **kwargs)
+
+    def test_touching_intervals_are_free(self):
+        index = self._load()
+        table_id = self.tables[0].id
+        self.assertTrue(index.is_free(table_id, self._at(17), self._at(18)))
+        self.assertTrue(index.is_free(table_id, self._at(19, 30), self._at(21)))
+        self.assertTrue(index.is_free(table_id, self._at(22), self._at(23)))
+
+    def test_overlap_at_either_edge(self):
+        index = self._load()
+        table_id = self.tables[0].id
+        self.assertFalse(index.is_free(table_id, self._at(17, 30), self._at(18, 1)))
+        self.assertFalse(index.is_free(table_id, self._at(19, 29), self._at(20)))
+        self.assertFalse(index.is_free(table_id, self._at(18, 30), self._at(19)))
+        self.assertFalse(index.is_free(table_id, self._at(17), self._at(23)))
+        self.assertFalse(index.is_free(self.tables[1].id, self._at(19), self._at(20)))
+        self.assertTrue(index.is_free(self.tables[2].id, self._at(17), self._at(23)))
+
+    def test_canceled_reservations_are_ignored(self):
+        index = self._load()
+        self.assertTrue(index.is_free(self.tables[0].id, self._at(20), self._at(21)))
+
+    def test_excluded_reservation_frees_its_joined_tables(self):
+        index = self._load(exclude_reservation_id=self.primary.id)
+        self.assertTrue(index.is_free(self.tables[0].id, self._at(18), self._at(19, 30)))
+        self.assertTrue(index.is_free(self.tables[1].id, self._at(18), self._at(19, 30)))
+        self.assertFalse(index.is_free(self.tables[0].id, self._at(21), self._at(21, 15)))
+
+    def test_added_intervals_match_a_row_by_row_check(self):
+        index = self._load()
+        table_id = self.tables[2].id
+        # Out of order, with a long booking added after a short one inside it.
+        added = [(self._at(14), self._at(15)), (self._at(12), self._at(16)), (self._at(19), self._at(19, 30))]
+        for start, end in added:
+            index.add(table_id, start, end)
+
+        for quarter in range(11 * 4, 22 * 4):
+            start = self._at(0, 15 * quarter)
+            for length in (15, 60, 150):
+                end = start + timedelta(minutes=length)
+                expected = not any(start < other_end and other_start < end for other_start, other_end in added)
+                self.assertEqual(index.is_free(table_id, start, end), expected, (start, end))
+
+
+class TableAllocatorTest(TestCase):
+    """
+    Parties get the smallest single table that fits, then the smallest joined
+    group, and the work per party stays flat as joinable tables are added.
+    """
+
+    def _tables(self, *specs):
+        return [
+            Table(id=table_id, capacity=capacity, is_joinable=joinable, is_outdoor=outdoor)
+            for table_id, capacity, joinable, outdoor in specs
+        ]
+
+    def test_selection_order(self):
+        allocator = TableAllocator(self._tables(
+            (1, 2, True, False), (2, 2, True, False), (3, 4, True, False), (4, 6, False, False), (5, 4, True, True), (6, 2, True, True),
+        ))
+        # The 6-top alone, then 2+4 indoors before 2+4 outdoors; 2+2+4 still seats five without a 2-top.
+        self.assertEqual(list(allocator.groups(5)), [(4,), (1, 3), (2, 3), (6, 5)])
+        self.assertEqual(list(allocator.groups(8)), [(1, 2, 3)])
+        self.assertEqual(list(allocator.groups(11)), [])
+
+        start = datetime(2025, 5, 24, 18, 0, tzinfo=dt_timezone.utc)
+        index = ReservationIntervalIndex([(1, start, start + timedelta(hours=1)), (4, start, start + timedelta(hours=1))])
+        free = [[table.id for table in tables] for tables in allocator.free_groups(5, index, start, start + timedelta(minutes=90))]
+        self.assertEqual(free, [[2, 3], [6, 5]])
+
+    def test_joined_groups_do_not_grow_with_the_floor(self):
+        tables = self._tables(*((table_id, (2, 2, 4, 4, 6, 8)[table_id % 6], True, table_id % 2 == 0) for table_id in range(1, 301)))
+        allocator = TableAllocator(tables)
+        for party in range(1, 25):
+            self.assertLessEqual(len(allocator.joined_patterns(party)), 20)
+
+        # Every table is booked over the evening: nothing fits, and finding that
+        # out takes one check per table, not one per combination.
+        start = datetime(2025, 5, 24, 18, 0, tzinfo=dt_timezone.utc)
+        index = ReservationIntervalIndex([(table.id, start, start + timedelta(hours=3)) for table in tables])
+        checks = []
+        is_free = index.is_free
+        index.is_free = lambda *args: checks.append(args) or is_free(*args)
+        self.assertEqual(list(allocator.free_groups(10, index, start, start + timedelta(hours=2))), [])
+        self.assertLessEqual(len(checks), len(tables))
+
+        started = time.perf_counter()
+        grid = SlotGrid(
+            start - timedelta(hours=6), start + timedelta(hours=6), [table.id for table in tables], [],
+            groups=allocator.singles(10), joined=allocator.joined_patterns(10),
+        )
+        self.assertEqual(len(grid.free_starts(90)), 48 - 6 + 1)
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+
+class SlotGridTest(TestCase):
+    """
+    Free start slots from the occupancy grid agree with checking every table
+    group's bookings and the opening hours one by one, joined groups included.
+    """
+    DAY = datetime(2025, 5, 24, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.tables = [
+            Table(id=table_id, capacity=capacity, is_joinable=joinable, is_outdoor=outdoor)
+            for table_id, capacity, joinable, outdoor in (
+                (1, 2, False, False), (2, 4, False, False), (3, 2, True, False),
+                (4, 4, True, False), (5, 4, True, False), (6, 2, True, True), (7, 4, True, True),
+            )
+        ]
+        # Off-slot times too: the grid rounds a booking out to the slots it touches.
+        self.bookings = [
+            (1, self.at(12), self.at(13, 30)), (2, self.at(12, 10), self.at(13)), (2, self.at(19), self.at(21)),
+            (3, self.at(18), self.at(19, 20)), (4, self.at(11, 30), self.at(12, 45)), (5, self.at(18, 30), self.at(20)),
+            (6, self.at(17), self.at(22)), (7, self.at(12), self.at(14)),
+        ]
+        self.open_intervals = [(self.at(11, 10), self.at(14, 30)), (self.at(17), self.at(23))]
+
+    def at(self, hour, minute=0):
+        return self.DAY + timedelta(hours=hour, minutes=minute)
+
+    def _grid(self, party, open_intervals):
+        allocator = TableAllocator(self.tables)
+        grid = SlotGrid(
+            self.at(10), self.at(24), [table.id for table in self.tables], self.bookings, open_intervals,
+            groups=allocator.singles(party), joined=allocator.joined_patterns(party),
+        )
+        return allocator, grid
+
+    def _is_free(self, table_id, start, end):
+        return not any(
+            booked == table_id and start < booked_end and booked_start < end
+            for booked, booked_start, booked_end in self.bookings
+        )
+
+    def _expected_starts(self, allocator, party, duration, open_intervals):
+        expected = []
+        start = self.at(10)
+        while start + timedelta(minutes=duration) <= self.at(24):
+            end = start + timedelta(minutes=duration)
+            is_open = open_intervals is None or any(opens <= start and end <= closes for opens, closes in open_intervals)
+            fits = any(all(self._is_free(table_id, start, end) for table_id in group) for group in allocator.groups(party))
+            if is_open and fits:
+                expected.append(start)
+            start += timedelta(minutes=15)
+        return expected
+
+    def test_matches_a_row_by_row_check(self):
+        for open_intervals in (self.open_intervals, None):
+            for party in (1, 3, 4, 6, 8, 10, 13):
+                allocator, grid = self._grid(party, open_intervals)
+                for duration in (15, 60, 90, 180):
+                    expected = self._expected_starts(allocator, party, duration, open_intervals)
+                    with self.subTest(party=party, duration=duration, open_hours=open_intervals is not None):
+                        self.assertEqual(grid.free_starts(duration), expected)
+                        self.assertEqual(grid.earliest_start(duration), expected[0] if expected else None)
+                        self.assertEqual(grid.feasible_starts(duration).shape, (len(list(allocator.singles(party))) + len(allocator.joined_patterns(party)), grid.slot_count))
+
+    def test_joined_groups_fill_in_for_booked_singles(self):
+        # No single table seats six: 2+4 or 4+4 of one area's joinables do.
+        allocator, grid = self._grid(6, self.open_intervals)
+        starts = grid.free_starts(60)
+        # At 11:15 table 4 is booked, but 3+5 is free.
+        self.assertEqual(starts[0], self.at(11, 15))
+        self.assertIn(self.at(17), starts)
+        # From 18:00 tables 3 and 5 are booked indoors and table 6 outdoors.
+        self.assertNotIn(self.at(18), starts)
+        # Ten seats need all three indoor joinables; outdoors has only two tables.
+        allocator, grid = self._grid(10, self.open_intervals)
+        self.assertEqual(
+            grid.free_starts(60),
+            [self.at(12, 45) + timedelta(minutes=15 * slot) for slot in range(4)]
+            + [self.at(17)]
+            + [self.at(20) + timedelta(minutes=15 * slot) for slot in range(9)],
+        )
+
+
+    def test_opening_hours_edges(self):
+        allocator, grid = self._grid(1, self.open_intervals)
+        starts = grid.free_starts(60)
+        # Opening at 11:10 leaves the 11:00 slot closed; a booking must end by closing time.
+        self.assertEqual(starts[0], self.at(11, 15))
+        self.assertIn(self.at(13, 30), starts)
+        self.assertNotIn(self.at(13, 45), starts)
+        self.assertEqual(starts[-1], self.at(22))
+        self.assertEqual(grid.free_starts(60, until=self.at(17)), [start for start in starts if start < self.at(17)])
+        self.assertIsNone(grid.earliest_start(60, until=self.at(11, 15)))
+        self.assertIsNone(grid.earliest_start(60 * 7))
+
+        allocator, grid = self._grid(1, [])
+        self.assertEqual(grid.free_starts(15), [])
+        self.assertIsNone(grid.earliest_start(15))
+
+    def test_align_to_slot(self):
+        self.assertEqual(align_to_slot(self.at(18)), self.at(18))
+        self.assertEqual(align_to_slot(self.at(18).replace(microsecond=1)), self.at(18, 15))
+        self.assertEqual(align_to_slot(self.at(18, 14)), self.at(18, 15))
+        self.assertEqual(align_to_slot(self.at(18, 15).replace(second=59)), self.at(18, 30))
+        self.assertEqual(align_to_slot(self.at(23, 50)), self.at(24))
+
+
+class ConcurrentReservationCreateTest(ReplicaTransactionTestCase):
+    """
+    Fires hundreds of concurrent creates at one restaurant and checks that no
+    table is double-booked and no request ends in a 500.
+    """
+    REQUESTS = 240
+    WORKERS = 24
+    TABLES = 20
+    def setUp(self):
+        owner = User.objects.create(username='owner', role='OWNER')
+        self.customers = [User.objects.create(username=f'customer{i}', role='CUSTOMER') for i in range(self.WORKERS)]
+        self.restaurant = Restaurant.objects.create(name='Busy Bistro', address='1 Main St', owner=owner)
+        Table.objects.bulk_create(
+            Table(restaurant=self.restaurant, table_number=str(i), capacity=4) for i in range(self.TABLES)
+        )
+        self.start = datetime(2025, 5, 24, 18, 0, tzinfo=dt_timezone.utc)
+        allocation_metrics.reset()
+
+    def _create(self, attempt):
+        client = APIClient()
+        client.force_authenticate(self.customers[attempt % len(self.customers)])
+        # Alternate between two overlapping start times so conflicts are not just identical slots.
+        reservation_time = self.start + timedelta(minutes=45 * (attempt % 2))
+        try:
+            response = client.post('/api/reservations/create/', {
+                'restaurant': self.restaurant.id,
+                'reservation_time': reservation_time.isoformat(),
+                'number_of_guests': 4,
+                'duration': 90,
+            }, format='json')
+            return response.status_code
+        finally:
+            connection.close()
+
+    def _fire(self):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            return list(pool.map(self._create, range(self.REQUESTS)))
+
+    def _assert_no_double_booking(self, status_codes):
+        self.assertNotIn(500, status_codes)
+        self.assertEqual(set(status_codes) - {201, 400, 409}, set())
+        self.assertEqual(status_codes.count(201), self.TABLES)
+
+        booked = list(Reservation.objects.filter(canceled=False).values_list('table_id', 'reservation_time', 'end_time'))
+        self.assertEqual(len(booked), self.TABLES)
+        for position, (table_id, start, end) in enumerate(booked):
+            for other_table_id, other_start, other_end in booked[position + 1:]:
+                overlaps = start < other_end and other_start < end
+                self.assertFalse(table_id == other_table_id and overlaps)
+
+    def test_concurrent_creates_with_advisory_lock(self):
+        status_codes = self._fire()
+
+        self._assert_no_double_booking(status_codes)
+        self.assertEqual(allocation_metrics.snapshot()['lock_waits'], self.REQUESTS)
+
+    @override_settings(RESERVATION_ADVISORY_LOCKS=False)
+    def test_concurrent_creates_rely_on_exclusion_constraint(self):
+        status_codes = self._fire()
+
+        self._assert_no_double_booking(status_codes)
+
+
+class MonthBoundaryAllocationTest(ReplicaTransactionTestCase):
+    """
+    Bookings of one table on either side of a month boundary land in different
+    partitions, whose exclusion constraints cannot see each other, so the
+    allocation lock is taken for them even with RESERVATION_ADVISORY_LOCKS off.
+    """
+    def setUp(self):
+        partitions.ensure_upcoming_partitions()
+        owner = User.objects.create(username='owner', role='OWNER')
+        self.customers = [User.objects.create(username=f'customer{i}', role='CUSTOMER') for i in range(2)]
+        self.restaurant = Restaurant.objects.create(name='Midnight Diner', address='1 Main St', owner=owner)
+        Table.objects.create(restaurant=self.restaurant, table_number='1', capacity=4)
+        self.boundary = partitions.utc_midnight(partitions.add_months(partitions.month_start(timezone.now().date()), 2))
+
+    def _create(self, customer, reservation_time, duration):
+        client = APIClient()
+        client.force_authenticate(customer)
+        try:
+            return client.post('/api/reservations/create/', {
+                'restaurant': self.restaurant.id,
+                'reservation_time': reservation_time.isoformat(),
+                'number_of_guests': 2,
+                'duration': duration,
+            }, format='json').status_code
+        finally:
+            connection.close()
+
+    @override_settings(RESERVATION_ADVISORY_LOCKS=False)
+    def test_overlap_across_the_boundary_is_not_double_booked(self):
+        # Both requests read the table's bookings before either inserts, unless one
+        # is held back by the lock, in which case the other gives up waiting.
+        barrier = threading.Barrier(2)
+        load = ReservationIntervalIndex.load
+
+        def load_then_wait(*args, **kwargs):
+            index = load(*args, **kwargs)
+            try:
+                barrier.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                pass
+            return index
+
+        requests = [
+            (self.customers[0], self.boundary - timedelta(minutes=30), 90),
+            (self.customers[1], self.boundary + timedelta(minutes=30), 60),
+        ]
+        with mock.patch.object(ReservationIntervalIndex, 'load', staticmethod(load_then_wait)):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                status_codes = list(pool.map(lambda request: self._create(*request), requests))
+
+        self.assertEqual(sorted(status_codes), [201, 400])
+        self.assertEqual(Reservation.objects.filter(canceled=False).count(), 1)
+
+    def test_bookings_near_a_boundary(self):
+        hour = timedelta(hours=1)
+        self.assertTrue(partitions.near_month_boundary(self.boundary - hour, self.boundary + hour))
+        self.assertTrue(partitions.near_month_boundary(self.boundary + 23 * hour, self.boundary + 25 * hour))
+        self.assertFalse(partitions.near_month_boundary(self.boundary + 24 * hour, self.boundary + 26 * hour))
+        self.assertFalse(partitions.near_month_boundary(self.boundary - 2 * hour, self.boundary))
+
+
+class ReservationBulkImportTest(TestCase):
+    """
+    Bulk imports through the API and the import_reservations command report
+    every row, create the valid ones and keep the queries flat in the batch size.
+    """
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create(username='owner', role='OWNER')
+        self.customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Bistro {number}', address='1 Main St', owner=owner) for number in range(2)
+        ]
+        for restaurant in self.restaurants:
+            OpeningHour.objects.create(restaurant=restaurant, day='sat', open_time='12:00', close_time='22:00')
+            Table.objects.bulk_create(Table(restaurant=restaurant, table_number=str(i), capacity=4) for i in range(2))
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def row(self, restaurant=0, hour=18, guests=2, **overrides):
+        return {
+            'restaurant': self.restaurants[restaurant].id,
+            'reservation_time': f'2025-05-24T{hour}:00:00Z',
+            'number_of_guests': guests,
+            'duration': 60,
+            **overrides,
+        }
+
+    def test_partly_invalid_rows_are_reported_per_row(self):
+        rows = [
+            self.row(),
+            self.row(restaurant=1, hour=12),
+            {key: value for key, value in self.row().items() if key != 'restaurant'},
+            {**self.row(), 'restaurant': 999999},
+            self.row(hour=23),
+            self.row(guests=6),
+            self.row(),
+            self.row(),
+            self.row(duration=Reservation.MAX_DURATION + 1),
+        ]
+        response = self.client.post('/api/reservations/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        results = body['results']
+
+        self.assertEqual((body['created'], body['failed']), (3, 6))
+        self.assertEqual([result['row'] for result in results], list(range(len(rows))))
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['created', 'created', 'failed', 'failed', 'failed', 'failed', 'created', 'failed', 'failed'],
+        )
+        self.assertIn('restaurant', results[2]['errors'])
+        self.assertIn('restaurant', results[3]['errors'])
+        self.assertEqual(results[4]['errors'], 'The restaurant is closed at the requested time.')
+        self.assertEqual(results[5]['errors'], 'No available table for the given time.')
+        self.assertEqual(results[7]['errors'], 'No available table for the given time.')
+        self.assertIn('duration', results[8]['errors'])
+
+        created = {result['id'] for result in results if result['status'] == 'created'}
+        self.assertEqual(set(Reservation.objects.values_list('id', flat=True)), created)
+        self.assertEqual(Reservation.objects.filter(restaurant=self.restaurants[0]).values('table').distinct().count(), 2)
+
+    def test_invalid_payloads(self):
+        self.assertEqual(self.client.post('/api/reservations/bulk/', [], format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/reservations/bulk/', self.row(), format='json').status_code, 400)
+
+    def _count_queries(self, rows):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/reservations/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['failed'], 0)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        small = self._count_queries([self.row(restaurant=0, hour=12), self.row(restaurant=1, hour=12)])
+        # Both tables of both restaurants, every hour of the day.
+        large = self._count_queries([
+            self.row(restaurant=restaurant, hour=hour) for restaurant in range(2) for hour in range(13, 22) for _ in range(2)
+        ])
+        self.assertEqual(large, small)
+
+    def _import_file(self, suffix, content, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as handle:
+            handle.write(content)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        try:
+            call_command('import_reservations', handle.name, '--customer=customer', *args, stdout=stdout, stderr=stderr)
+        finally:
+            Path(handle.name).unlink()
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_command_ndjson(self):
+        rows = [self.row(hour=12), self.row(hour=23), self.row(hour=13), self.row(guests=8)]
+        stdout, stderr = self._import_file('.ndjson', '\n'.join(json.dumps(row) for row in rows) + '\n\n', '--batch-size=2')
+
+        self.assertIn('Imported 2 reservations, 2 failed', stdout)
+        # Row numbers count from the start of the file, across batches.
+        self.assertEqual([line.split(':')[0] for line in stderr.splitlines()], ['row 1', 'row 3'])
+        self.assertEqual(Reservation.objects.filter(customer=self.customer).count(), 2)
+
+    def test_import_command_csv(self):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=list(self.row()))
+        writer.writeheader()
+        writer.writerows([self.row(hour=12), self.row(restaurant=1, hour=12), self.row(hour=12, number_of_guests='many')])
+        stdout, stderr = self._import_file('.csv', out.getvalue())
+
+        self.assertIn('Imported 2 reservations, 1 failed', stdout)
+        self.assertIn('row 2: ', stderr)
+        self.assertIn('number_of_guests', stderr)
+
+        with self.assertRaises(CommandError):
+            call_command('import_reservations', 'missing.ndjson', '--customer=nobody')
+
+    def test_import_command_missing_file(self):
+        with self.assertRaisesMessage(CommandError, 'Cannot read missing.ndjson'):
+            call_command('import_reservations', 'missing.ndjson', '--customer=customer', stdout=io.StringIO())
+
+
+class AsyncReservationViewTest(ReplicaTransactionTestCase):
+    """
+    The async create, update and cancel endpoints authenticate like the DRF
+    views and map allocation outcomes to the same status codes.
+    """
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create(username='owner', role='OWNER')
+        self.customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.restaurant = Restaurant.objects.create(name='Async Bistro', address='1 Main St', owner=owner)
+        OpeningHour.objects.create(restaurant=self.restaurant, day='sat', open_time='12:00', close_time='22:00')
+        Table.objects.bulk_create(Table(restaurant=self.restaurant, table_number=str(i), capacity=4, is_joinable=True) for i in range(2))
+        token = CustomTokenObtainPairSerializer.get_token(self.customer).access_token
+        # Client-wide headers of AsyncClient do not reach the ASGI scope, so each request passes them.
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.client = AsyncClient()
+
+    def payload(self, hour=18, guests=2):
+        return {'restaurant': self.restaurant.id, 'reservation_time': f'2025-05-24T{hour}:00:00Z', 'number_of_guests': guests, 'duration': 90}
+
+    async def create(self, **kwargs):
+        return await self.client.post('/api/reservations/async/create/', self.payload(**kwargs), content_type='application/json', headers=self.headers)
+
+    async def test_requests_need_a_valid_token(self):
+        anonymous = await self.client.post('/api/reservations/async/create/', self.payload(), content_type='application/json')
+        self.assertEqual(anonymous.status_code, 401)
+        forged = await self.client.post(
+            '/api/reservations/async/create/', self.payload(), content_type='application/json', headers={'Authorization': 'Bearer not-a-token'},
+        )
+        self.assertEqual(forged.status_code, 401)
+        self.assertEqual(await Reservation.objects.acount(), 0)
+
+    async def test_create_update_and_cancel(self):
+        response = await self.create(guests=6)
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(len(body['joined_tables']), 1)
+
+        response = await self.client.put(
+            f"/api/reservations/async/{body['id']}/update/", {'reservation_time': '2025-05-24T20:00:00Z', 'number_of_guests': 2},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['reservation_time'], response.json()['joined_tables']), ('2025-05-24T20:00:00Z', []))
+
+        response = await self.client.post(f"/api/reservations/async/{body['id']}/cancel/", content_type='application/json', headers=self.headers)
+        self.assertEqual((response.status_code, response.content), (204, b''))
+        self.assertEqual(await Reservation.objects.filter(canceled=False).acount(), 0)
+        response = await self.client.post(f"/api/reservations/async/{body['id']}/cancel/", content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_bad_requests(self):
+        malformed = await self.client.post('/api/reservations/async/create/', '{"restaurant": ', content_type='application/json', headers=self.headers)
+        self.assertEqual(malformed.status_code, 400)
+        self.assertEqual((await self.create(guests='many')).status_code, 400)
+        self.assertEqual((await self.create(hour=23)).json(), {'error': 'The restaurant is closed at the requested time.'})
+
+        self.assertEqual((await self.create(guests=8)).status_code, 201)
+        full = await self.create()
+        self.assertEqual((full.status_code, full.json()), (400, {'error': 'No available table for the given time.'}))
+
+        missing = await self.client.put('/api/reservations/async/999999/update/', {'number_of_guests': 2}, content_type='application/json', headers=self.headers)
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_missing_reservations_are_refused_before_the_write(self):
+        with mock.patch.object(ReservationRepository, 'update_reservation') as update, \
+                mock.patch.object(ReservationRepository, 'cancel_reservation') as cancel:
+            response = await self.client.put('/api/reservations/async/999999/update/', {'number_of_guests': 2}, content_type='application/json', headers=self.headers)
+            self.assertEqual(response.status_code, 404)
+            response = await self.client.post('/api/reservations/async/999999/cancel/', content_type='application/json', headers=self.headers)
+            self.assertEqual(response.status_code, 404)
+        update.assert_not_called()
+        cancel.assert_not_called()
+
+    async def test_contention_maps_to_conflict(self):
+        def contended(*args):
+            raise ReservationConflictError("Could not allocate tables.")
+
+        with mock.patch.object(ReservationRepository, 'create_reservation', contended):
+            response = await self.create()
+        self.assertEqual(response.status_code, 409)
+
+        reservation_id = (await self.create()).json()['id']
+        with mock.patch.object(ReservationRepository, 'update_reservation', contended):
+            response = await self.client.put(f'/api/reservations/async/{reservation_id}/update/', {'number_of_guests': 3}, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+
+
+class SeedDataTest(ReplicaTransactionTestCase):
+    """
+    Seeding a small floor with more workers than tables finishes, and books
+    only the days whose partitions were created for it.
+    """
+    def test_more_workers_than_tables(self):
+        first_day = datetime(2025, 5, 1)
+        call_command(
+            'seed_data', reservations=5000, restaurants=1, tables=1, customers=3, owners=1, workers=4,
+            start=first_day, seed=1, stdout=io.StringIO(),
+        )
+        days = math.ceil(5000 / BOOKINGS_PER_TABLE_DAY)
+        last_booking = Reservation.objects.order_by('-reservation_time').values_list('reservation_time', flat=True).first()
+        self.assertLess(Reservation.objects.count(), 5000)
+        self.assertLess(last_booking.date(), first_day.date() + timedelta(days=days))
+
+
+class ReservationListingTest(TestCase):
+    """
+    Cursor pages walk every primary reservation exactly once, including rows
+    sharing a reservation_time, with one query per page however deep.
+    """
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', role='OWNER')
+        self.customer = User.objects.create(username='customer', role='CUSTOMER')
+        restaurant = Restaurant.objects.create(name='Listed Bistro', address='1 Main St', owner=owner)
+        tables = Table.objects.bulk_create(Table(restaurant=restaurant, table_number=str(i), capacity=4) for i in range(3))
+        start = datetime(2025, 5, 24, 18, 0, tzinfo=dt_timezone.utc)
+        self.reservations = [
+            Reservation.objects.create(
+                customer=self.customer, restaurant=restaurant, table=tables[i % 3], number_of_guests=2, duration=60,
+                reservation_time=start + timedelta(hours=i // 3),
+            )
+            for i in range(25)
+        ]
+        primary = self.reservations[-1]
+        Reservation.objects.create(
+            customer=self.customer, restaurant=restaurant, table=tables[0], number_of_guests=2, duration=60,
+            reservation_time=primary.reservation_time + timedelta(days=1), primary_reservation=primary,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_cursor_pages_cover_every_reservation_once(self):
+        url = '/api/reservations/?page_size=4'
+        seen = []
+        while url:
+            with self.assertNumQueries(1):
+                body = self.client.get(url).json()
+            seen.extend(row['id'] for row in body['results'])
+            url = body['next']
+
+        expected = sorted(self.reservations, key=lambda reservation: (reservation.reservation_time, reservation.id), reverse=True)
+        self.assertEqual(seen, [reservation.id for reservation in expected])
+
+    def test_joined_tables_are_listed_on_the_primary_reservation(self):
+        body = self.client.get('/api/reservations/?page_size=1').json()
+        self.assertEqual(body['results'][0]['id'], self.reservations[-1].id)
+        self.assertEqual(len(body['results'][0]['joined_tables']), 1)
+
+
+class ReservationExportTest(TestCase):
+    """
+    Owners export their primary reservations as a stream, narrowed by
+    restaurant and time, and never see other owners' restaurants.
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.restaurants = [Restaurant.objects.create(name=f'Export {number}', address='1 Main St', owner=self.owner) for number in range(2)]
+        start = datetime(2025, 5, 24, 18, 0, tzinfo=dt_timezone.utc)
+        for restaurant in self.restaurants:
+            tables = Table.objects.bulk_create(Table(restaurant=restaurant, table_number=str(i), capacity=4) for i in range(2))
+            for day in range(5):
+                primary = Reservation.objects.create(
+                    customer=customer, restaurant=restaurant, table=tables[0], number_of_guests=6, duration=60,
+                    reservation_time=start + timedelta(days=day), special_requests='window, "quiet"',
+                )
+                Reservation.objects.create(
+                    customer=customer, restaurant=restaurant, table=tables[1], number_of_guests=6, duration=60,
+                    reservation_time=primary.reservation_time, primary_reservation=primary,
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_csv_export(self):
+        response = self.client.get('/api/reservations/export/', {'restaurant': self.restaurants[0].id, 'start': '2025-05-25T00:00:00Z'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['restaurant'] for row in rows}, {str(self.restaurants[0].id)})
+        self.assertEqual(rows[0]['reservation_time'], '2025-05-28T18:00:00+00:00')
+        self.assertEqual(rows[0]['special_requests'], 'window, "quiet"')
+        self.assertEqual(len(rows[0]['joined_tables'].split()), 1)
+
+    def test_ndjson_export_of_all_restaurants(self):
+        response = self.client.get('/api/reservations/export/', {'output': 'ndjson', 'end': '2025-05-26T00:00:00Z'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['restaurant'] for row in rows], [self.restaurants[0].id] * 2 + [self.restaurants[1].id] * 2)
+
+    def test_other_owners_and_customers_are_refused(self):
+        other = Restaurant.objects.create(name='Elsewhere', address='2 Main St', owner=User.objects.create(username='rival', role='OWNER'))
+        self.assertEqual(self.client.get('/api/reservations/export/', {'restaurant': other.id}).status_code, 404)
+        self.client.force_authenticate(User.objects.get(username='customer'))
+        self.assertEqual(self.client.get('/api/reservations/export/').status_code, 403)
+
+
+class OccupancyRollupTest(TestCase):
+    """
+    Creates, updates, cancels and imports keep the hourly rollups equal to a
+    rebuild from the reservation table, and analytics read them.
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        self.customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.restaurant = Restaurant.objects.create(name='Counted Bistro', address='1 Main St', owner=self.owner)
+        Table.objects.bulk_create(Table(restaurant=self.restaurant, table_number=str(i), capacity=4, is_joinable=True) for i in range(2))
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def _buckets(self):
+        return {
+            (row.date.day, row.hour): (row.reservations, row.cancellations, row.seats, row.table_minutes)
+            for row in OccupancyRollup.objects.filter(restaurant=self.restaurant)
+            if (row.reservations, row.cancellations, row.seats, row.table_minutes) != (0, 0, 0, 0)
+        }
+
+    def _assert_matches_rebuild(self):
+        incremental = self._buckets()
+        call_command('rebuild_occupancy_rollups', workers=1, stdout=io.StringIO())
+        self.assertEqual(self._buckets(), incremental)
+
+    def test_writes_keep_the_rollup_in_step(self):
+        response = self.client.post('/api/reservations/create/', {
+            'restaurant': self.restaurant.id, 'reservation_time': '2025-05-24T18:30:00Z', 'number_of_guests': 6, 'duration': 90,
+        }, format='json')
+        reservation_id = response.json()['id']
+        # Six guests take both tables: half an hour at each in the first hour, a full one in the second.
+        self.assertEqual(self._buckets(), {(24, 18): (1, 0, 6, 60), (24, 19): (0, 0, 0, 120)})
+        self._assert_matches_rebuild()
+
+        self.client.put(f'/api/reservations/{reservation_id}/update/', {'reservation_time': '2025-05-24T20:00:00Z', 'number_of_guests': 3, 'duration': 60}, format='json')
+        self.assertEqual(self._buckets(), {(24, 20): (1, 0, 3, 60)})
+        self._assert_matches_rebuild()
+
+        self.client.post(f'/api/reservations/{reservation_id}/cancel/')
+        self.assertEqual(self._buckets(), {(24, 20): (1, 1, 0, 0)})
+        self._assert_matches_rebuild()
+
+    def test_update_racing_a_cancel_keeps_it_canceled(self):
+        reservation_id = self.client.post('/api/reservations/create/', {
+            'restaurant': self.restaurant.id, 'reservation_time': '2025-05-24T18:30:00Z', 'number_of_guests': 6, 'duration': 90,
+        }, format='json').json()['id']
+
+        # The cancel commits after the update looked the booking up, before it allocates.
+        run_allocation = ReservationRepository.run_allocation
+
+        def cancel_then_allocate(restaurant_ids, allocate, windows=()):
+            ReservationRepository.cancel_reservation(reservation_id, self.customer)
+            return run_allocation(restaurant_ids, allocate, windows)
+
+        with mock.patch.object(ReservationRepository, 'run_allocation', cancel_then_allocate):
+            response = self.client.put(f'/api/reservations/{reservation_id}/update/', {'reservation_time': '2025-05-24T20:00:00Z'}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(set(Reservation.objects.values_list('canceled', flat=True)), {True})
+        self.assertEqual(Reservation.objects.count(), 2)
+        self.assertEqual(self._buckets(), {(24, 18): (1, 1, 0, 0)})
+        self._assert_matches_rebuild()
+
+    def test_imports_are_counted(self):
+        self.client.post('/api/reservations/bulk/', [
+            {'restaurant': self.restaurant.id, 'reservation_time': f'2025-05-2{day}T12:00:00Z', 'number_of_guests': 2, 'duration': 60}
+            for day in (4, 5)
+        ], format='json')
+        self.assertEqual(self._buckets(), {(24, 12): (1, 0, 2, 60), (25, 12): (1, 0, 2, 60)})
+        self._assert_matches_rebuild()
+
+    def test_analytics_report(self):
+        for hour in (12, 13):
+            self.client.post('/api/reservations/create/', {
+                'restaurant': self.restaurant.id, 'reservation_time': f'2025-05-24T{hour}:00:00Z', 'number_of_guests': 4, 'duration': 120,
+            }, format='json')
+        canceled = Reservation.objects.get(reservation_time__hour=13)
+        self.client.post(f'/api/reservations/{canceled.id}/cancel/')
+
+        self.client.force_authenticate(self.owner)
+        with self.assertNumQueries(4):
+            body = self.client.get('/api/reservations/analytics/', {'start': '2025-05-24', 'end': '2025-05-25'}).json()
+
+        self.assertEqual(body['days'][0], {
+            'date': '2025-05-24', 'reservations': 2, 'cancellations': 1, 'seats': 4, 'table_minutes': 120,
+            'cancellation_rate': 0.5, 'table_utilization': round(120 / (2 * 24 * 60), 4),
+        })
+        self.assertEqual(body['days'][1]['reservations'], 0)
+        self.assertEqual(len(body['hours']), 24)
+        self.assertEqual(body['hours'][12:14], [{'hour': 12, 'reservations': 1, 'seats': 4}, {'hour': 13, 'reservations': 1, 'seats': 0}])
+
+
+
+class ReservationPartitionTest(TestCase):
+    """
+    Monthly partitions take over their rows from the DEFAULT partition, time-bounded
+    queries only scan the months they cover, and archiving takes old months out.
+    """
+
+    def setUp(self):
+        self.customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.restaurant = Restaurant.objects.create(name='Dated Bistro', address='1 Main St', owner=User.objects.create(username='owner', role='OWNER'))
+        self.table = Table.objects.create(restaurant=self.restaurant, table_number='1', capacity=4)
+
+    def _book(self, day, hour=12):
+        return Reservation.objects.create(
+            customer=self.customer, restaurant=self.restaurant, table=self.table,
+            reservation_time=datetime(2024, *day, hour, tzinfo=dt_timezone.utc), number_of_guests=2, duration=90,
+        )
+
+    def _partition_of(self, reservation):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM reservations_reservation WHERE id = %s", [reservation.id])
+            return cursor.fetchone()[0]
+
+    def _ids_in(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {connection.ops.quote_name(table)} ORDER BY id")
+            return [id for (id,) in cursor.fetchall()]
+
+    def test_new_partitions_take_over_their_rows(self):
+        reservation = self._book((3, 10))
+        self.assertEqual(self._partition_of(reservation), partitions.DEFAULT_PARTITION)
+
+        created = partitions.ensure_partitions(datetime(2024, 2, 1).date(), datetime(2024, 3, 31).date())
+        self.assertEqual(created, ['reservations_reservation_202402', 'reservations_reservation_202403'])
+        self.assertEqual(self._partition_of(reservation), 'reservations_reservation_202403')
+        self.assertEqual(partitions.ensure_partitions(datetime(2024, 3, 1).date(), datetime(2024, 3, 1).date()), [])
+
+        # The month's own exclusion constraint still refuses overlapping bookings.
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._book((3, 10), hour=13)
+
+    def test_overlap_queries_skip_older_months(self):
+        partitions.ensure_partitions(datetime(2024, 1, 1).date(), datetime(2024, 4, 30).date())
+        window = Reservation.overlapping(datetime(2024, 3, 10, 12, tzinfo=dt_timezone.utc), datetime(2024, 3, 10, 14, tzinfo=dt_timezone.utc))
+        plan = Reservation.objects.filter(window, restaurant=self.restaurant).explain()
+        self.assertIn('reservations_reservation_202403', plan)
+        self.assertNotIn('reservations_reservation_202401', plan)
+        self.assertNotIn('reservations_reservation_202402', plan)
+
+    def test_archive_by_detaching_months(self):
+        january, march = self._book((1, 10)), self._book((3, 10))
+        with self.assertRaises(CommandError):
+            call_command('archive_reservations', f'--before={timezone.now().date()}', stdout=io.StringIO())
+
+        # January's rows only sit in the DEFAULT partition; they get a partition to detach.
+        call_command('archive_reservations', '--before=2024-02-01', stdout=io.StringIO())
+        self.assertEqual(list(Reservation.objects.values_list('id', flat=True)), [march.id])
+        self.assertEqual(self._ids_in('reservations_reservation_archive_202401'), [january.id])
+        self.assertNotIn('reservations_reservation_202401', [name for _, name in partitions.monthly_partitions()])
+
+    def test_archive_by_moving_rows(self):
+        partitions.ensure_partitions(datetime(2024, 1, 1).date(), datetime(2024, 3, 31).date())
+        january, early_march, late_march = (self._book(day) for day in ((1, 10), (3, 5), (3, 20)))
+        call_command('rebuild_occupancy_rollups', workers=1, stdout=io.StringIO())
+        # Outside a test's transaction the bookings would be committed; partitions
+        # with foreign key checks still pending cannot be dropped.
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        call_command('archive_reservations', '--before=2024-03-15', '--mode=move', '--batch-size=1', stdout=io.StringIO())
+        self.assertEqual(list(Reservation.objects.values_list('id', flat=True)), [late_march.id])
+        self.assertEqual(self._ids_in(partitions.ARCHIVE_TABLE), [january.id, early_march.id])
+        # Emptied months are dropped; March still holds a booking after the cutoff.
+        self.assertEqual([name for _, name in partitions.monthly_partitions() if name < 'reservations_reservation_202404'], ['reservations_reservation_202403'])
+
+        # Rebuilding from the cutoff on leaves the buckets of archived bookings alone.
+        call_command('rebuild_occupancy_rollups', '--since=2024-03-15', workers=1, stdout=io.StringIO())
+        self.assertEqual(
+            sorted(OccupancyRollup.objects.filter(reservations=1).values_list('date__month', 'date__day')),
+            [(1, 10), (3, 5), (3, 20)],
+        )
@@ -1,9 +1,19 @@
 from django.urls import path
-from .views import ReservationCreateView, ReservationUpdateView, ReservationCancelView
+from .async_views import AsyncReservationCreateView, AsyncReservationUpdateView, AsyncReservationCancelView
+from .views import ReservationCreateView, ReservationUpdateView, ReservationCancelView, ReservationBulkCreateView, ReservationMetricsView, ReservationListView, RestaurantReservationListView, ReservationExportView, OccupancyAnalyticsView
 
 
 urlpatterns = [
+    path('', ReservationListView.as_view(), name='reservation-list'),
+    path('restaurant/<int:restaurant_id>/', RestaurantReservationListView.as_view(), name='restaurant-reservation-list'),
     path('create/', ReservationCreateView.as_view(), name='reservation-create'),
+    path('bulk/', ReservationBulkCreateView.as_view(), name='reservation-bulk-create'),
     path('<int:pk>/update/', ReservationUpdateView.as_view(), name='reservation-update'),
     path('<int:pk>/cancel/', ReservationCancelView.as_view(), name='reservation-cancel'),
+    path('async/create/', AsyncReservationCreateView.as_view(), name='async-reservation-create'),
+    path('async/<int:pk>/update/', AsyncReservationUpdateView.as_view(), name='async-reservation-update'),
+    path('async/<int:pk>/cancel/', AsyncReservationCancelView.as_view(), name='async-reservation-cancel'),
+    path('metrics/', ReservationMetricsView.as_view(), name='reservation-metrics'),
+    path('export/', ReservationExportView.as_view(), name='reservation-export'),
+    path('analytics/', OccupancyAnalyticsView.as_view(), name='reservation-analytics'),
 ]
@@ -1,8 +1,16 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .serializers import ReservationSerializer
-from .repository import ReservationRepository
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from restaurants.repository import RestaurantRepository
+from restaurants.views import IsOwnerUser
+from .export import CONTENT_TYPES, export_reservations
+from .rollups import occupancy_report
+from .serializers import ReservationSerializer, ReservationExportQuerySerializer, OccupancyQuerySerializer
+from .repository import ReservationRepository, ReservationConflictError, ReservationNotFoundError, OutsideOpeningHoursError
+from .metrics import allocation_metrics
+from .pagination import ReservationKeysetPagination
 import logging
 
 
@@ -26,6 +34,11 @@ class ReservationCreateView(APIView):
                     return Response(ReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
                 return Response({"error": "No available table for the given time."}, status=status.HTTP_400_BAD_REQUEST)
                
+            except OutsideOpeningHoursError:
+                return Response({"error": "The restaurant is closed at the requested time."}, status=status.HTTP_400_BAD_REQUEST)
+            except ReservationConflictError as e:
+                logger.warning(f"Reservation contention: {str(e)}")
+                return Response({"error": "The restaurant is busy, please try again."}, status=status.HTTP_409_CONFLICT)
             except Exception as e:
                 logger.error(f"Error creating reservation: {str(e)}")
                 return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -47,10 +60,18 @@ class ReservationUpdateView(APIView):
                 if reservation:
                     logger.info(f"Reservation updated successfully: {reservation.id}")
                     return Response(ReservationSerializer(reservation).data, status=status.HTTP_200_OK)
-                return Response({"error": "Reservation not found or no table available."}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({"error": "No available table for the given time."}, status=status.HTTP_400_BAD_REQUEST)
+            except ReservationNotFoundError:
+                return Response({"error": "Reservation not found or already canceled."}, status=status.HTTP_404_NOT_FOUND)
+            except OutsideOpeningHoursError:
+                return Response({"error": "The restaurant is closed at the requested time."}, status=status.HTTP_400_BAD_REQUEST)
+            except ReservationConflictError as e:
+                logger.warning(f"Reservation contention: {str(e)}")
+                return Response({"error": "The restaurant is busy, please try again."}, status=status.HTTP_409_CONFLICT)
             except Exception as e:
                 logger.error(f"Error updating reservation: {str(e)}")
                 return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
             
             
@@ -70,4 +91,123 @@ class ReservationCancelView(APIView):
             return Response({"error": "Reservation not found or already canceled."}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             logger.error(f"Error canceling reservation: {str(e)}")
-            return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+
+class ReservationBulkCreateView(APIView):
+    """
+    View to create many reservations in one request, reporting the outcome of every row.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_ROWS = 10000
+
+    def post(self, request):
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "Expected a non-empty list of reservations."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.MAX_ROWS:
+            return Response({"error": f"At most {self.MAX_ROWS} reservations can be imported per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = ReservationRepository.import_reservations(rows, request.user)
+        except ReservationConflictError as e:
+            logger.warning(f"Reservation contention during bulk import: {str(e)}")
+            return Response({"error": "The restaurant is busy, please try again."}, status=status.HTTP_409_CONFLICT)
+        except Exception as e:
+            logger.error(f"Error importing reservations: {str(e)}")
+            return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        created = sum(1 for result in results if result["status"] == "created")
+        logger.info(f"Bulk import by user {request.user.id}: {created} created, {len(results) - created} failed")
+        return Response({"created": created, "failed": len(results) - created, "results": results}, status=status.HTTP_200_OK)
+
+
+
+
+class ReservationMetricsView(APIView):
+    """
+    View exposing table allocation metrics (lock waits, retries, failures) to admins.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(allocation_metrics.snapshot(), status=status.HTTP_200_OK)
+
+
+class ReservationListView(APIView):
+    """
+    View to list the user's reservations, newest first, one cursor page at a time.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        paginator = ReservationKeysetPagination()
+        page = paginator.paginate_queryset(ReservationRepository.get_customer_reservations(request.user), request, view=self)
+        return paginator.get_paginated_response(ReservationSerializer(page, many=True).data)
+
+
+class RestaurantReservationListView(APIView):
+    """
+    View to list the reservations of a restaurant to its owner, newest first, one cursor page at a time.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, restaurant_id):
+        paginator = ReservationKeysetPagination()
+        page = paginator.paginate_queryset(ReservationRepository.get_restaurant_reservations(restaurant_id, request.user), request, view=self)
+        return paginator.get_paginated_response(ReservationSerializer(page, many=True).data)
+
+
+class ReservationExportView(APIView):
+    """
+    View streaming an owner's reservations as CSV or NDJSON, optionally narrowed
+    to some of their restaurants and a reservation_time range.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsOwnerUser]
+
+    def get(self, request):
+        query = ReservationExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        restaurant_ids = RestaurantRepository.get_restaurant_ids_for_owner(request.user)
+        if 'restaurant' in params:
+            if not set(params['restaurant']) <= set(restaurant_ids):
+                return Response({"error": "Restaurant not found."}, status=status.HTTP_404_NOT_FOUND)
+            restaurant_ids = params['restaurant']
+
+        output = params['output']
+        response = StreamingHttpResponse(
+            export_reservations(restaurant_ids, output, params.get('start'), params.get('end')),
+            content_type=CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="reservations-{timezone.localdate():%Y%m%d}.{output}"'
+        logger.info(f"Reservation export by user {request.user.id} for restaurants {restaurant_ids}")
+        return response
+
+
+class OccupancyAnalyticsView(APIView):
+    """
+    View reporting an owner's bookings, seats, cancellation rate and table utilization
+    per day and per hour of the day, read from the occupancy rollups only.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsOwnerUser]
+
+    def get(self, request):
+        query = OccupancyQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        restaurant_ids = RestaurantRepository.get_restaurant_ids_for_owner(request.user)
+        if 'restaurant' in params:
+            if not set(params['restaurant']) <= set(restaurant_ids):
+                return Response({"error": "Restaurant not found."}, status=status.HTTP_404_NOT_FOUND)
+            restaurant_ids = params['restaurant']
+
+        return Response({
+            "restaurants": restaurant_ids,
+            "start": params['start'],
+            "end": params['end'],
+            **occupancy_report(restaurant_ids, params['start'], params['end']),
+        }, status=status.HTTP_200_OK)
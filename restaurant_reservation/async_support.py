@@ -0,0 +1,84 @@
+"""
+Helpers for the async (ASGI) request path.
+
+Async views run on the event loop and use the async ORM directly. Work that
+is sync-only (transactions, DRF serializers, JWT user lookup) is pushed onto a
+bounded thread pool with run_sync, so a burst of requests cannot spawn an
+unbounded number of threads or database connections.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+sync_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_SYNC_WORKERS, thread_name_prefix="sync-section")
+
+
+def _with_fresh_connection(func, *args, **kwargs):
+    # Executor threads outlive requests, so drop connections that are past
+    # CONN_MAX_AGE or broken before and after each section.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Run a sync-only callable on the bounded executor and await its result.
+    """
+    return await sync_to_async(_with_fresh_connection, thread_sensitive=False, executor=sync_executor)(func, *args, **kwargs)
+
+
+def _authenticate(request):
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authentication_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's APIView: authenticates with the
+    configured DRF authentication classes, parses JSON bodies and renders
+    JSON responses. Subclasses implement async handlers (`async def post`).
+    """
+    require_authentication = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated API, like DRF's APIView: no CSRF cookie involved.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await run_sync(_authenticate, request)
+        except exceptions.AuthenticationFailed as e:
+            return self.respond({"detail": str(e.detail)}, status.HTTP_401_UNAUTHORIZED)
+        if self.require_authentication and request.user is None:
+            return self.respond({"detail": "Authentication credentials were not provided."}, status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            request.data = json.loads(request.body) if request.body else {}
+        except ValueError:
+            return self.respond({"error": "Malformed JSON body."}, status.HTTP_400_BAD_REQUEST)
+
+        return await super().dispatch(request, *args, **kwargs)
+
+    def respond(self, data, status_code):
+        if status_code == status.HTTP_204_NO_CONTENT:
+            # A 204 must not carry a body; ASGI servers reject one.
+            return HttpResponse(status=status_code)
+        return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
@@ -0,0 +1,213 @@
+"""
+Primary/replica routing with read-your-writes stickiness.
+
+Writes, and every read made inside a transaction, go to the primary
+(`default`). Other reads go to one of the DATABASE_REPLICAS that answers
+and lags the primary by at most REPLICA_MAX_LAG_SECONDS, or to the primary
+when none does. Within a request, reads stay on the primary once anything
+has been written, and for unsafe methods from the start. Afterwards the
+client carries a cookie that keeps its reads on the primary for another
+REPLICA_STICKY_SECONDS, long enough for the replicas to catch up.
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Seconds since the last replayed transaction, or 0 when the server is a primary
+# or has replayed everything it received (an idle primary sends nothing to replay).
+POSTGRES_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+_request_routing = ContextVar('request_db_routing', default=None)
+_force_primary = ContextVar('force_primary_reads', default=False)
+
+
+class RequestRouting:
+    """
+    Routing state of one request, shared with the executor threads serving it.
+    """
+    __slots__ = ('primary', 'wrote', 'replica')
+
+    def __init__(self, primary):
+        self.primary = primary
+        self.wrote = False
+        self.replica = None
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Route the reads made inside the block to the primary, e.g. to fill a shared
+    cache that a lagging replica would fill with rows older than the write that
+    invalidated it.
+    """
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+class ReplicaMonitor:
+    """
+    Process-wide view of replica lag. Each replica is measured at most every
+    REPLICA_LAG_CHECK_INTERVAL seconds; one that cannot be reached counts as
+    unavailable until its next check.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lags = {}
+
+    def available(self):
+        """
+        The replicas currently fit to serve reads.
+        """
+        return [
+            alias for alias in settings.DATABASE_REPLICAS
+            if (lag := self.lag(alias)) is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+        ]
+
+    def lag(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._lags.get(alias)
+        if checked and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return checked[1]
+        lag = self._measure(alias)
+        with self._lock:
+            self._lags[alias] = (now, lag)
+        return lag
+
+    def _measure(self, alias):
+        connection = connections[alias]
+        try:
+            if connection.vendor != 'postgresql':
+                connection.ensure_connection()
+                return 0.0
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_LAG_SQL)
+                return float(cursor.fetchone()[0])
+        except DatabaseError as e:
+            logger.warning(f"Replica {alias} is unavailable, reading from the primary: {str(e).strip()}")
+            # Don't keep a broken connection around for the next check.
+            connection.close()
+            return None
+
+    def reset(self):
+        with self._lock:
+            self._lags.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {alias: lag for alias, (_, lag) in self._lags.items()}
+
+
+replica_monitor = ReplicaMonitor()
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router sending writes and transactional reads to the primary and
+    other reads to a healthy replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _force_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related rows come from where the instance was read.
+            return instance._state.db
+
+        routing = _request_routing.get()
+        if routing is None:
+            return self._pick_replica()
+        if routing.primary:
+            return DEFAULT_DB_ALIAS
+        if routing.replica is None:
+            # One replica per request, so its reads see a single point in time.
+            routing.replica = self._pick_replica()
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _request_routing.get()
+        if routing is not None:
+            routing.primary = routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def _pick_replica():
+        if not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        replicas = replica_monitor.available()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Keeps a client's reads on the primary after it writes: for unsafe methods,
+    for the rest of a request that wrote, and for REPLICA_STICKY_SECONDS
+    afterwards through a cookie. Works on both the WSGI and the ASGI request path.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = self.start(request)
+        token = _request_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_routing.reset(token)
+        return self.finish(response, routing)
+
+    async def __acall__(self, request):
+        routing = self.start(request)
+        token = _request_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_routing.reset(token)
+        return self.finish(response, routing)
+
+    def start(self, request):
+        return RequestRouting(primary=request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES)
+
+    def finish(self, response, routing):
+        if routing.wrote and settings.REPLICA_STICKY_SECONDS > 0:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,64 @@
+"""
+Shared plumbing for the import_* management commands.
+
+Each command streams rows from an NDJSON or CSV file, hands them to its
+repository in batches and reports the per-row results the repository returns.
+"""
+
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class ImportCommand(BaseCommand):
+    """
+    Base command that reads, batches and reports; subclasses call import_rows
+    with the repository function that writes one batch.
+    """
+
+    def input_format(self, options):
+        return options["format"] or ("csv" if options["path"].endswith(".csv") else "ndjson")
+
+    def import_rows(self, path, input_format, batch_size, import_batch):
+        """
+        Feeds the file to import_batch in batches, writes failed rows to stderr
+        and returns the created and failed counts.
+        """
+        created = failed = 0
+        row_offset = 0
+
+        for batch in self._batches(self._read_rows(path, input_format), batch_size):
+            for result in import_batch(batch):
+                if result["status"] == "created":
+                    created += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f"row {row_offset + result['row']}: {result['errors']}")
+            row_offset += len(batch)
+
+        return created, failed
+
+    def _read_rows(self, path, input_format):
+        try:
+            handle = open(path, newline="")
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc.strerror}.")
+
+        with handle:
+            if input_format == "csv":
+                yield from csv.DictReader(handle)
+            else:
+                for line in handle:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def _batches(self, rows, size):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -0,0 +1,354 @@
+"""
+Per-request SQL and timing instrumentation, exported in Prometheus format.
+
+Every database connection gets one execute wrapper, installed when the
+connection is opened. It records into the collector of the request being
+served, found through a context variable, so queries run by async views on
+executor threads are attributed to their request as well. The middleware
+reports each request's numbers in a Server-Timing header and folds them into
+per-route histograms served at /metrics. Streamed responses are measured
+until their last chunk, so queries run while the body streams are counted.
+Statements that wait for a lock are timed apart from the rest of the SQL.
+"""
+
+import hmac
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from reservations.metrics import allocation_metrics
+from restaurant_reservation.db_router import replica_monitor
+from restaurants.metrics import cache_metrics
+
+
+logger = logging.getLogger(__name__)
+
+_current_stats = ContextVar('request_sql_stats', default=None)
+
+# Markers of statements that wait for a lock (the reservation allocation lock
+# sets lock_timeout and takes pg_advisory_xact_lock). Their time is contention,
+# not query cost, so it is kept out of the SQL time and the slow-query log.
+LOCK_STATEMENT_MARKERS = ('pg_advisory_xact_lock', 'lock_timeout')
+
+
+def is_lock_statement(sql):
+    return any(marker in sql for marker in LOCK_STATEMENT_MARKERS)
+
+
+class RequestStats:
+    """
+    SQL activity of one request.
+    """
+    __slots__ = ('queries', 'sql_seconds', 'slowest_seconds', 'slowest_sql', 'lock_waits', 'lock_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+        self.lock_waits = 0
+        self.lock_seconds = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        if is_lock_statement(sql):
+            stats.lock_waits += 1
+            stats.lock_seconds += elapsed
+        else:
+            stats.sql_seconds += elapsed
+            if elapsed > stats.slowest_seconds:
+                stats.slowest_seconds = elapsed
+                stats.slowest_sql = sql
+
+
+def install_query_recorder(connection):
+    # Innermost-first position keeps it clear of execute_wrapper() blocks, which pop the last entry.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(lambda sender, connection, **kwargs: install_query_recorder(connection), weak=False)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts with a sum, like a Prometheus histogram.
+    """
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for position, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[position] += 1
+
+
+class RouteMetrics:
+    """
+    Process-wide per-route request, latency, SQL time and query-count metrics.
+    Routes are URL patterns rather than paths, so the number of series stays bounded.
+    """
+    SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+    def observe(self, route, method, status_code, seconds, stats):
+        with self._lock:
+            metrics = self._routes.get((route, method))
+            if metrics is None:
+                metrics = self._routes[(route, method)] = {
+                    'statuses': {},
+                    'duration': Histogram(self.SECONDS_BUCKETS),
+                    'sql': Histogram(self.SECONDS_BUCKETS),
+                    'lock': Histogram(self.SECONDS_BUCKETS),
+                    'queries': Histogram(self.QUERY_BUCKETS),
+                }
+            status_class = f'{status_code // 100}xx'
+            metrics['statuses'][status_class] = metrics['statuses'].get(status_class, 0) + 1
+            metrics['duration'].observe(seconds)
+            metrics['sql'].observe(stats.sql_seconds)
+            metrics['lock'].observe(stats.lock_seconds)
+            metrics['queries'].observe(stats.queries)
+
+    def render(self):
+        """
+        The route metrics in Prometheus text exposition format.
+        """
+        families = [
+            ('http_requests_total', 'counter', 'Requests served, by route, method and status class.'),
+            ('http_request_duration_seconds', 'histogram', 'Time from the first middleware to the response.'),
+            ('http_request_sql_seconds', 'histogram', 'Time spent executing SQL per request, lock waits excluded.'),
+            ('http_request_lock_wait_seconds', 'histogram', 'Time spent in statements waiting for a lock per request.'),
+            ('http_request_sql_queries', 'histogram', 'SQL statements executed per request.'),
+        ]
+        lines = {name: [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'] for name, kind, help_text in families}
+        with self._lock:
+            for (route, method), metrics in sorted(self._routes.items()):
+                labels = f'route="{escape_label(route)}",method="{method}"'
+                for status_class, count in sorted(metrics['statuses'].items()):
+                    lines['http_requests_total'].append(f'http_requests_total{{{labels},status="{status_class}"}} {count}')
+                for name, key in (
+                    ('http_request_duration_seconds', 'duration'), ('http_request_sql_seconds', 'sql'),
+                    ('http_request_lock_wait_seconds', 'lock'), ('http_request_sql_queries', 'queries'),
+                ):
+                    lines[name].extend(histogram_lines(name, labels, metrics[key]))
+        return [line for name, _, _ in families for line in lines[name]]
+
+
+route_metrics = RouteMetrics()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def histogram_lines(name, labels, histogram):
+    lines = [f'{name}_bucket{{{labels},le="{bound}"}} {count}' for bound, count in zip(histogram.bounds, histogram.counts)]
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.total}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+def route_label(match):
+    """
+    The URL pattern a request resolved to, or 'unmatched'. Router-generated
+    routes are regexes; their anchors are dropped so labels read like paths.
+    """
+    if match is None:
+        return 'unmatched'
+    return match.route.replace('^', '').replace('$', '')
+
+
+_END = object()
+
+
+def measured_chunks(chunks, stats, on_close):
+    """
+    Yield the chunks of a streamed body, recording their queries into `stats`,
+    and call `on_close` once the stream is exhausted or closed.
+    """
+    chunks = iter(chunks)
+    try:
+        while True:
+            token = _current_stats.set(stats)
+            try:
+                chunk = next(chunks, _END)
+            finally:
+                _current_stats.reset(token)
+            if chunk is _END:
+                break
+            yield chunk
+    finally:
+        on_close()
+
+
+async def ameasured_chunks(chunks, stats, on_close):
+    """
+    Async counterpart of measured_chunks for async streamed bodies.
+    """
+    chunks = aiter(chunks)
+    try:
+        while True:
+            token = _current_stats.set(stats)
+            try:
+                chunk = await anext(chunks, _END)
+            finally:
+                _current_stats.reset(token)
+            if chunk is _END:
+                break
+            yield chunk
+    finally:
+        on_close()
+
+
+class QueryTimingMiddleware:
+    """
+    Times each request and its SQL, adds a Server-Timing header and records
+    the numbers per route. Works on both the WSGI and the ASGI request path.
+    A streamed response is recorded when its stream ends; its Server-Timing
+    header, sent before the body, covers the work done up to then.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self.finish(request, response, started, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self.finish(request, response, started, stats)
+
+    def finish(self, request, response, started, stats):
+        seconds = time.perf_counter() - started
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={seconds * 1000:.1f}',
+            f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries"',
+            f'db-slowest;dur={stats.slowest_seconds * 1000:.1f}',
+            f'db-lock;dur={stats.lock_seconds * 1000:.1f};desc="{stats.lock_waits} waits"',
+        ])
+        if response.streaming:
+            def on_close():
+                self.record(request, response, time.perf_counter() - started, stats)
+
+            wrap = ameasured_chunks if response.is_async else measured_chunks
+            response.streaming_content = wrap(response.streaming_content, stats, on_close)
+            return response
+        self.record(request, response, seconds, stats)
+        return response
+
+    def record(self, request, response, seconds, stats):
+        route_metrics.observe(route_label(request.resolver_match), request.method, response.status_code, seconds, stats)
+        if stats.slowest_seconds * 1000 >= settings.SLOW_QUERY_LOG_MS:
+            logger.warning(f"Slow query on {request.method} {request.path} ({stats.slowest_seconds * 1000:.1f} ms): {stats.slowest_sql}")
+        if stats.lock_seconds * 1000 >= settings.SLOW_QUERY_LOG_MS:
+            logger.warning(f"Lock wait on {request.method} {request.path}: {stats.lock_seconds * 1000:.1f} ms over {stats.lock_waits} statements")
+
+
+def allocation_lines():
+    snapshot = allocation_metrics.snapshot()
+    name = 'reservation_allocation_lock_wait_seconds'
+    lines = [
+        f'# HELP {name} Time spent waiting for the restaurant allocation lock.',
+        f'# TYPE {name} histogram',
+    ]
+    lines.extend(f'{name}_bucket{{le="{bound}"}} {count}' for bound, count in snapshot['lock_wait_buckets'].items())
+    lines.extend([
+        f'{name}_bucket{{le="+Inf"}} {snapshot["lock_waits"]}',
+        f'{name}_sum {snapshot["lock_wait_seconds_total"]}',
+        f'{name}_count {snapshot["lock_waits"]}',
+        '# HELP reservation_allocation_retries_total Allocations retried after a transient database failure.',
+        '# TYPE reservation_allocation_retries_total counter',
+        f'reservation_allocation_retries_total {snapshot["retries"]}',
+        '# HELP reservation_allocation_failures_total Allocations that gave up after all retries.',
+        '# TYPE reservation_allocation_failures_total counter',
+        f'reservation_allocation_failures_total {snapshot["failures"]}',
+    ])
+    return lines
+
+
+def cache_lines():
+    snapshot = cache_metrics.snapshot()
+    return [
+        '# HELP restaurant_cache_requests_total Restaurant payload cache lookups, by result.',
+        '# TYPE restaurant_cache_requests_total counter',
+        f'restaurant_cache_requests_total{{result="hit"}} {snapshot["hits"]}',
+        f'restaurant_cache_requests_total{{result="miss"}} {snapshot["misses"]}',
+    ]
+
+
+def replica_lines():
+    lines = [
+        '# HELP database_replica_lag_seconds Replication lag at the last check; -1 when the replica was unreachable.',
+        '# TYPE database_replica_lag_seconds gauge',
+    ]
+    lines.extend(
+        f'database_replica_lag_seconds{{replica="{alias}"}} {-1 if lag is None else lag}'
+        for alias, lag in sorted(replica_monitor.snapshot().items())
+    )
+    return lines
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Scrapes must come from an address in
+    METRICS_ALLOWED_IPS or send METRICS_TOKEN as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    body = '\n'.join(route_metrics.render() + allocation_lines() + cache_lines() + replica_lines()) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,71 @@
+import io
+import json
+import pstats
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the request profiles written by ProfilingMiddleware and print the "
+        "captures per route and the hottest functions across them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=settings.PROFILE_DIR, help="Directory holding the captures")
+        parser.add_argument("--route", action="append", default=[], help="Only captures of this view name or route; repeatable")
+        parser.add_argument("--since", type=datetime.fromisoformat, help="Only captures taken at or after this time")
+        parser.add_argument("--top", type=int, default=25, help="How many functions to list")
+        parser.add_argument("--sort", default="tottime", choices=["tottime", "cumulative", "ncalls"])
+        parser.add_argument("--output", help="Also write the merged profile to this .pstats file")
+
+    def handle(self, *args, **options):
+        directory = Path(options["dir"])
+        if not directory.is_dir():
+            raise CommandError(f"No profile directory at {directory}.")
+
+        since = options["since"]
+        if since and timezone.is_naive(since):
+            since = timezone.make_aware(since)
+
+        captures = []
+        for metadata_path in sorted(directory.glob("*.json")):
+            stats_path = metadata_path.with_suffix(".pstats")
+            if not stats_path.exists():
+                continue
+            metadata = json.loads(metadata_path.read_text())
+            if options["route"] and metadata["view_name"] not in options["route"] and metadata["route"] not in options["route"]:
+                continue
+            if since and datetime.fromisoformat(metadata["captured_at"]) < since:
+                continue
+            captures.append((stats_path, metadata))
+        if not captures:
+            raise CommandError("No captures match.")
+
+        self._print_routes(captures)
+
+        report = io.StringIO()
+        stats = pstats.Stats(str(captures[0][0]), stream=report)
+        for stats_path, _ in captures[1:]:
+            stats.add(str(stats_path))
+        if options["output"]:
+            stats.dump_stats(options["output"])
+        # pstats would otherwise print every capture's path ahead of the table.
+        stats.files = []
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["top"])
+        self.stdout.write(report.getvalue(), ending="")
+
+    def _print_routes(self, captures):
+        durations = defaultdict(list)
+        for _, metadata in captures:
+            durations[(metadata["method"], metadata["route"])].append(metadata["duration_ms"])
+        self.stdout.write(f"{len(captures)} captures\n")
+        self.stdout.write(f"{'captures':>8} {'mean ms':>9} {'max ms':>9}  route")
+        for (method, route), values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            self.stdout.write(f"{len(values):>8} {sum(values) / len(values):>9.1f} {max(values):>9.1f}  {method} {route}")
+        self.stdout.write("")
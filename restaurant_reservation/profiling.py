@@ -0,0 +1,122 @@
+"""
+Opt-in request profiling for production.
+
+A sampled fraction of requests to the configured routes (PROFILE_SAMPLE_RATE,
+PROFILE_ROUTES), or any request carrying `X-Profile: <PROFILE_TOKEN>`, runs
+under cProfile. Each capture is written to PROFILE_DIR as a .pstats file with
+a .json file of route and timing metadata next to it; the profile_summary
+command merges them into the hottest functions.
+"""
+
+import cProfile
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+from .instrumentation import route_label
+
+
+logger = logging.getLogger(__name__)
+
+# Held while a request is being profiled. cProfile hooks are process-wide on
+# newer Pythons and would mix concurrent requests' calls into one capture.
+profiling_lock = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles sampled requests and writes one capture per request. Costs a
+    random draw per request unless profiling is requested. One request is
+    profiled at a time; others that would be are served unprofiled. Async
+    requests pass through: cProfile follows a thread, and an event loop
+    thread interleaves many requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        if not profiling_lock.acquire(blocking=False):
+            # Another request is being profiled.
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # A profiler started outside this middleware is active.
+            profiling_lock.release()
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            profiling_lock.release()
+        seconds = time.perf_counter() - started
+
+        try:
+            capture = self.save(profiler, request, response, seconds, trigger)
+        except OSError as e:
+            logger.error(f"Could not write profile for {request.method} {request.path}: {e}")
+            return response
+        if trigger == 'header':
+            response['X-Profile-Capture'] = capture
+        return response
+
+    def trigger(self, request):
+        """
+        Why this request should be profiled ('header' or 'sample'), or None.
+        """
+        token = settings.PROFILE_TOKEN
+        if token and request.headers.get('X-Profile') == token:
+            return 'header'
+        if settings.PROFILE_SAMPLE_RATE <= 0 or random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return None
+        if not settings.PROFILE_ROUTES:
+            return 'sample'
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.view_name in settings.PROFILE_ROUTES or route_label(match) in settings.PROFILE_ROUTES:
+            return 'sample'
+        return None
+
+    def save(self, profiler, request, response, seconds, trigger):
+        match = request.resolver_match
+        view_name = match.view_name if match and match.view_name else 'unnamed'
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        capture = f"{time.strftime('%Y%m%dT%H%M%S')}-{view_name}-{uuid.uuid4().hex[:8]}"
+
+        profiler.dump_stats(directory / f'{capture}.pstats')
+        (directory / f'{capture}.json').write_text(json.dumps({
+            'route': route_label(match),
+            'view_name': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(seconds * 1000, 3),
+            'trigger': trigger,
+            'captured_at': timezone.now().isoformat(),
+        }))
+        return capture
@@ -45,12 +45,16 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "rest_framework",
+    "restaurant_reservation",
     "restaurants",
     "reservations",
     "users",
 ]
 
 MIDDLEWARE = [
+    "restaurant_reservation.instrumentation.QueryTimingMiddleware",
+    "restaurant_reservation.profiling.ProfilingMiddleware",
+    "restaurant_reservation.db_router.PrimaryStickinessMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -62,7 +66,7 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
     )
 }
 
@@ -74,20 +78,83 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=4),
     "ROTATE_REFRESH_TOKENS": False,
-    "UPDATE_LAST_LOGIN": True,
+    "UPDATE_LAST_LOGIN": False,
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "AUTH_HEADER_TYPES": ("Bearer",),
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION",
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.CustomTokenObtainPairSerializer",
     "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
+    "TOKEN_USER_CLASS": "users.authentication.ClaimsUser",
   
   
 }
 
+# Reservation allocation: bookings for one restaurant are serialized with a
+# Postgres advisory lock and transient failures are retried a bounded number of times.
+# Turning the lock off leaves races to the exclusion constraint, except for bookings
+# near a month boundary, which the per-month partitions' constraints cannot see.
+RESERVATION_ADVISORY_LOCKS = os.getenv('RESERVATION_ADVISORY_LOCKS', 'True') == 'True'
+RESERVATION_LOCK_TIMEOUT_MS = int(os.getenv('RESERVATION_LOCK_TIMEOUT_MS', '5000'))
+RESERVATION_MAX_RETRIES = int(os.getenv('RESERVATION_MAX_RETRIES', '3'))
+
+# Threads available to the async views for sync-only work (transactions, serializers).
+ASYNC_SYNC_WORKERS = int(os.getenv('ASYNC_SYNC_WORKERS', '16'))
+
+# Cache: Redis in production (REDIS_URL), a per-process memory cache otherwise.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a serialized restaurant payload is kept; writes invalidate it earlier.
+RESTAURANT_CACHE_TIMEOUT = int(os.getenv('RESTAURANT_CACHE_TIMEOUT', '3600'))
+
+# Rows fetched per round trip from the server-side cursor behind reservation exports.
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# Monthly reservation partitions created ahead of the current month by every
+# migrate and by create_reservation_partitions.
+RESERVATION_PARTITION_MONTHS_AHEAD = int(os.getenv('RESERVATION_PARTITION_MONTHS_AHEAD', '12'))
+
+# Seconds a user's cached auth state (active, role, staff) may vouch for their
+# tokens; user writes drop it immediately.
+AUTH_STATE_CACHE_TIMEOUT = int(os.getenv('AUTH_STATE_CACHE_TIMEOUT', '60'))
+
+# Processes hashing passwords for the bulk user import API; defaults to one per CPU.
+USER_IMPORT_HASH_WORKERS = int(os.getenv('USER_IMPORT_HASH_WORKERS', '0')) or None
+
+# Seconds between batched last_login writes; 0 writes each login immediately.
+LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv('LAST_LOGIN_FLUSH_INTERVAL', '10'))
+
+# Instrumentation: requests whose slowest statement, or whose lock waits in
+# total, take at least this long log it. /metrics only answers clients whose
+# address is in METRICS_ALLOWED_IPS (comma-separated, loopback by default) or
+# that send METRICS_TOKEN as a bearer token.
+SLOW_QUERY_LOG_MS = int(os.getenv('SLOW_QUERY_LOG_MS', '200'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [address for address in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if address]
+
+# Profiling: PROFILE_SAMPLE_RATE of the requests to PROFILE_ROUTES (URL names or
+# routes, comma-separated; all routes when empty) and any request sending
+# `X-Profile: <PROFILE_TOKEN>` run under cProfile, captured into PROFILE_DIR.
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_ROUTES = [route for route in os.getenv('PROFILE_ROUTES', '').split(',') if route]
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
 
 ROOT_URLCONF = "restaurant_reservation.urls"
 
@@ -124,6 +191,26 @@ DATABASES = {
     }
 }
 
+# Read replicas: DB_REPLICA_HOSTS lists streaming replicas of the primary as
+# comma-separated "host" or "host:port", sharing its name and credentials. Safe
+# reads go to a replica lagging at most REPLICA_MAX_LAG_SECONDS (measured every
+# REPLICA_LAG_CHECK_INTERVAL seconds), and a client's reads stay on the primary
+# for REPLICA_STICKY_SECONDS after it writes. Tests run replicas as mirrors of default.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['restaurant_reservation.db_router.PrimaryReplicaRouter']
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', '2'))
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
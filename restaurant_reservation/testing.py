@@ -0,0 +1,14 @@
+"""
+Test case bases shared by the apps' test suites.
+"""
+
+from django.test import TransactionTestCase
+
+
+class ReplicaTransactionTestCase(TransactionTestCase):
+    """
+    TransactionTestCase that may touch every configured database, since reads
+    outside transactions can go to the replicas configured through DB_REPLICA_HOSTS.
+    """
+
+    databases = '__all__'
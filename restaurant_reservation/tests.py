@@ -0,0 +1,72 @@
+import io
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+
+from users.models import User
+from .profiling import ProfilingMiddleware
+
+
+class RequestProfilingTest(TestCase):
+    """
+    Profiled requests leave a capture behind and profile_summary merges them.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_sampled_routes_are_captured_and_summarized(self):
+        with self.settings(PROFILE_DIR=self.directory.name, PROFILE_SAMPLE_RATE=1.0, PROFILE_ROUTES=['reservation-list']):
+            self.client.get('/api/reservations/')
+            self.client.get('/api/reservations/')
+            self.client.get('/api/restaurants/')
+
+        metadata = [json.loads(path.read_text()) for path in Path(self.directory.name).glob('*.json')]
+        self.assertEqual([entry['view_name'] for entry in metadata], ['reservation-list'] * 2)
+
+        output = io.StringIO()
+        call_command('profile_summary', dir=self.directory.name, top=5, stdout=output)
+        self.assertIn('2 captures', output.getvalue())
+        self.assertIn('GET api/reservations/', output.getvalue())
+        self.assertIn('function calls', output.getvalue())
+
+    def test_header_requires_the_token(self):
+        with self.settings(PROFILE_DIR=self.directory.name, PROFILE_TOKEN='profile-token'):
+            self.assertNotIn('X-Profile-Capture', self.client.get('/api/reservations/', HTTP_X_PROFILE='guess'))
+            response = self.client.get('/api/reservations/', HTTP_X_PROFILE='profile-token')
+        self.assertTrue((Path(self.directory.name) / f"{response['X-Profile-Capture']}.pstats").exists())
+
+    def test_concurrent_requests_are_profiled_one_at_a_time(self):
+        first_inside, second_done = threading.Event(), threading.Event()
+
+        def get_response(request):
+            if request.path == '/first/':
+                first_inside.set()
+                second_done.wait(timeout=5)
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(get_response)
+        factory = RequestFactory()
+        with self.settings(PROFILE_DIR=self.directory.name, PROFILE_SAMPLE_RATE=1.0, PROFILE_ROUTES=[]):
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                first = pool.submit(middleware, factory.get('/first/'))
+                self.assertTrue(first_inside.wait(timeout=5))
+                # Arrives while the first request is still being profiled, and is served unprofiled.
+                self.assertEqual(middleware(factory.get('/second/')).status_code, 200)
+                second_done.set()
+                self.assertEqual(first.result().status_code, 200)
+            middleware(factory.get('/third/'))
+
+        metadata = [json.loads(path.read_text()) for path in Path(self.directory.name).glob('*.json')]
+        self.assertEqual(sorted(entry['path'] for entry in metadata), ['/first/', '/third/'])
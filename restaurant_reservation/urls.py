@@ -19,9 +19,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .instrumentation import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("restaurants.urls")),
     path('api/reservations/', include('reservations.urls')),
     path('api/users/', include('users.urls')),
+    path("metrics", metrics_view, name="metrics"),
 ]
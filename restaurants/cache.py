@@ -0,0 +1,82 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from restaurant_reservation.db_router import read_from_primary
+
+from .metrics import cache_metrics
+
+
+class RestaurantCache:
+    """
+    Read-through cache of serialized restaurant payloads.
+
+    Every key embeds a per-restaurant version number. Writes bump the version,
+    so payloads cached under the old one are never read again and simply age
+    out of the backend; nothing has to be found and deleted.
+    """
+
+    @staticmethod
+    def _version_key(restaurant_id):
+        return f'restaurant:{restaurant_id}:version'
+
+    @staticmethod
+    def _payload_key(restaurant_id, version, section):
+        return f'restaurant:{restaurant_id}:v{version}:{section}'
+
+    @staticmethod
+    def get_versions(restaurant_ids):
+        """
+        Current version of each restaurant, as {id: version}, in one round trip when all are set.
+        """
+        keys = {RestaurantCache._version_key(restaurant_id): restaurant_id for restaurant_id in restaurant_ids}
+        versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+        for key, restaurant_id in keys.items():
+            if restaurant_id not in versions:
+                # Start from the clock rather than 1, so an evicted version key
+                # can never point back at payloads cached under an older version.
+                cache.add(key, time.time_ns(), timeout=None)
+                versions[restaurant_id] = cache.get(key)
+        return versions
+
+    @staticmethod
+    def get_many(restaurant_ids, section, build):
+        """
+        Payloads of one section (e.g. 'detail', 'tables') for many restaurants, as {id: payload}.
+        Misses are built together with `build(missing_ids)`, which returns {id: payload}, and stored.
+        """
+        versions = RestaurantCache.get_versions(restaurant_ids)
+        keys = {RestaurantCache._payload_key(restaurant_id, version, section): restaurant_id for restaurant_id, version in versions.items()}
+        payloads = {keys[key]: payload for key, payload in cache.get_many(keys).items()}
+
+        missing = [restaurant_id for restaurant_id in restaurant_ids if restaurant_id not in payloads]
+        cache_metrics.record(hits=len(payloads), misses=len(missing))
+        if missing:
+            # Built from the primary: a lagging replica would store the rows from before
+            # the write that bumped the version, under the new version.
+            with read_from_primary():
+                built = build(missing)
+            cache.set_many(
+                {RestaurantCache._payload_key(restaurant_id, versions[restaurant_id], section): payload for restaurant_id, payload in built.items()},
+                timeout=settings.RESTAURANT_CACHE_TIMEOUT,
+            )
+            payloads.update(built)
+        return payloads
+
+    @staticmethod
+    def invalidate(restaurant_id):
+        """
+        Bump the restaurant's version once the current transaction commits, so a
+        concurrent read cannot cache the old rows under the new version.
+        """
+        transaction.on_commit(lambda: RestaurantCache._bump(restaurant_id))
+
+    @staticmethod
+    def _bump(restaurant_id):
+        try:
+            cache.incr(RestaurantCache._version_key(restaurant_id))
+        except ValueError:
+            # No version yet means nothing is cached for the restaurant.
+            pass
@@ -0,0 +1,35 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from restaurant_reservation.importing import ImportCommand
+from restaurants.repository import RestaurantRepository
+
+
+class Command(ImportCommand):
+    help = (
+        "Import a restaurant chain from an NDJSON file, one restaurant per line with its "
+        "opening_hours and tables nested, creating each batch in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File with one restaurant per line (.ndjson/.jsonl)")
+        parser.add_argument("--owner", required=True, help="Username of the owner the restaurants are created for")
+        parser.add_argument("--batch-size", type=int, default=500, help="Restaurants validated and written per transaction")
+
+    def handle(self, *args, **options):
+        owner = get_user_model().objects.filter(username=options["owner"]).first()
+        if not owner:
+            raise CommandError(f"User {options['owner']} does not exist.")
+        if owner.role != "OWNER":
+            raise CommandError(f"User {options['owner']} is not a restaurant owner.")
+
+        started = time.perf_counter()
+        created, failed = self.import_rows(
+            options["path"], "ndjson", options["batch_size"],
+            lambda batch: RestaurantRepository.import_restaurants(batch, owner.id),
+        )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} restaurants, {failed} failed, in {elapsed:.2f}s"))
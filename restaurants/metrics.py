@@ -0,0 +1,33 @@
+import threading
+
+
+class CacheMetrics:
+    """
+    Process-wide hit and miss counters of the restaurant payload cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+    def record(self, hits=0, misses=0):
+        with self._lock:
+            self._hits += hits
+            self._misses += misses
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else None,
+            }
+
+
+cache_metrics = CacheMetrics()
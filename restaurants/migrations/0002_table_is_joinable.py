@@ -0,0 +1,21 @@
+# Generated by Django 5.0.12 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurants", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="table",
+            name="is_joinable",
+            field=models.BooleanField(
+                default=False,
+                help_text="Can be pushed together with other joinable tables for large parties",
+            ),
+        ),
+    ]
@@ -41,6 +41,7 @@ class Table(models.Model):
         capacity = models.PositiveIntegerField()
         is_outdoor = models.BooleanField(default=False)
         is_available = models.BooleanField(default=True)
+        is_joinable = models.BooleanField(default=False, help_text="Can be pushed together with other joinable tables for large parties")
         
         def __str__(self):
             return f"Table {self.table_number} ({self.capacity} seats) at {self.restaurant.name}"
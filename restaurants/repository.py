@@ -1,45 +1,188 @@
 from .models import Restaurant, OpeningHour, Table
+from .cache import RestaurantCache
+from .serializers import RestaurantSerializer
+from reservations.models import Reservation
+from datetime import timedelta
 from django.db import transaction
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+
+# Columns rendered by the serializers; querysets feeding them load nothing else.
+RESTAURANT_FIELDS = ('id', 'name', 'address', 'phone_number', 'owner_id', 'created_at')
+OPENING_HOUR_FIELDS = ('id', 'restaurant_id', 'day', 'open_time', 'close_time', 'is_closed')
+TABLE_FIELDS = ('id', 'restaurant_id', 'table_number', 'capacity', 'is_outdoor', 'is_available', 'is_joinable')
+
+# Nested rows written through a restaurant: the related name, the model, its
+# writable fields and the ones a new row must provide.
+NESTED_ROWS = (
+    ('opening_hours', OpeningHour, ('day', 'open_time', 'close_time', 'is_closed'), ('day', 'open_time', 'close_time')),
+    ('tables', Table, ('table_number', 'capacity', 'is_outdoor', 'is_available', 'is_joinable'), ('table_number', 'capacity')),
+)
+
 
 class RestaurantRepository:
 
     @staticmethod
     def get_all_restaurants():
-        return Restaurant.objects.select_related('owner')
+        # Nested opening hours and tables come in one query each, whatever the number of restaurants.
+        return Restaurant.objects.only(*RESTAURANT_FIELDS).prefetch_related(
+            Prefetch('opening_hours', queryset=OpeningHour.objects.only(*OPENING_HOUR_FIELDS).order_by('id')),
+            Prefetch('tables', queryset=Table.objects.only(*TABLE_FIELDS).order_by('id')),
+        )
+
+    @staticmethod
+    def get_all_opening_hours():
+        # The restaurant name is joined in so __str__ does not load each restaurant.
+        return OpeningHour.objects.select_related('restaurant').only(*OPENING_HOUR_FIELDS, 'restaurant__name')
+
+    @staticmethod
+    def get_all_tables():
+        return Table.objects.select_related('restaurant').only(*TABLE_FIELDS, 'restaurant__name')
 
     @staticmethod
     def get_restaurant_by_id(restaurant_id):
         return Restaurant.objects.filter(id=restaurant_id).select_related('owner').first()
 
+    @staticmethod
+    def get_restaurant_ids_for_owner(owner):
+        return list(Restaurant.objects.filter(owner_id=owner.id).order_by('id').values_list('id', flat=True))
+
+    @staticmethod
+    def get_restaurants_with_details(restaurant_ids):
+        return RestaurantRepository.get_all_restaurants().filter(id__in=restaurant_ids)
+
+    @staticmethod
+    def get_opening_hours_for_restaurants(restaurant_ids):
+        return RestaurantRepository.get_all_opening_hours().filter(restaurant_id__in=restaurant_ids).order_by('restaurant_id', 'id')
+
+    @staticmethod
+    def get_tables_for_restaurants(restaurant_ids):
+        return RestaurantRepository.get_all_tables().filter(restaurant_id__in=restaurant_ids).order_by('restaurant_id', 'id')
+
     @staticmethod
     def create_restaurant(serializer, user):
-        validate_data = serializer.validated_data
-        opening_hours_data = validate_data.pop('opening_hours', [])
-        tables_data = validate_data.pop('tables', [])
-        restaurant = Restaurant.objects.create(owner=user, **validate_data)
-        
-        for hour_data in opening_hours_data:
-            OpeningHour.objects.create(restaurant=restaurant, **hour_data)
-            
-        for table_data in tables_data:
-            Table.objects.create(restaurant=restaurant, **table_data)
-        return restaurant
+        return RestaurantRepository.create_restaurants([serializer.validated_data], user.id)[0]
+
+    @staticmethod
+    def create_restaurants(rows, owner_id):
+        """
+        Create restaurants from validated rows, with their nested opening hours and tables,
+        in one transaction: one INSERT per table of rows, however many restaurants.
+        """
+        with transaction.atomic():
+            restaurants = Restaurant.objects.bulk_create([
+                Restaurant(owner_id=owner_id, **{field: value for field, value in row.items() if field not in ('opening_hours', 'tables')})
+                for row in rows
+            ])
+            for related_name, model, fields, _ in NESTED_ROWS:
+                model.objects.bulk_create([
+                    model(restaurant_id=restaurant.id, **{field: child[field] for field in fields if field in child})
+                    for restaurant, row in zip(restaurants, rows)
+                    for child in row.get(related_name, [])
+                ])
+            return restaurants
+
+    @staticmethod
+    def import_restaurants(rows, owner_id):
+        """
+        Validate raw restaurant rows (nested opening hours and tables included) and create the valid ones in bulk.
+        Returns one result per row: created with its id, or failed with the reason.
+        """
+        results = [None] * len(rows)
+        valid_positions = []
+        valid_rows = []
+        for position, row in enumerate(rows):
+            serializer = RestaurantSerializer(data=row)
+            if serializer.is_valid():
+                valid_rows.append(serializer.validated_data)
+                valid_positions.append(position)
+            else:
+                results[position] = {"row": position, "status": "failed", "errors": serializer.errors}
+
+        restaurants = RestaurantRepository.create_restaurants(valid_rows, owner_id) if valid_rows else []
+        for position, restaurant in zip(valid_positions, restaurants):
+            results[position] = {"row": position, "status": "created", "id": restaurant.id}
+        return results
 
     @staticmethod
     def update_restaurant(restaurant_id, owner, data):
+        restaurant = get_object_or_404(RestaurantRepository.get_all_restaurants(), id=restaurant_id, owner_id=owner.id)
+        return RestaurantRepository.apply_restaurant_update(restaurant, data)
+
+    @staticmethod
+    def apply_restaurant_update(restaurant, data):
+        """
+        Write `data` to the restaurant. A nested `opening_hours` or `tables` list is
+        the full new set: rows with an id update that row, rows without one are
+        added and rows left out are deleted, with at most one bulk_update,
+        bulk_create and delete per list. Returns the restaurant as stored.
+        """
         with transaction.atomic():
-            restaurant = get_object_or_404(Restaurant, id=restaurant_id, owner=owner)
             editable_fields = {f.name for f in Restaurant._meta.fields if f.name not in ['id', 'owner', 'created_at']}
             for field, value in data.items():
                 if field in editable_fields:
                     setattr(restaurant, field, value)
             restaurant.save()
+
+            nested = [entry for entry in NESTED_ROWS if entry[0] in data]
+            for related_name, model, fields, required in nested:
+                RestaurantRepository._sync_nested_rows(restaurant, related_name, model, fields, required, data[related_name])
+            RestaurantCache.invalidate(restaurant.id)
+            if nested:
+                # The prefetched rows are stale now.
+                restaurant = RestaurantRepository.get_all_restaurants().get(id=restaurant.id)
             return restaurant
 
+    @staticmethod
+    def _sync_nested_rows(restaurant, related_name, model, fields, required, rows):
+        existing = {child.id: child for child in getattr(restaurant, related_name).all()}
+        unknown = sorted({row['id'] for row in rows if row.get('id') is not None} - existing.keys())
+        if unknown:
+            raise ValidationError({related_name: [f"Unknown ids for this restaurant: {unknown}."]})
+
+        changed, changed_fields, added, kept = [], set(), [], set()
+        for row in rows:
+            if row.get('id') is None:
+                missing = [field for field in required if field not in row]
+                if missing:
+                    raise ValidationError({related_name: [f"New rows need {', '.join(missing)}."]})
+                added.append(model(restaurant_id=restaurant.id, **{field: row[field] for field in fields if field in row}))
+                continue
+            child = existing[row['id']]
+            kept.add(child.id)
+            updates = {field: row[field] for field in fields if field in row and getattr(child, field) != row[field]}
+            if updates:
+                for field, value in updates.items():
+                    setattr(child, field, value)
+                changed.append(child)
+                changed_fields.update(updates)
+
+        removed = existing.keys() - kept
+        if removed:
+            now = timezone.now()
+            if model is Table and Table.objects.filter(
+                id__in=removed, reservations__canceled=False, reservations__end_time__gt=now,
+                # Implied by end_time; keeps the lookup to recent partitions.
+                reservations__reservation_time__gt=now - timedelta(minutes=Reservation.MAX_DURATION),
+            ).exists():
+                raise ValidationError({related_name: ["Tables with upcoming reservations cannot be removed."]})
+            model.objects.filter(id__in=removed).delete()
+        if changed:
+            model.objects.bulk_update(changed, sorted(changed_fields))
+        if added:
+            model.objects.bulk_create(added)
+
     @staticmethod
     def delete_restaurant(instance):
-        instance.delete()
+        # Invalidated after the delete, inside its transaction, so the version is bumped
+        # once the rows are gone and no reader can cache them under the new version.
+        with transaction.atomic():
+            restaurant_id = instance.id
+            instance.delete()
+            RestaurantCache.invalidate(restaurant_id)
         return True
 
     @staticmethod
@@ -48,10 +191,11 @@ class RestaurantRepository:
             restaurant = get_object_or_404(
                 Restaurant,
                 id=restaurant_id,
-                owner=owner
+                owner_id=owner.id
             )
             new_opening_hour = OpeningHour(restaurant=restaurant, **data)
             new_opening_hour.save()
+            RestaurantCache.invalidate(restaurant.id)
             return new_opening_hour
 
     @staticmethod
@@ -60,7 +204,7 @@ class RestaurantRepository:
             opening_hour = get_object_or_404(
                 OpeningHour,
                 id=opening_hour_id,
-                restaurant__owner=owner
+                restaurant__owner_id=owner.id
             )
             editable_fields = {
                 f.name for f in OpeningHour._meta.fields
@@ -70,19 +214,23 @@ class RestaurantRepository:
                 if field in editable_fields:
                     setattr(opening_hour, field, value)
             opening_hour.save()
+            RestaurantCache.invalidate(opening_hour.restaurant_id)
             return opening_hour
 
     @staticmethod
     def delete_opening_hour(instance):
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            RestaurantCache.invalidate(instance.restaurant_id)
         return True
 
     @staticmethod
     def create_table(restaurant_id, owner, data):
         with transaction.atomic():
-            restaurant = get_object_or_404(Restaurant, id=restaurant_id, owner=owner)
+            restaurant = get_object_or_404(Restaurant, id=restaurant_id, owner_id=owner.id)
             new_table = Table(restaurant=restaurant, **data)
             new_table.save()
+            RestaurantCache.invalidate(restaurant.id)
             return new_table
 
     @staticmethod
@@ -91,7 +239,7 @@ class RestaurantRepository:
             table = get_object_or_404(
                 Table,
                 id=table_id,
-                restaurant__owner=owner
+                restaurant__owner_id=owner.id
             )
             editable_fields = {
                 f.name for f in Table._meta.fields
@@ -101,9 +249,12 @@ class RestaurantRepository:
                 if field in editable_fields:
                     setattr(table, field, value)
             table.save()
+            RestaurantCache.invalidate(table.restaurant_id)
             return table
 
     @staticmethod
     def delete_table(instance):
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            RestaurantCache.invalidate(instance.restaurant_id)
         return True
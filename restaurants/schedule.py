@@ -0,0 +1,119 @@
+from bisect import bisect_right
+
+from django.utils import timezone
+
+from .cache import RestaurantCache
+from .models import OpeningHour
+
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Minute of the week at which each OpeningHour.day starts, Monday 00:00 being 0.
+DAY_OFFSETS = {code: position * MINUTES_PER_DAY for position, (code, _) in enumerate(OpeningHour.DAYS)}
+
+
+def minutes(moment):
+    return moment.hour * 60 + moment.minute + moment.second / 60
+
+
+class WeeklySchedule:
+    """
+    A restaurant's opening hours compiled to sorted, merged minute-of-week
+    intervals, so checking a booking against them is one binary search.
+
+    The week is laid out three times in a row (previous, current, next) before
+    merging, so spans past Sunday midnight and bookings that cross it need no
+    special casing.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = intervals
+        self._starts = [start for start, _ in intervals]
+        self._ends = [end for _, end in intervals]
+
+    @classmethod
+    def compile(cls, opening_hours):
+        """
+        Build the schedule from (day, open_time, close_time, is_closed) rows.
+        A close time at or before the open time means the span runs past midnight.
+        A restaurant without any opening hours is treated as always open.
+        """
+        opening_hours = list(opening_hours)
+        if not opening_hours:
+            return cls([(-MINUTES_PER_WEEK, 2 * MINUTES_PER_WEEK)])
+
+        spans = []
+        for day, open_time, close_time, is_closed in opening_hours:
+            if is_closed:
+                continue
+            start = DAY_OFFSETS[day] + minutes(open_time)
+            end = DAY_OFFSETS[day] + minutes(close_time)
+            if end <= start:
+                end += MINUTES_PER_DAY
+            for shift in (-MINUTES_PER_WEEK, 0, MINUTES_PER_WEEK):
+                spans.append((start + shift, end + shift))
+
+        merged = []
+        for start, end in sorted(spans):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return cls(merged)
+
+    def admits(self, start, duration):
+        """
+        Return True if the restaurant is open for the whole of [start, start + duration minutes).
+        """
+        local = timezone.localtime(start) if timezone.is_aware(start) else start
+        first = DAY_OFFSETS[OpeningHour.DAYS[local.weekday()][0]] + minutes(local)
+        position = bisect_right(self._starts, first) - 1
+        return position >= 0 and self._ends[position] >= first + duration
+
+    def open_minutes(self, day):
+        """
+        Minutes the restaurant is open on the calendar date `day`.
+        """
+        day_start = DAY_OFFSETS[OpeningHour.DAYS[day.weekday()][0]]
+        day_end = day_start + MINUTES_PER_DAY
+        return sum(max(0, min(end, day_end) - max(start, day_start)) for start, end in self.intervals)
+
+
+class ScheduleCache:
+    """
+    Compiled weekly schedules, kept in process and in the shared cache.
+
+    Entries are tied to the restaurant's cache version, which every opening
+    hour write bumps, so a lookup costs one shared-cache round trip for the
+    version and no database access once the schedule has been compiled.
+    """
+    MAX_ENTRIES = 10000
+
+    _compiled = {}
+
+    @staticmethod
+    def get(restaurant_id):
+        """
+        The restaurant's WeeklySchedule, compiled from OpeningHour rows on a miss.
+        """
+        version = RestaurantCache.get_versions([restaurant_id])[restaurant_id]
+        cached = ScheduleCache._compiled.get(restaurant_id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        intervals = RestaurantCache.get_many([restaurant_id], 'schedule', ScheduleCache._build)[restaurant_id]
+        schedule = WeeklySchedule(intervals)
+        if len(ScheduleCache._compiled) >= ScheduleCache.MAX_ENTRIES:
+            ScheduleCache._compiled.clear()
+        ScheduleCache._compiled[restaurant_id] = (version, schedule)
+        return schedule
+
+    @staticmethod
+    def _build(restaurant_ids):
+        rows = {restaurant_id: [] for restaurant_id in restaurant_ids}
+        for restaurant_id, *hours in OpeningHour.objects.filter(restaurant_id__in=restaurant_ids).values_list(
+            'restaurant_id', 'day', 'open_time', 'close_time', 'is_closed'
+        ):
+            rows[restaurant_id].append(hours)
+        return {restaurant_id: WeeklySchedule.compile(hours).intervals for restaurant_id, hours in rows.items()}
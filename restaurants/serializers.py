@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from datetime import timedelta
 from .models import Restaurant, OpeningHour, Table
 
 
@@ -8,7 +9,7 @@ class TableSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Table
-        fields = ['id', 'table_number', 'capacity', 'is_outdoor', 'is_available', 'restaurant']
+        fields = ['id', 'table_number', 'capacity', 'is_outdoor', 'is_available', 'is_joinable', 'restaurant']
         read_only_fields = ['id'] 
 
 class OpeningHourSerializer(serializers.ModelSerializer):
@@ -22,16 +23,26 @@ class OpeningHourSerializer(serializers.ModelSerializer):
         read_only_fields = ['id'] # 'id' is read-only, 'restaurant' is now writable
     
     def validate(self, data):
-        if data['open_time'] >= data['close_time']:
-            raise serializers.ValidationError("Open time must be before close time.")
+        # A close time before the open time is an overnight span ending the next day.
+        if 'open_time' in data and data.get('open_time') == data.get('close_time'):
+            raise serializers.ValidationError("Open time and close time must differ.")
         return data
 
 
 
+class NestedOpeningHourSerializer(OpeningHourSerializer):
+    # Writable so a restaurant update can address existing rows; rows without one are new.
+    id = serializers.IntegerField(required=False)
+
+
+class NestedTableSerializer(TableSerializer):
+    id = serializers.IntegerField(required=False)
+
+
 class RestaurantSerializer(serializers.ModelSerializer):
    
-    opening_hours = OpeningHourSerializer(many=True, required=False) 
-    tables = TableSerializer(many=True, required=False)
+    opening_hours = NestedOpeningHourSerializer(many=True, required=False)
+    tables = NestedTableSerializer(many=True, required=False)
 
     class Meta:
         model = Restaurant
@@ -39,27 +50,37 @@ class RestaurantSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'owner', 'created_at']
         
     def create(self, validated_data):
-      
-        opening_hours_data = validated_data.pop('opening_hours', [])
-        tables_data = validated_data.pop('tables', [])
-        restaurant = Restaurant.objects.create(**validated_data)
-        
-        for hour_data in opening_hours_data:
-            OpeningHour.objects.create(restaurant=restaurant, **hour_data)
-            
-        for table_data in tables_data:
-            Table.objects.create(restaurant=restaurant, **table_data)
-            
-        return restaurant 
+        # The repository imports this module, hence the late import.
+        from .repository import RestaurantRepository
+
+        owner = validated_data.pop('owner')
+        return RestaurantRepository.create_restaurants([validated_data], owner.id)[0]
         
     def update(self, instance, validated_data):
-    
-        validated_data.pop('opening_hours', None) 
-        validated_data.pop('tables', None)
-        
-        # Update simple fields of the main Restaurant instance
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-                
-        return instance
+        from .repository import RestaurantRepository
+
+        return RestaurantRepository.apply_restaurant_update(instance, validated_data)
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    party_size = serializers.IntegerField(min_value=1)
+    duration = serializers.IntegerField(min_value=1, max_value=24 * 60, default=90, help_text="Duration in minutes")
+
+
+class BatchAvailabilityQuerySerializer(serializers.Serializer):
+    MAX_RESTAURANTS = 200
+    MAX_WINDOW = timedelta(days=7)
+
+    restaurant_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=MAX_RESTAURANTS)
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    party_size = serializers.IntegerField(min_value=1)
+    duration = serializers.IntegerField(min_value=1, max_value=24 * 60, default=90, help_text="Duration in minutes")
+
+    def validate(self, data):
+        if data['start'] >= data['end']:
+            raise serializers.ValidationError("Start must be before end.")
+        if data['end'] - data['start'] > self.MAX_WINDOW:
+            raise serializers.ValidationError("The time window can span at most 7 days.")
+        return data
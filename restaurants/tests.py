@@ -1,3 +1,599 @@
-from django.test import TestCase
+import io
+import json
+import re
+import tempfile
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from restaurant_reservation.db_router import STICKY_COOKIE, replica_monitor
+from restaurant_reservation.instrumentation import route_metrics
+from restaurant_reservation.testing import ReplicaTransactionTestCase
+
+from reservations.models import Reservation
+from users.models import User
+from .cache import RestaurantCache
+from .metrics import cache_metrics
+from .models import Restaurant, OpeningHour, Table
+from .repository import RestaurantRepository
+from .schedule import ScheduleCache, WeeklySchedule
+from .views import build_opening_hour_payloads, build_table_payloads
+
+
+class RestaurantPayloadCacheTest(TestCase):
+    """
+    Reads are served from the payload cache and every write through the API
+    makes the next read see the change.
+    """
+
+    def setUp(self):
+        cache.clear()
+        cache_metrics.reset()
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        self.restaurant = Restaurant.objects.create(name='Cached Bistro', address='1 Main St', owner=self.owner)
+        self.table = Table.objects.create(restaurant=self.restaurant, table_number='1', capacity=4)
+        OpeningHour.objects.create(restaurant=self.restaurant, day='mon', open_time='12:00', close_time='22:00')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/restaurants/{self.restaurant.id}/'
+
+    def test_repeated_reads_hit_the_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(cache_metrics.snapshot(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_table_update_invalidates_restaurant_payload(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/tables/{self.table.id}/', {'capacity': 6}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client.get(self.url).json()['tables'][0]['capacity'], 6)
+        self.assertEqual(self.client.get('/api/tables/').json()[0]['capacity'], 6)
+
+    def test_opening_hour_delete_invalidates_restaurant_payload(self):
+        opening_hour = self.restaurant.opening_hours.get()
+        self.assertEqual(len(self.client.get('/api/opening-hours/').json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/opening-hours/{opening_hour.id}/')
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.client.get(self.url).json()['opening_hours'], [])
+        self.assertEqual(self.client.get('/api/opening-hours/').json(), [])
+
+    def test_table_and_opening_hour_retrieves_hit_the_cache(self):
+        opening_hour = self.restaurant.opening_hours.get()
+        table_url = f'/api/tables/{self.table.id}/'
+        opening_hour_url = f'/api/opening-hours/{opening_hour.id}/'
+        self.client.get(table_url)
+        self.client.get(opening_hour_url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(table_url).json()['capacity'], 4)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(opening_hour_url).json()['day'], 'mon')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(table_url, {'capacity': 6}, format='json')
+        self.assertEqual(self.client.get(table_url).json()['capacity'], 6)
+
+
+class RestaurantDeleteInvalidationTest(ReplicaTransactionTestCase):
+    """
+    Deletes bump the cache version only once the rows are gone: a reader
+    racing the bump can never cache the deleted rows under the new version.
+    Runs in autocommit, as requests do, so on_commit hooks fire for real.
+    """
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        self.restaurant = Restaurant.objects.create(name='Fleeting Bistro', address='1 Main St', owner=self.owner)
+        self.tables = Table.objects.bulk_create(Table(restaurant=self.restaurant, table_number=str(i), capacity=4) for i in range(2))
+        self.hours = [
+            OpeningHour.objects.create(restaurant=self.restaurant, day=day, open_time='12:00', close_time='22:00')
+            for day in ('mon', 'tue')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        # 2025-05-27 is a Tuesday.
+        self.tuesday_lunch = datetime(2025, 5, 27, 13, 0, tzinfo=dt_timezone.utc)
+
+    def _read(self):
+        return (
+            RestaurantCache.get_many([self.restaurant.id], 'tables', build_table_payloads)[self.restaurant.id],
+            RestaurantCache.get_many([self.restaurant.id], 'opening_hours', build_opening_hour_payloads)[self.restaurant.id],
+            ScheduleCache.get(self.restaurant.id),
+        )
+
+    def _delete_racing_a_reader(self, url):
+        self._read()
+        bump = RestaurantCache._bump
+
+        def bump_then_read(restaurant_id):
+            bump(restaurant_id)
+            self._read()
+
+        with mock.patch.object(RestaurantCache, '_bump', staticmethod(bump_then_read)):
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        return self._read()
+
+    def test_table_delete(self):
+        tables, _, _ = self._delete_racing_a_reader(f'/api/tables/{self.tables[0].id}/')
+        self.assertEqual([table['id'] for table in tables], [self.tables[1].id])
+        self.assertEqual([table['id'] for table in self.client.get(f'/api/restaurants/{self.restaurant.id}/').json()['tables']], [self.tables[1].id])
+
+    def test_opening_hour_delete(self):
+        _, hours, schedule = self._delete_racing_a_reader(f'/api/opening-hours/{self.hours[1].id}/')
+        self.assertEqual([hour['day'] for hour in hours], ['mon'])
+        self.assertFalse(schedule.admits(self.tuesday_lunch, 60))
+
+    def test_restaurant_delete(self):
+        tables, hours, schedule = self._delete_racing_a_reader(f'/api/restaurants/{self.restaurant.id}/')
+        self.assertEqual((tables, hours), ([], []))
+        # No opening hours left: the compiled schedule is the always-open one.
+        self.assertTrue(schedule.admits(self.tuesday_lunch.replace(hour=3), 60))
+
+
+class RestaurantQueryCountTest(TestCase):
+    """
+    The number of queries behind each read endpoint must not grow with the
+    number of restaurants, opening hours or tables returned.
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self._add_restaurants(1)
+
+    def _add_restaurants(self, count):
+        for _ in range(count):
+            restaurant = Restaurant.objects.create(name='Bistro', address='1 Main St', owner=self.owner)
+            OpeningHour.objects.bulk_create(
+                OpeningHour(restaurant=restaurant, day=day, open_time='12:00', close_time='22:00')
+                for day, _ in OpeningHour.DAYS
+            )
+            Table.objects.bulk_create(
+                Table(restaurant=restaurant, table_number=str(number), capacity=4) for number in range(5)
+            )
+
+    def _count_queries(self, url):
+        # Measure the uncached path, which is what a cold cache or a write leaves behind.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def _assert_constant(self, url):
+        small = self._count_queries(url)
+        self._add_restaurants(10)
+        self.assertEqual(self._count_queries(url), small)
+
+    def test_restaurant_list(self):
+        self._assert_constant('/api/restaurants/')
+
+    def test_restaurant_retrieve(self):
+        restaurant = Restaurant.objects.get()
+        small = self._count_queries(f'/api/restaurants/{restaurant.id}/')
+        Table.objects.bulk_create(Table(restaurant=restaurant, table_number=str(number), capacity=2) for number in range(5, 50))
+        self.assertEqual(self._count_queries(f'/api/restaurants/{restaurant.id}/'), small)
+
+    def test_opening_hour_list(self):
+        self._assert_constant('/api/opening-hours/')
+
+    def test_table_list(self):
+        self._assert_constant('/api/tables/')
+
+    def test_str_does_not_load_the_restaurant(self):
+        tables = list(RestaurantRepository.get_all_tables())
+        opening_hours = list(RestaurantRepository.get_all_opening_hours())
+        prefetched = RestaurantRepository.get_all_restaurants().get()
+        with self.assertNumQueries(0):
+            [str(table) for table in tables]
+            [str(opening_hour) for opening_hour in opening_hours]
+            [str(table) for table in prefetched.tables.all()]
+
+
+class WeeklyScheduleTest(TestCase):
+    """
+    Admission checks against compiled opening hours, including overnight
+    spans and bookings that cross Sunday midnight.
+    """
+    # 2025-05-19 is a Monday.
+    MONDAY = datetime(2025, 5, 19, tzinfo=dt_timezone.utc)
+
+    def at(self, day, hour, minute=0):
+        return self.MONDAY.replace(day=self.MONDAY.day + day, hour=hour, minute=minute)
+
+    def test_regular_hours_and_closed_days(self):
+        schedule = WeeklySchedule.compile([
+            ('mon', time(12), time(22), False),
+            ('tue', time(12), time(22), True),
+        ])
+        self.assertTrue(schedule.admits(self.at(0, 12), 90))
+        self.assertTrue(schedule.admits(self.at(0, 20, 30), 90))
+        self.assertFalse(schedule.admits(self.at(0, 21), 90))
+        self.assertFalse(schedule.admits(self.at(0, 11, 45), 30))
+        self.assertFalse(schedule.admits(self.at(1, 13), 60))
+
+    def test_overnight_span_and_week_wrap(self):
+        schedule = WeeklySchedule.compile([
+            ('sun', time(18), time(2), False),
+            ('mon', time(2), time(4), False),
+        ])
+        self.assertTrue(schedule.admits(self.at(6, 23), 120))
+        self.assertTrue(schedule.admits(self.at(0, 1), 120))
+        self.assertTrue(schedule.admits(self.at(6, 23), 240))
+        self.assertFalse(schedule.admits(self.at(6, 23), 330))
+        self.assertFalse(schedule.admits(self.at(0, 17), 60))
+
+    def test_no_opening_hours_means_always_open(self):
+        self.assertTrue(WeeklySchedule.compile([]).admits(self.at(3, 4), 600))
+
+    def test_cached_schedule_needs_no_query(self):
+        cache.clear()
+        owner = User.objects.create(username='owner', role='OWNER')
+        restaurant = Restaurant.objects.create(name='Night Owl', address='1 Main St', owner=owner)
+        OpeningHour.objects.create(restaurant=restaurant, day='mon', open_time=time(12), close_time=time(22))
+        ScheduleCache.get(restaurant.id)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(ScheduleCache.get(restaurant.id).admits(self.at(0, 23), 60))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantRepository.create_opening_hour(restaurant.id, owner, {'day': 'mon', 'open_time': time(22), 'close_time': time(1)})
+        self.assertTrue(ScheduleCache.get(restaurant.id).admits(self.at(0, 23), 60))
+
+
+class RestaurantAvailabilityTest(TestCase):
+    """
+    The availability endpoint lists the slot grid's free starts of one day:
+    inside opening hours, past midnight when the evening runs on, and on
+    joined tables when no single one seats the party.
+    """
+    # 2025-05-24 is a Saturday.
+    DAY = datetime(2025, 5, 24, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', role='OWNER')
+        customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.restaurant = Restaurant.objects.create(name='Slotted Bistro', address='1 Main St', owner=owner)
+        OpeningHour.objects.bulk_create([
+            OpeningHour(restaurant=self.restaurant, day='sat', open_time=time(12), close_time=time(14)),
+            OpeningHour(restaurant=self.restaurant, day='sat', open_time=time(22, 30), close_time=time(1)),
+        ])
+        two_top, *four_tops = Table.objects.bulk_create([
+            Table(restaurant=self.restaurant, table_number='1', capacity=2),
+            Table(restaurant=self.restaurant, table_number='2', capacity=4, is_joinable=True),
+            Table(restaurant=self.restaurant, table_number='3', capacity=4, is_joinable=True),
+        ])
+        for table, hour in ((four_tops[0], 12), (two_top, 13)):
+            Reservation.objects.create(
+                customer=customer, restaurant=self.restaurant, table=table, number_of_guests=2,
+                reservation_time=self.at(hour), duration=60,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(customer)
+
+    def at(self, hour, minute=0):
+        return self.DAY + timedelta(hours=hour, minutes=minute)
+
+    def slots(self, party_size, duration=60):
+        response = self.client.get(
+            f'/api/restaurants/{self.restaurant.id}/availability/',
+            {'date': '2025-05-24', 'party_size': party_size, 'duration': duration},
+        )
+        self.assertEqual(response.status_code, 200)
+        return [datetime.fromisoformat(slot) for slot in response.json()['slots']]
+
+    def every_slot(self, first, last):
+        return [first + timedelta(minutes=15 * slot) for slot in range(int((last - first) / timedelta(minutes=15)) + 1)]
+
+    def test_free_starts_within_opening_hours(self):
+        # The evening runs past midnight, so 23:45 still fits an hour; later starts belong to Sunday.
+        evening = self.every_slot(self.at(22, 30), self.at(23, 45))
+        self.assertEqual(self.slots(2), self.every_slot(self.at(12), self.at(13)) + evening)
+        self.assertEqual(self.slots(2, duration=120), [self.at(12)] + self.every_slot(self.at(22, 30), self.at(23)))
+
+    def test_joined_tables_seat_larger_parties(self):
+        evening = self.every_slot(self.at(22, 30), self.at(23, 45))
+        self.assertEqual(self.slots(6), [self.at(13)] + evening)
+        self.assertEqual(self.slots(9), [])
+
+    def test_invalid_queries(self):
+        url = f'/api/restaurants/{self.restaurant.id}/availability/'
+        self.assertEqual(self.client.get(url, {'date': '2025-05-24'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'date': '2025-05-24', 'party_size': 2, 'duration': 0}).status_code, 400)
+        missing = self.client.get(f'/api/restaurants/{self.restaurant.id + 1}/availability/', {'date': '2025-05-24', 'party_size': 2})
+        self.assertEqual(missing.status_code, 404)
+
+
+class BatchAvailabilityTest(TestCase):
+    """
+    The batch availability endpoint finds each restaurant's earliest free start
+    in the same number of queries for one restaurant as for many.
+    """
+    START = datetime(2025, 5, 24, 11, 50, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        self.customer = User.objects.create(username='customer', role='CUSTOMER')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.restaurants = []
+
+    def _add_restaurant(self, booked_until=None):
+        restaurant = Restaurant.objects.create(name='Bistro', address='1 Main St', owner=self.owner)
+        OpeningHour.objects.create(restaurant=restaurant, day='sat', open_time=time(12), close_time=time(22))
+        table = Table.objects.create(restaurant=restaurant, table_number='1', capacity=4)
+        if booked_until is not None:
+            Reservation.objects.create(
+                customer=self.customer, restaurant=restaurant, table=table, number_of_guests=2,
+                reservation_time=self.START, duration=int((booked_until - self.START) / timedelta(minutes=1)),
+            )
+        self.restaurants.append(restaurant)
+        return restaurant
+
+    def _get(self, restaurants):
+        return self.client.get('/api/restaurants/availability/', {
+            'restaurant_ids': [restaurant.id for restaurant in restaurants],
+            'start': self.START.isoformat(),
+            'end': (self.START + timedelta(hours=6)).isoformat(),
+            'party_size': 2,
+            'duration': 60,
+        })
+
+    def test_same_queries_for_one_or_many_restaurants(self):
+        self._add_restaurant()
+        with CaptureQueriesContext(connection) as single:
+            self.assertEqual(self._get(self.restaurants).status_code, 200)
+
+        for hours in range(1, 10):
+            self._add_restaurant(booked_until=self.START + timedelta(hours=hours, minutes=10))
+        with self.assertNumQueries(len(single)):
+            response = self._get(self.restaurants)
+        self.assertEqual(response.status_code, 200)
+
+        # Starts are aligned to the next slot; a restaurant booked past the window has none.
+        earliest = [result['earliest_slot'] for result in response.json()['results']]
+        self.assertEqual(earliest[0], '2025-05-24T12:00:00Z')
+        self.assertEqual(earliest[1:6], [f'2025-05-24T{hour}:00:00Z' for hour in range(13, 18)])
+        self.assertEqual(earliest[6:], [None] * 4)
+
+
+class RequestInstrumentationTest(TestCase):
+    """
+    Every response reports its SQL work in Server-Timing and /metrics exposes
+    the per-route aggregates.
+    """
+
+    def setUp(self):
+        cache.clear()
+        route_metrics.reset()
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        Restaurant.objects.create(name='Bistro', address='1 Main St', owner=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_server_timing_reports_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/restaurants/')
+        server_timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} queries"', server_timing)
+        self.assertIn('db-slowest;dur=', server_timing)
+
+    def test_metrics_aggregate_by_route(self):
+        self.client.get('/api/restaurants/')
+        self.client.get('/api/restaurants/')
+        self.client.get('/no-such-page/')
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{route="api/restaurants/",method="GET",status="2xx"} 2', body)
+        self.assertIn('http_requests_total{route="unmatched",method="GET",status="4xx"} 1', body)
+        self.assertIn('http_request_sql_queries_count{route="api/restaurants/",method="GET"} 2', body)
+        self.assertIn('reservation_allocation_retries_total', body)
+        self.assertIn('restaurant_cache_requests_total{result="miss"}', body)
+
+    def test_streamed_queries_are_counted_when_the_stream_ends(self):
+        restaurant = Restaurant.objects.get()
+        table = Table.objects.create(restaurant=restaurant, table_number='1', capacity=4)
+        Reservation.objects.create(
+            customer=self.owner, restaurant=restaurant, table=table, number_of_guests=2, duration=60,
+            reservation_time=datetime(2025, 5, 24, 18, tzinfo=dt_timezone.utc),
+        )
+        response = self.client.get('/api/reservations/export/')
+        # The header goes out before the body and counts only the queries run so far.
+        before_stream = int(re.search(r'desc="(\d+) queries"', response['Server-Timing'])[1])
+        self.assertNotIn('api/reservations/export/', '\n'.join(route_metrics.render()))
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 2)
+
+        queries = re.search(r'http_request_sql_queries_sum\{route="api/reservations/export/",method="GET"\} ([\d.]+)', self.client.get('/metrics').content.decode())
+        self.assertGreater(float(queries[1]), before_stream)
+
+    @override_settings(SLOW_QUERY_LOG_MS=0)
+    def test_lock_waits_are_timed_apart_from_queries(self):
+        restaurant = Restaurant.objects.get()
+        Table.objects.create(restaurant=restaurant, table_number='1', capacity=4)
+        with self.assertLogs('restaurant_reservation.instrumentation', 'WARNING') as logs:
+            response = self.client.post('/api/reservations/create/', {
+                'restaurant': restaurant.id, 'reservation_time': '2025-05-24T18:00:00Z', 'number_of_guests': 2, 'duration': 60,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('desc="1 waits"', response['Server-Timing'])
+
+        slow_queries = [line for line in logs.output if 'Slow query' in line]
+        self.assertEqual(len(slow_queries), 1)
+        self.assertNotIn('pg_advisory_xact_lock', slow_queries[0])
+        self.assertTrue(any('Lock wait on POST /api/reservations/create/' in line for line in logs.output))
+        self.assertIn('http_request_lock_wait_seconds_count{route="api/reservations/create/",method="POST"} 1', self.client.get('/metrics').content.decode())
+
+    def test_metrics_refuse_addresses_outside_the_allowlist(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 403)
+        with self.settings(METRICS_ALLOWED_IPS=['203.0.113.7']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-token', METRICS_ALLOWED_IPS=[])
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class RestaurantNestedWriteTest(TestCase):
+    """
+    Restaurants are written with their opening hours and tables in a fixed
+    number of queries, and nested lists on update replace the stored rows.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def payload(self, tables):
+        return {
+            'name': 'Chain Bistro',
+            'address': '1 Main St',
+            'opening_hours': [{'day': day, 'open_time': '12:00', 'close_time': '22:00'} for day, _ in OpeningHour.DAYS],
+            'tables': [{'table_number': str(number), 'capacity': 4} for number in range(tables)],
+        }
+
+    def test_create_costs_the_same_for_any_number_of_tables(self):
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.post('/api/restaurants/', self.payload(2), format='json').status_code, 201)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post('/api/restaurants/', self.payload(60), format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(Table.objects.filter(restaurant_id=response.json()['id']).count(), 60)
+
+    def test_update_replaces_nested_rows(self):
+        restaurant_id = self.client.post('/api/restaurants/', self.payload(3), format='json').json()['id']
+        tables = list(Table.objects.filter(restaurant_id=restaurant_id).order_by('id'))
+        self.client.get(f'/api/restaurants/{restaurant_id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/restaurants/{restaurant_id}/', {'tables': [
+                {'id': tables[0].id, 'capacity': 8},
+                {'id': tables[1].id},
+                {'table_number': '9', 'capacity': 2},
+            ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        expected = [(tables[0].id, '0', 8), (tables[1].id, '1', 4)]
+        self.assertEqual([(table['id'], table['table_number'], table['capacity']) for table in response.json()['tables']][:2], expected)
+        self.assertEqual([table['table_number'] for table in response.json()['tables']], ['0', '1', '9'])
+        self.assertEqual(len(response.json()['opening_hours']), 7)
+        self.assertEqual(self.client.get(f'/api/restaurants/{restaurant_id}/').json()['tables'], response.json()['tables'])
+
+    def test_update_rejects_unknown_rows_and_booked_tables(self):
+        restaurant_id = self.client.post('/api/restaurants/', self.payload(2), format='json').json()['id']
+        other = Table.objects.create(restaurant=Restaurant.objects.create(name='Other', address='2 Main St', owner=self.owner), table_number='1', capacity=2)
+        response = self.client.patch(f'/api/restaurants/{restaurant_id}/', {'tables': [{'id': other.id, 'capacity': 6}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        kept, booked = Table.objects.filter(restaurant_id=restaurant_id).order_by('id')
+        customer = User.objects.create(username='customer', role='CUSTOMER')
+        Reservation.objects.create(
+            customer=customer, restaurant_id=restaurant_id, table=booked, number_of_guests=2, duration=60,
+            reservation_time=timezone.now() + timedelta(days=1),
+        )
+        response = self.client.patch(f'/api/restaurants/{restaurant_id}/', {'tables': [{'id': kept.id}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Table.objects.filter(id=booked.id).exists())
+
+    def test_chain_import_command(self):
+        rows = [self.payload(3), {**self.payload(1), 'tables': [{'table_number': '1'}]}, self.payload(5)]
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as handle:
+            handle.write('\n'.join(json.dumps(row) for row in rows))
+            handle.flush()
+            call_command('import_restaurants', handle.name, owner='owner', stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertEqual(Restaurant.objects.filter(owner=self.owner).count(), 2)
+        self.assertEqual(Table.objects.filter(restaurant__owner=self.owner).count(), 8)
+        self.assertEqual(OpeningHour.objects.filter(restaurant__owner=self.owner).count(), 14)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Safe reads go to a replica; writes, transactions and the reads of a client
+    that just wrote stay on the primary, and unreachable or lagging replicas are
+    skipped. The replica is a second connection to the test database, which is
+    what a caught-up streaming replica looks like to the application.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added once the test case has guarded the configured aliases, so these stay usable.
+        primary = connections['default'].settings_dict
+        connections.settings['replica'] = {**primary, 'TEST': {**primary['TEST'], 'MIRROR': 'default'}}
+        connections.settings['replica_down'] = {**connections.settings['replica'], 'HOST': '/nonexistent'}
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in ('replica', 'replica_down'):
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        replica_monitor.reset()
+        self.owner = User.objects.create(username='owner', role='OWNER')
+        Restaurant.objects.create(name='Mirrored', address='1 Main St', owner=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _replica_queries(self, path):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_safe_reads_go_to_the_replica(self):
+        self.assertTrue(any('restaurants_restaurant' in sql for sql in self._replica_queries('/api/restaurants/')))
+        self.assertTrue(any('users_user' in sql for sql in self._replica_queries('/api/users/me/')))
+
+    def test_writes_keep_the_client_on_the_primary(self):
+        response = self.client.post('/api/restaurants/', {'name': 'Fresh', 'address': '2 Main St'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+
+        # The new restaurant is listed although nothing was read from the replica.
+        with CaptureQueriesContext(connections['default']):
+            self.assertEqual(self._replica_queries('/api/restaurants/'), [])
+        self.assertEqual(len(self.client.get('/api/restaurants/').json()), 2)
+
+        del self.client.cookies[STICKY_COOKIE]
+        self.assertNotEqual(self._replica_queries('/api/restaurants/'), [])
+
+    def test_transactions_read_the_primary(self):
+        self.assertEqual(Restaurant.objects.all().db, 'replica')
+        with transaction.atomic():
+            self.assertEqual(Restaurant.objects.all().db, 'default')
+
+    def test_unreachable_and_lagging_replicas_are_skipped(self):
+        with override_settings(DATABASE_REPLICAS=['replica_down', 'replica']), self.assertLogs('restaurant_reservation.db_router', 'WARNING'):
+            self.assertEqual(Restaurant.objects.all().db, 'replica')
+        self.assertEqual(replica_monitor.snapshot(), {'replica_down': None, 'replica': 0.0})
+
+        replica_monitor.reset()
+        with override_settings(REPLICA_MAX_LAG_SECONDS=-1):
+            self.assertEqual(Restaurant.objects.all().db, 'default')
 
-# Create your tests here.
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RestaurantViewSet, OpeningHourViewSet, TableViewSet
+from .views import RestaurantViewSet, OpeningHourViewSet, TableViewSet, RestaurantAvailabilityView, BatchAvailabilityView, RestaurantCacheMetricsView
 
 
 router = DefaultRouter()
@@ -11,5 +11,8 @@ router.register(r'tables', TableViewSet, basename='table')
 
 urlpatterns = [
    
+    path('restaurants/cache/metrics/', RestaurantCacheMetricsView.as_view(), name='restaurant-cache-metrics'),
+    path('restaurants/availability/', BatchAvailabilityView.as_view(), name='restaurant-batch-availability'),
+    path('restaurants/<int:pk>/availability/', RestaurantAvailabilityView.as_view(), name='restaurant-availability'),
     path('', include(router.urls)),
 ]
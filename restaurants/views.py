@@ -1,15 +1,54 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import PermissionDenied
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 
-from restaurants.models import OpeningHour, Table
+from reservations.repository import ReservationRepository
+from reservations.service import align_to_slot
+from .cache import RestaurantCache
+from .metrics import cache_metrics
 from .repository import RestaurantRepository
-from .serializers import RestaurantSerializer, OpeningHourSerializer, TableSerializer
+from .serializers import RestaurantSerializer, OpeningHourSerializer, TableSerializer, AvailabilityQuerySerializer, BatchAvailabilityQuerySerializer
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def build_restaurant_payloads(restaurant_ids):
+    return {
+        restaurant.id: RestaurantSerializer(restaurant).data
+        for restaurant in RestaurantRepository.get_restaurants_with_details(restaurant_ids)
+    }
+
+
+def build_opening_hour_payloads(restaurant_ids):
+    payloads = {restaurant_id: [] for restaurant_id in restaurant_ids}
+    for opening_hour in RestaurantRepository.get_opening_hours_for_restaurants(restaurant_ids):
+        payloads[opening_hour.restaurant_id].append(OpeningHourSerializer(opening_hour).data)
+    return payloads
+
+
+def build_table_payloads(restaurant_ids):
+    payloads = {restaurant_id: [] for restaurant_id in restaurant_ids}
+    for table in RestaurantRepository.get_tables_for_restaurants(restaurant_ids):
+        payloads[table.restaurant_id].append(TableSerializer(table).data)
+    return payloads
+
+
+def find_payload(payloads, pk):
+    """
+    The payload with id `pk` among a restaurant's cached rows.
+    """
+    for payload in payloads:
+        if str(payload['id']) == str(pk):
+            return payload
+    raise Http404
+
+
 class IsOwnerUser(permissions.BasePermission):
     """
     Custom permission to only allow users with 'OWNER' role to access certain views.
@@ -30,7 +69,23 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         """
         Ensures users only see restaurants they own.
         """
-        return self.queryset.filter(owner=self.request.user)
+        return self.queryset.filter(owner_id=self.request.user.id)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serves the owner's restaurants from the payload cache.
+        """
+        restaurant_ids = RestaurantRepository.get_restaurant_ids_for_owner(request.user)
+        payloads = RestaurantCache.get_many(restaurant_ids, 'detail', build_restaurant_payloads)
+        return Response([payloads[restaurant_id] for restaurant_id in restaurant_ids])
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serves a restaurant from the payload cache once ownership is checked.
+        """
+        restaurant_id = get_object_or_404(self.get_queryset().values_list('id', flat=True), pk=kwargs['pk'])
+        payloads = RestaurantCache.get_many([restaurant_id], 'detail', build_restaurant_payloads)
+        return Response(payloads[restaurant_id])
 
 
     def perform_create(self, serializer):
@@ -40,7 +95,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         """
         try:
            
-            RestaurantRepository.create_restaurant(serializer, self.request.user)
+            serializer.instance = RestaurantRepository.create_restaurant(serializer, self.request.user)
             logger.info(f"Restaurant created successfully by user {self.request.user.username}.")
         except Exception as e:
             logger.exception(f"Error creating restaurant by user {self.request.user.username}.")
@@ -59,7 +114,10 @@ class RestaurantViewSet(viewsets.ModelViewSet):
                 self.request.user,
                 serializer.validated_data
             )
+            serializer.instance = updated_restaurant
             logger.info(f"Restaurant with ID {updated_restaurant.id} updated successfully by user {self.request.user.username}.")
+        except serializers.ValidationError:
+            raise
         except Exception as e:
             logger.exception(f"Error updating restaurant with ID {serializer.instance.id} by user {self.request.user.username}.")
             raise serializers.ValidationError({'detail': 'Could not update restaurant.'})
@@ -82,7 +140,7 @@ class OpeningHourViewSet(viewsets.ModelViewSet):
     """
     A ViewSet for listing, creating, retrieving, updating and deleting opening hours.
     """
-    queryset = OpeningHour.objects.all() # Initial queryset
+    queryset = RestaurantRepository.get_all_opening_hours()
     serializer_class = OpeningHourSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerUser]
     
@@ -92,7 +150,23 @@ class OpeningHourViewSet(viewsets.ModelViewSet):
         """
         Ensures users only see opening hours for restaurants they own.
         """
-        return self.queryset.filter(owner=self.request.user)
+        return self.queryset.filter(restaurant__owner_id=self.request.user.id)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serves the opening hours of the owner's restaurants from the payload cache.
+        """
+        restaurant_ids = RestaurantRepository.get_restaurant_ids_for_owner(request.user)
+        payloads = RestaurantCache.get_many(restaurant_ids, 'opening_hours', build_opening_hour_payloads)
+        return Response([opening_hour for restaurant_id in restaurant_ids for opening_hour in payloads[restaurant_id]])
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serves an opening hour from its restaurant's payload cache once ownership is checked.
+        """
+        restaurant_id = get_object_or_404(self.get_queryset().values_list('restaurant_id', flat=True), pk=kwargs['pk'])
+        payloads = RestaurantCache.get_many([restaurant_id], 'opening_hours', build_opening_hour_payloads)
+        return Response(find_payload(payloads[restaurant_id], kwargs['pk']))
     
     
 
@@ -102,11 +176,12 @@ class OpeningHourViewSet(viewsets.ModelViewSet):
         The client must provide 'restaurant' ID in the request body.
         """
         try:
-            restaurant_id = serializer.validated_data.get('restaurant').id # Get the Restaurant object's ID
-            RestaurantRepository.create_opening_hour(
-                restaurant=restaurant_id,
+            data = dict(serializer.validated_data)
+            restaurant_id = data.pop('restaurant').id # Get the Restaurant object's ID
+            serializer.instance = RestaurantRepository.create_opening_hour(
+                restaurant_id=restaurant_id,
                 owner=self.request.user,
-                data=serializer.validated_data
+                data=data
             )
             logger.info(f"Opening hour created for restaurant {restaurant_id} by user {self.request.user.username}.")
         except Exception as e:
@@ -119,10 +194,11 @@ class OpeningHourViewSet(viewsets.ModelViewSet):
         """
         try:
             updated_opening_hour = RestaurantRepository.update_opening_hour(
-                id=serializer.instance.id,
+                opening_hour_id=serializer.instance.id,
                 owner=self.request.user,
                 data=serializer.validated_data
             )
+            serializer.instance = updated_opening_hour
             logger.info(f"Opening hour with ID {updated_opening_hour.id} updated successfully by user {self.request.user.username}.")
         except Exception as e:
             logger.exception(f"Error updating opening hour with ID {serializer.instance.id} by user {self.request.user.username}.")
@@ -146,7 +222,7 @@ class TableViewSet(viewsets.ModelViewSet):
     """
     A ViewSet for listing, creating, retrieving, updating and deleting tables.
     """
-    queryset = Table.objects.all() # Initial queryset
+    queryset = RestaurantRepository.get_all_tables()
     serializer_class = TableSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerUser]
 
@@ -156,7 +232,23 @@ class TableViewSet(viewsets.ModelViewSet):
         """
         Ensures users only see tables for restaurants they own.
         """
-        return self.queryset.filter(owner=self.request.user)
+        return self.queryset.filter(restaurant__owner_id=self.request.user.id)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serves the tables of the owner's restaurants from the payload cache.
+        """
+        restaurant_ids = RestaurantRepository.get_restaurant_ids_for_owner(request.user)
+        payloads = RestaurantCache.get_many(restaurant_ids, 'tables', build_table_payloads)
+        return Response([table for restaurant_id in restaurant_ids for table in payloads[restaurant_id]])
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serves a table from its restaurant's payload cache once ownership is checked.
+        """
+        restaurant_id = get_object_or_404(self.get_queryset().values_list('restaurant_id', flat=True), pk=kwargs['pk'])
+        payloads = RestaurantCache.get_many([restaurant_id], 'tables', build_table_payloads)
+        return Response(find_payload(payloads[restaurant_id], kwargs['pk']))
 
 
 
@@ -167,11 +259,12 @@ class TableViewSet(viewsets.ModelViewSet):
         The client must provide 'restaurant' ID in the request body.
         """
         try:
-            restaurant_id = serializer.validated_data.get('restaurant').id # Get the Restaurant object's ID
-            RestaurantRepository.create_table(
-                restaurant=restaurant_id,
+            data = dict(serializer.validated_data)
+            restaurant_id = data.pop('restaurant').id # Get the Restaurant object's ID
+            serializer.instance = RestaurantRepository.create_table(
+                restaurant_id=restaurant_id,
                 owner=self.request.user,
-                data=serializer.validated_data
+                data=data
             )
             logger.info(f"Table created for restaurant {restaurant_id} by user {self.request.user.username}.")
         except Exception as e:
@@ -186,10 +279,11 @@ class TableViewSet(viewsets.ModelViewSet):
         """
         try:
             updated_table = RestaurantRepository.update_table(
-                id=serializer.instance.id,
+                table_id=serializer.instance.id,
                 owner=self.request.user,
                 data=serializer.validated_data
             )
+            serializer.instance = updated_table
             logger.info(f"Table with ID {updated_table.id} updated successfully by user {self.request.user.username}.")
         except Exception as e:
             logger.exception(f"Error updating table with ID {serializer.instance.id} by user {self.request.user.username}.")
@@ -209,3 +303,76 @@ class TableViewSet(viewsets.ModelViewSet):
             logger.exception(f"Error deleting table with ID {instance.id} by user {self.request.user.username}.")
             raise Response({'detail': 'Could not delete table.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+class RestaurantAvailabilityView(APIView):
+    """
+    View to list every free reservation start time of a restaurant on a given date.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        serializer = AvailabilityQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        restaurant = RestaurantRepository.get_restaurant_by_id(pk)
+        if not restaurant:
+            return Response({"error": "Restaurant not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        date = serializer.validated_data['date']
+        party_size = serializer.validated_data['party_size']
+        duration = serializer.validated_data['duration']
+
+        # The grid runs past midnight by one booking length so late starts can still fit.
+        day_start = timezone.make_aware(datetime.combine(date, time.min))
+        day_end = day_start + timedelta(days=1)
+        grid = ReservationRepository.get_slot_grid(restaurant, day_start, day_end + timedelta(minutes=duration), party_size)
+
+        return Response({
+            "restaurant": restaurant.id,
+            "date": date,
+            "party_size": party_size,
+            "duration": duration,
+            "slots": grid.free_starts(duration, until=day_end),
+        }, status=status.HTTP_200_OK)
+
+
+class BatchAvailabilityView(APIView):
+    """
+    View to find the earliest free start time of many restaurants at once, for discovery pages.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        serializer = BatchAvailabilityQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        restaurant_ids = list(dict.fromkeys(serializer.validated_data['restaurant_ids']))
+        party_size = serializer.validated_data['party_size']
+        duration = serializer.validated_data['duration']
+        window_start = align_to_slot(serializer.validated_data['start'])
+        window_end = serializer.validated_data['end']
+
+        grids = ReservationRepository.get_slot_grids(restaurant_ids, window_start, window_end + timedelta(minutes=duration), party_size)
+
+        return Response({
+            "start": window_start,
+            "end": window_end,
+            "party_size": party_size,
+            "duration": duration,
+            "results": [
+                {"restaurant": restaurant_id, "earliest_slot": grids[restaurant_id].earliest_start(duration, until=window_end)}
+                for restaurant_id in restaurant_ids
+            ],
+        }, status=status.HTTP_200_OK)
+
+
+class RestaurantCacheMetricsView(APIView):
+    """
+    View exposing restaurant payload cache hits, misses and hit ratio to admins.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_metrics.snapshot(), status=status.HTTP_200_OK)
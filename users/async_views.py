@@ -0,0 +1,23 @@
+from rest_framework import status
+from restaurant_reservation.async_support import AsyncAPIView
+from .serializers import UserSerializer
+from .repository import UserRepository
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class AsyncUserDetailView(AsyncAPIView):
+    """
+    Async view returning the authenticated user.
+    """
+
+    async def get(self, request):
+        user_id = request.user.id
+        user = await UserRepository.aget_user_by_id(user_id)
+        if not user:
+            logger.warning(f"User with ID {user_id} not found.")
+            return self.respond({"error": "User not found"}, status.HTTP_404_NOT_FOUND)
+        return self.respond(UserSerializer(user).data, status.HTTP_200_OK)
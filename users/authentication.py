@@ -0,0 +1,44 @@
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import AuthStateCache
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the access token's claims (see
+    CustomTokenObtainPairSerializer.get_token). Carries the id, username,
+    role and staff flag; anything else has to be loaded from the database.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def role(self):
+        return self.token.get('role')
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication without loading the user row. The token's claims are
+    checked against AuthStateCache, so deactivated users and users whose
+    role or staff flag changed are turned away without a query per request.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+
+        state = AuthStateCache.get(user.id)
+        if not state['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if state['role'] != user.role or state['is_staff'] != user.is_staff:
+            raise AuthenticationFailed(_("Token claims are out of date, log in again"), code="token_not_valid")
+        return user
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from restaurant_reservation.db_router import read_from_primary
+
+from .models import User
+
+
+class AuthStateCache:
+    """
+    Cached copy of the user fields that decide whether an access token is
+    still honoured: whether the account is active, its role and staff flag.
+    Entries are refreshed on login, dropped whenever the user row changes and
+    expire after AUTH_STATE_CACHE_TIMEOUT seconds regardless.
+    """
+
+    @staticmethod
+    def _key(user_id):
+        return f'user:{user_id}:auth'
+
+    @staticmethod
+    def _state(user):
+        return {'is_active': user.is_active, 'role': user.role, 'is_staff': user.is_staff}
+
+    @staticmethod
+    def get(user_id):
+        """
+        The user's auth state; reads the user row on a miss. Deleted users read as inactive.
+        """
+        state = cache.get(AuthStateCache._key(user_id))
+        if state is None:
+            # The primary, so a replica cannot cache a state older than the write that dropped it.
+            with read_from_primary():
+                state = User.objects.filter(id=user_id).values('is_active', 'role', 'is_staff').first() or {
+                    'is_active': False, 'role': None, 'is_staff': False,
+                }
+            cache.set(AuthStateCache._key(user_id), state, timeout=settings.AUTH_STATE_CACHE_TIMEOUT)
+        return state
+
+    @staticmethod
+    def set(user):
+        cache.set(AuthStateCache._key(user.id), AuthStateCache._state(user), timeout=settings.AUTH_STATE_CACHE_TIMEOUT)
+
+    @staticmethod
+    def invalidate(user_id):
+        """
+        Drop the cached state once the current transaction commits, so a
+        concurrent request cannot cache the old row again.
+        """
+        transaction.on_commit(lambda: cache.delete(AuthStateCache._key(user_id)))
@@ -0,0 +1,45 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+# Most passwords sent to a worker at a time. bcrypt dwarfs the pickling cost,
+# so chunks stay small enough to keep every worker busy until a batch ends.
+CHUNK_SIZE = 64
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def password_pool(workers=None):
+    """
+    Process pool for password hashing. Workers are spawned rather than forked,
+    so they never inherit locks held by the parent's other threads.
+    """
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=get_context("spawn"), initializer=django.setup)
+
+
+def shared_password_pool():
+    """
+    The web process's hashing pool, started on first use and kept for the life of the process.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = password_pool(settings.USER_IMPORT_HASH_WORKERS)
+        return _shared_pool
+
+
+def hash_passwords(passwords, pool=None):
+    """
+    Hash `passwords` with the configured hasher, across `pool` when given, in input order.
+    """
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    chunk_size = max(1, min(CHUNK_SIZE, len(passwords) // (4 * os.cpu_count())))
+    return list(pool.map(make_password, passwords, chunksize=chunk_size))
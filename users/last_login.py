@@ -0,0 +1,93 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from .models import User
+
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginBuffer:
+    """
+    Process-wide buffer of login times, written to users_user in batches.
+
+    Logins record into a dict keyed by user id, so a user logging in many
+    times between flushes costs one row update. A daemon thread flushes every
+    LAST_LOGIN_FLUSH_INTERVAL seconds and the buffer drains at interpreter
+    exit, which gunicorn and uvicorn workers reach on graceful shutdown.
+    With an interval of 0, logins are written immediately.
+    """
+
+    # Rows per UPDATE; bulk_update builds one CASE expression per batch.
+    BATCH_SIZE = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def record(self, user_id, moment):
+        if settings.LAST_LOGIN_FLUSH_INTERVAL <= 0:
+            User.objects.filter(id=user_id).update(last_login=moment)
+            return
+        with self._lock:
+            self._pending[user_id] = max(moment, self._pending.get(user_id, moment))
+            if self._thread is None:
+                self._start()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """
+        Write every buffered login and return how many users were updated.
+        Logins that fail to write go back into the buffer for the next flush.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            User.objects.bulk_update(
+                [User(id=user_id, last_login=moment) for user_id, moment in batch.items()],
+                ['last_login'],
+                batch_size=self.BATCH_SIZE,
+            )
+        except DatabaseError:
+            logger.exception(f"Could not write {len(batch)} buffered last_login values; retrying on the next flush.")
+            with self._lock:
+                for user_id, moment in batch.items():
+                    self._pending[user_id] = max(moment, self._pending.get(user_id, moment))
+            return 0
+        return len(batch)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="last-login-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopping.wait(settings.LAST_LOGIN_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            finally:
+                # The thread lives for the whole process; don't hold a connection between flushes.
+                connection.close()
+
+    def stop(self):
+        """
+        Stop the flush thread and drain the buffer.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+last_login_buffer = LastLoginBuffer()
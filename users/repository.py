@@ -1,6 +1,10 @@
 from .models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .hashing import hash_passwords
+from .serializers import BulkUserSerializer
 
 UserModel = get_user_model()
 
@@ -16,14 +20,65 @@ class UserRepository:
         except ObjectDoesNotExist:
             return None
         
+    @staticmethod
+    async def aget_user_by_id(user_id):
+        """
+        Async version of get_user_by_id.
+        """
+        try:
+            return await UserModel.objects.aget(id=user_id)
+        except ObjectDoesNotExist:
+            return None
+        
     @staticmethod
     def create_user(**kwargs):
         """
         Create a new user with the provided keyword arguments.
         """
-        user = UserModel.objects.create_user(**kwargs)
-        user.save()
-        return user
+        return UserModel.objects.create_user(**kwargs)
+    
+    @staticmethod
+    def import_users(rows, pool=None, batch_size=1000):
+        """
+        Validate raw user rows and create the valid ones in bulk.
+        A username or email already in use, or used by an earlier row, fails the row;
+        existing ones are found with one query each for the whole batch.
+        Passwords are hashed across `pool` (see users.hashing) when given.
+        Returns one result per row: created with its id, or failed with the reason.
+        """
+        serializer = BulkUserSerializer(data=rows, many=True)
+        results = [None] * len(rows)
+        valid = []
+        for position, row in enumerate(rows):
+            try:
+                data = serializer.child.run_validation(row)
+            except ValidationError as e:
+                results[position] = {"row": position, "status": "failed", "errors": e.detail}
+                continue
+            data['email'] = UserModel.objects.normalize_email(data.get('email', ''))
+            valid.append((position, data))
+        
+        taken_usernames = set(UserModel.objects.filter(username__in={data['username'] for _, data in valid}).values_list('username', flat=True))
+        taken_emails = set(UserModel.objects.filter(email__in={data['email'] for _, data in valid if data['email']}).values_list('email', flat=True))
+        accepted = []
+        for position, data in valid:
+            if data['username'] in taken_usernames:
+                results[position] = {"row": position, "status": "failed", "errors": {"username": ["A user with that username already exists."]}}
+            elif data['email'] and data['email'] in taken_emails:
+                results[position] = {"row": position, "status": "failed", "errors": {"email": ["A user with that email already exists."]}}
+            else:
+                taken_usernames.add(data['username'])
+                if data['email']:
+                    taken_emails.add(data['email'])
+                accepted.append((position, data))
+        
+        passwords = hash_passwords([data.pop('password') for _, data in accepted], pool)
+        users = [UserModel(password=password, **data) for (_, data), password in zip(accepted, passwords)]
+        with transaction.atomic():
+            UserModel.objects.bulk_create(users, batch_size=batch_size)
+        for (position, _), user in zip(accepted, users):
+            results[position] = {"row": position, "status": "created", "id": user.id}
+        return results
     
     @staticmethod
     def get_user_by_email(email):
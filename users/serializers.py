@@ -1,6 +1,10 @@
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.utils import timezone
 from rest_framework import serializers
 from .models import User
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .cache import AuthStateCache
+from .last_login import last_login_buffer
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,10 +24,32 @@ class UserRegisterSerializer(serializers.ModelSerializer):
             return User.objects.create_user(**validated_data)
         
         
+class BulkUserSerializer(UserRegisterSerializer):
+    """
+    Row serializer for bulk imports. Username uniqueness is checked for the
+    whole batch at once by UserRepository.import_users, not with a query per row.
+    """
+    class Meta(UserRegisterSerializer.Meta):
+        extra_kwargs = {
+            **UserRegisterSerializer.Meta.extra_kwargs,
+            'username': {'validators': [UnicodeUsernameValidator()]},
+        }
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        
+        # Claims read by StatelessJWTAuthentication in place of the user row.
+        token['username'] = user.username
+        token['role'] = user.role
+        token['is_staff'] = user.is_staff
+        AuthStateCache.set(user)
         return token
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Buffered instead of SIMPLE_JWT's UPDATE_LAST_LOGIN, which writes the row on every login.
+        last_login_buffer.record(self.user.id, timezone.now())
+        return data
         
\ No newline at end of file
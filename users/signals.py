@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import AuthStateCache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_state(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the cached state does not hold.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    AuthStateCache.invalidate(instance.id)
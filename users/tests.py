@@ -1,3 +1,153 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from restaurant_reservation.testing import ReplicaTransactionTestCase
+from restaurants.models import Restaurant
+from .last_login import LastLoginBuffer
+from .repository import UserRepository
+from .models import User
+from .serializers import CustomTokenObtainPairSerializer
+
+
+@override_settings(LAST_LOGIN_FLUSH_INTERVAL=0)
+class StatelessJWTAuthenticationTest(TestCase):
+    """
+    Access tokens carry the claims the API needs, so authenticating costs no
+    query, and user changes still revoke them straight away.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='secret-password', role='OWNER')
+        Restaurant.objects.create(name='Bistro', address='1 Main St', owner=self.owner)
+        self.client = APIClient()
+        response = self.client.post('/api/users/login/', {'username': 'owner', 'password': 'secret-password'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+
+    def test_authenticated_read_needs_no_auth_query(self):
+        self.assertEqual(self.client.get('/api/restaurants/').status_code, 200)
+        # Only the owner's restaurant ids are read; the payloads come from the cache.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/restaurants/')
+        self.assertEqual(response.json()[0]['owner'], self.owner.id)
+
+    def test_role_change_revokes_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.role = 'CUSTOMER'
+            self.owner.save()
+        self.assertEqual(self.client.get('/api/restaurants/').status_code, 401)
+
+    def test_deactivation_revokes_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.is_active = False
+            self.owner.save()
+        self.assertEqual(self.client.get('/api/restaurants/').status_code, 401)
+
+    def test_state_is_reloaded_after_expiry(self):
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+
+class AsyncUserDetailViewTest(ReplicaTransactionTestCase):
+    """
+    The async profile endpoint authenticates through the same token checks as
+    the DRF views and returns the stored user.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='customer', email='customer@example.com', role='CUSTOMER')
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        # Client-wide headers of AsyncClient do not reach the ASGI scope, so each request passes them.
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.client = AsyncClient()
+
+    async def test_returns_the_authenticated_user(self):
+        response = await self.client.get('/api/users/async/me/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'id': self.user.id, 'username': 'customer', 'email': 'customer@example.com', 'role': 'CUSTOMER', 'phone_number': '',
+        })
+
+    async def test_missing_or_revoked_tokens_are_refused(self):
+        self.assertEqual((await self.client.get('/api/users/async/me/')).status_code, 401)
+
+        self.user.is_active = False
+        await self.user.asave()
+        self.assertEqual((await self.client.get('/api/users/async/me/', headers=self.headers)).status_code, 401)
+
+
+class LastLoginBufferTest(TestCase):
+    """
+    Logins are held back and written together, keeping each user's latest.
+    """
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=3600)
+    def test_flush_writes_latest_login_per_user(self):
+        buffer = LastLoginBuffer()
+        self.addCleanup(buffer.stop)
+        users = [User.objects.create(username=f'user-{number}', role='CUSTOMER') for number in range(3)]
+        now = timezone.now()
+        for user in users:
+            buffer.record(user.id, now - timedelta(minutes=5))
+        buffer.record(users[0].id, now)
+        buffer.record(users[0].id, now - timedelta(minutes=1))
+
+        self.assertEqual(buffer.pending(), 3)
+        self.assertFalse(User.objects.filter(last_login__isnull=False).exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 3)
+
+        self.assertEqual(User.objects.get(id=users[0].id).last_login, now)
+        self.assertEqual(User.objects.get(id=users[1].id).last_login, now - timedelta(minutes=5))
+        self.assertEqual(buffer.pending(), 0)
+
+
+class UserImportTest(TestCase):
+    """
+    Bulk imports create valid rows in a fixed number of queries and fail
+    rows whose username or email is taken, in the database or the batch.
+    """
+
+    def setUp(self):
+        User.objects.create_user(username='taken', email='taken@example.com', password='secret-password', role='CUSTOMER')
+
+    def row(self, username, email='', role='CUSTOMER'):
+        return {'username': username, 'email': email, 'password': f'{username}-password', 'role': role}
+
+    def test_duplicates_and_invalid_rows_fail(self):
+        rows = [
+            self.row('alice', 'alice@example.com'),
+            self.row('taken'),
+            self.row('bob', 'taken@example.com'),
+            self.row('alice'),
+            self.row('carol', 'alice@example.com'),
+            self.row('dave', role='ADMIN'),
+            self.row('erin', 'erin@EXAMPLE.com', role='OWNER'),
+        ]
+        # Existing usernames, existing emails, the savepoint around bulk_create and the INSERT.
+        with self.assertNumQueries(5):
+            results = UserRepository.import_users(rows)
+
+        self.assertEqual([result['status'] for result in results], ['created', 'failed', 'failed', 'failed', 'failed', 'failed', 'created'])
+        self.assertIn('username', results[1]['errors'])
+        self.assertIn('email', results[2]['errors'])
+        self.assertIn('role', results[5]['errors'])
+        erin = User.objects.get(id=results[6]['id'])
+        self.assertEqual((erin.email, erin.role), ('erin@example.com', 'OWNER'))
+        self.assertTrue(erin.check_password('erin-password'))
+
+    def test_api_hashes_across_the_pool(self):
+        admin = User.objects.create(username='admin', role='OWNER', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.post('/api/users/bulk/', [self.row(f'user-{number}') for number in range(4)], format='json')
+
+        self.assertEqual(response.json()['created'], 4)
+        self.assertTrue(User.objects.get(username='user-3').check_password('user-3-password'))
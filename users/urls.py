@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import RegisterView, CustomLoginView, UserDetailView
+from .views import RegisterView, CustomLoginView, UserDetailView, UserBulkImportView
+from .async_views import AsyncUserDetailView
 
 
 
@@ -7,6 +8,8 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', CustomLoginView.as_view(), name='login'),
     path('me/', UserDetailView.as_view(), name='user_detail'),
+    path('bulk/', UserBulkImportView.as_view(), name='user_bulk_import'),
+    path('async/me/', AsyncUserDetailView.as_view(), name='async_user_detail'),
     
     
 ]
\ No newline at end of file
@@ -6,7 +6,9 @@ from .serializers import UserSerializer, UserRegisterSerializer, CustomTokenObta
 import logging
 from .repository import UserRepository
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.db import IntegrityError
+from .hashing import shared_password_pool
 
 # Create your views here.
 logger = logging.getLogger(__name__)
@@ -50,6 +52,34 @@ class UserDetailView(APIView):
    
     
     
+class UserBulkImportView(APIView):
+    """
+    View for admins to create many users in one request, reporting the outcome of every row.
+    """
+    permission_classes = [IsAdminUser]
+    MAX_ROWS = 10000
+
+    def post(self, request):
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "Expected a non-empty list of users."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.MAX_ROWS:
+            return Response({"error": f"At most {self.MAX_ROWS} users can be imported per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = UserRepository.import_users(rows, shared_password_pool())
+        except IntegrityError as e:
+            logger.warning(f"Conflicting concurrent user import: {str(e)}")
+            return Response({"error": "Some of these users were created concurrently, please try again."}, status=status.HTTP_409_CONFLICT)
+        except Exception as e:
+            logger.exception(f"Error importing users: {str(e)}")
+            return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        created = sum(1 for result in results if result["status"] == "created")
+        logger.info(f"Bulk user import by user {request.user.id}: {created} created, {len(results) - created} failed")
+        return Response({"created": created, "failed": len(results) - created, "results": results}, status=status.HTTP_200_OK)
+
+
 class CustomLoginView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer 
     